@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
 from beer_recommender import BeerRecommender
+from config import Config
+from snapshot import ModelNotReady
+from terminal_output import format_flavor_profile, format_terminal_output
 import base64
+import os
 
 # Page config
 st.set_page_config(
@@ -102,68 +106,79 @@ st.markdown(f"""
 </style>
 """, unsafe_allow_html=True)
 
+def show_timing_panel(recommender):
+    """Debug panel: stage breakdown of the last request plus the metrics dump"""
+    last = st.session_state.get('last_timings')
+    with st.expander("⏱️ Timing breakdown (last request)", expanded=True):
+        if last is None:
+            st.caption("Run a query to see where the time goes.")
+        else:
+            st.caption(f"Features from: {last['feature_source']}")
+            st.table(pd.DataFrame(
+                [{'stage': stage, 'ms': ms} for stage, ms in last['timings'].items()]
+            ).set_index('stage'))
+        st.download_button("Download metrics (Prometheus)", recommender.metrics.to_prometheus(),
+                           file_name="beer_buddy_metrics.txt")
+        st.download_button("Download metrics (JSON)", recommender.metrics.to_json(),
+                           file_name="beer_buddy_metrics.json")
+
+def terminal_block(text):
+    return f'<div class="terminal-output">{text}</div>'
+
+class ProgressiveResults:
+    """Renders a request's results stage by stage as get_recommendations reports them:
+    the streamed LLM reply, then the flavor profile, the rating and the recommendations
+    (placeholder lines stand in for stages that are still running)"""
+
+    def __init__(self, user_input):
+        self.user_input = user_input
+        self.reply = []
+        self.stages = {}
+        self.llm_area = st.empty()
+        self.profile_area = st.empty()
+        self.output_area = st.empty()
+
+    def __call__(self, stage, value):
+        if stage == 'llm_token':
+            self.reply.append(value)
+            self.llm_area.code(''.join(self.reply), language='json')
+            return
+        self.stages[stage] = value
+        if stage == 'user_features':
+            self.llm_area.empty()
+            self.profile_area.markdown(terminal_block(format_flavor_profile(value)), unsafe_allow_html=True)
+        else:
+            self.show_output(pending=True)
+
+    def show_output(self, pending=False, results=None):
+        stages = results if results is not None else self.stages
+        self.output_area.markdown(terminal_block(format_terminal_output(
+            self.user_input,
+            stages['predicted_rating'],
+            stages.get('recommendations'),
+            stages.get('alt_recommendations'),
+            pending=pending
+        )), unsafe_allow_html=True)
+
+# Example buttons; their results are precomputed at startup
+EXAMPLES = [
+    "I want a light 🍊 citrusy beer",
+    "Give me a 🌺 hoppy IPA with tropical notes",
+    "I want a sessionable pilsner",
+    "Something 🍋 sour and funky with brett character",
+    "Just a Bad beer"
+]
+
 @st.cache_resource
 def load_recommender():
-    """Load and initialize the beer recommender system"""
-    recommender = BeerRecommender()
-    recommender.load_and_preprocess_data()
-    recommender.train_regression_model()
+    """Create the beer recommender; the model loads or trains in a background thread,
+    then the example queries are warmed so their buttons answer instantly"""
+    # Streamlit secrets (deployment) take precedence over .env / environment variables
+    recommender = BeerRecommender(config=Config(secrets=st.secrets))
+    recommender.start_background_build()
+    recommender.start_warm_up(EXAMPLES)
     return recommender
 
-def format_terminal_output(prompt, predicted_rating, recommendations, alt_recommendations=None):
-    """Format output exactly like beer_expected.ipynb"""
-    
-    output = f"User Prompt = {prompt}\n"
-    
-    if alt_recommendations is not None:
-        # Low rating warning
-        output += "━" * 60 + "\n"
-        output += f"⚠️  Warning: This flavor combination typically rates {predicted_rating:.2f}/5\n"
-        output += "━" * 60 + "\n\n"
-        
-        output += "📍 Here's what matches your exact request:\n"
-        if recommendations:
-            for i, beer in enumerate(recommendations[:2], 1):
-                output += f"{i}. {beer['name']} ({beer['rating']:.2f}★ - {int(beer['num_reviews'])} reviews)\n"
-                output += f"   Distance: {beer['distance']:.3f}\n"
-        else:
-            output += "   No exact matches found in our database.\n"
-        
-        output += "\n💡 Suggested Alternatives (similar but better rated):\n"
-        if alt_recommendations:
-            for i, beer in enumerate(alt_recommendations[:2], 1):
-                output += f"{i}. {beer['name']} ({beer['rating']:.2f}★ - {int(beer['num_reviews'])} reviews)\n"
-                output += f"   Distance: {beer['distance']:.3f}\n"
-        else:
-            output += "   No high-rated alternatives found with your criteria.\n"
-        
-        output += "\n💭 Tip: The flavor combination you requested is uncommon. The alternatives above\n"
-        output += "   maintain similar characteristics but with proven appeal to beer enthusiasts.\n"
-        
-    else:
-        # Good rating
-        output += "━" * 60 + "\n"
-        output += f"✅ Great choice! Predicted rating: {predicted_rating:.2f}/5\n"
-        output += "━" * 60 + "\n\n"
-        
-        output += "🍺 Top Recommendations:\n"
-        for i, beer in enumerate(recommendations[:2], 1):
-            output += f"\n{i}. {beer['name']}\n"
-            output += f"   Rating: {beer['rating']:.2f}/5 ({int(beer['num_reviews'])} reviews)\n"
-            output += f"   Distance: {beer['distance']:.3f}\n"
-            
-            desc = beer.get('description', '')
-            if desc:
-                desc = desc[:120] + "..." if len(desc) > 120 else desc
-                output += f"   Notes: Notes:{desc}\n"
-            else:
-                output += "   Notes: Notes:...\n"
-    
-    output += "\n" + "─" * 60 + "\n"
-    output += "=" * 133
-    
-    return output
-
 def main():
     # st.title("🍺 Beer Buddy 🍺")
     st.markdown(
@@ -173,9 +188,20 @@ def main():
     unsafe_allow_html=True
 )
     
-    # Load recommender
-    with st.spinner("Loading beer database..."):
-        recommender = load_recommender()
+    # Load recommender (returns at once; requests answer "warming up" until the model is ready)
+    recommender = load_recommender()
+    status = recommender.status()
+    if status['state'] == 'warming_up':
+        st.info(f"⏳ {status['message']}")
+    elif status['state'] == 'failed':
+        # The recommender stays cached, so retry here (as an uncached failed load
+        # would on a rerun), with a backoff so a persistent failure is not retried
+        # on every interaction
+        if recommender.retry_background_build() is not None:
+            recommender.start_warm_up(EXAMPLES)
+            st.error(f"{status['message']} Retrying in the background...")
+        else:
+            st.error(status['message'])
     
     # Description
     # st.markdown("Enter your beer preference to get personalized recommendations.")
@@ -200,17 +226,9 @@ def main():
     # Example queries
     st.markdown("**Can't make your mind? Try these:**")
     
-    examples = [
-        "I want a light 🍊 citrusy beer",
-        "Give me a 🌺 hoppy IPA with tropical notes",
-        "I want a sessionable pilsner",
-        "Something 🍋 sour and funky with brett character",
-        "Just a Bad beer"
-    ]
-    
     # Create buttons in columns
     cols = st.columns(2)
-    for i, example in enumerate(examples):
+    for i, example in enumerate(EXAMPLES):
         with cols[i % 2]:
             if st.button(example, key=f"ex_{i}", use_container_width=True):
                 st.session_state.selected_query = example  # Update session state
@@ -220,30 +238,31 @@ def main():
     if st.button("🔍 Get Recommendations", type="primary", use_container_width=True):
         if user_input:
             with st.spinner("Analyzing your request..."):
+                progress = ProgressiveResults(user_input)
                 try:
-                    # Get recommendations
-                    results = recommender.get_recommendations(user_input)
-                    
-                    # Format output
-                    terminal_output = format_terminal_output(
-                        user_input,
-                        results['predicted_rating'],
-                        results['recommendations'],
-                        results.get('alt_recommendations')
-                    )
+                    # Get recommendations, rendering each stage as soon as it is ready
+                    results = recommender.get_recommendations(user_input, on_progress=progress)
+                    st.session_state.last_timings = {
+                        'timings': results['timings'],
+                        'feature_source': results['feature_source']
+                    }
+                    if os.getenv("METRICS_DUMP_PATH"):
+                        recommender.metrics.dump(os.getenv("METRICS_DUMP_PATH"))
                     
-                    # Display in terminal style
-                    st.markdown(
-                        f'<div class="terminal-output">{terminal_output}</div>',
-                        unsafe_allow_html=True
-                    )
+                    # Final terminal-style output replaces the partial one
+                    progress.show_output(results=results)
                     
+                except ModelNotReady as e:
+                    st.info(f"⏳ {e}")
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
                     st.info("Please check if the GROQ_API_KEY is set in your .env file")
         else:
             st.warning("Please enter a beer preference!")
     
+    if st.sidebar.checkbox("Show timing breakdown", value=os.getenv("BEER_BUDDY_DEBUG") == "1"):
+        show_timing_panel(recommender)
+    
     # Info section
     with st.expander("About this system"):
         st.markdown("""
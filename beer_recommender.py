@@ -1,148 +1,76 @@
-import pandas as pd
 import numpy as np
+import copy
 import os
-from groq import Groq
+import glob
+import hashlib
+import pickle
+import tempfile
+import shutil
+import threading
+import time
 import json
-from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.neighbors import NearestNeighbors
-import streamlit as st
+import re
+from catalog import CATALOG_VERSION, CompactCatalog
+from config import Config
+from llm_cache import LLMFeatureCache, make_cache_key, normalize_prompt
+from metrics import StageMetrics
+from neighbors import make_index
+from ranking import CursorStore, Ranking, check_cursor_limit, check_page, top_k_order
+from refit import RefitPolicy
+from regressors import fit_regressor, make_regressor, regressor_spec
+from rule_extractor import RuleBasedFeatureExtractor
+from semantic_cache import SemanticPromptCache
+from single_flight import SingleFlight
+from snapshot import ModelNotReady, ModelSnapshot
+from warm_results import WarmResults
 
-class BeerRecommender:
-    def __init__(self):
-        self.df = None
-        self.gb_model = None
-        self.global_scaler_recommend = None
-        self.scalar = None
-        self.encoder = None
-        self.encoder2 = None
-        self.X_reg_scaled = None
-        self.mainstream_patterns = [
-            'co.', 'inc', 'budweiser', 'bud', 'busch', 'michelob',
-            'miller', 'coors', 'keystone', 'blue moon',
-            'pabst', 'pbr', 'schlitz', 'old milwaukee',
-            'rolling rock', 'yuengling', 'natural light', 'natty',
-            'samuel adams', 'sam adams', 'boston lager',
-            'corona', 'modelo', 'pacifico',
-            'dos equis', 'tecate', 'sol', 'victoria',
-            'heineken', 'amstel', 'stella artois',
-            'becks', "beck's", 'st pauli', 'warsteiner',
-            'guinness', 'harp', 'smithwick', 'kilkenny',
-            'peroni', 'moretti', 'nastro azzurro',
-            'carlsberg', 'tuborg', 'kronenbourg',
-            'fosters', "foster's", 'grolsch', 'pilsner urquell',
-            'molson', 'labatt', 'moosehead', 'sleeman',
-            'sapporo', 'asahi', 'kirin', 'tsingtao', 'singha', 'tiger', 'leo',
-            'shock top', 'goose island', 'elysian', 'lagunitas',
-            'ballast point', '10 barrel', 'golden road',
-            'blue point', 'devils backbone', 'karbach',
-            'breckenridge', 'four peaks', 'wicked weed',
-            'sierra nevada', 'new belgium', 'fat tire',
-            'stone', 'brooklyn', 'dogfish head', 
-            "bell's", 'bells brewery', 'founders',
-            'deschutes', 'rogue', 'anchor steam',
-            'red stripe', 'newcastle', 'bass', 'boddingtons',
-            'murphy', 'beamish', 'tennents', 'carling',
-            'leinenkugel', 'magic hat', 'pyramid',
-            'widmer', 'redhook', 'kona', 'longboard',
-            'landshark', 'presidente', 'medalla',
-            'kingfisher', 'haywards', 'thunderbolt',
-            'kalyani', 'knockout', 'royal challenge',
-            'carlsberg elephant', 'bira 91', 'bira',
-            'simba', 'godfather', 'hunter', 'zingaro',
-            'london pilsner', 'kotsberg', 'bullet',
-            'khajuraho', 'taj mahal', 'flying horse', 'dansberg',
-            'golden eagle', 'guru', 'bad monkey', 'bee young',
-            'white rhino', 'white owl', 'effingut'
-        ]
-        self.scaling_features = ['ABV', 'Astringency', 'Body', 'Alcohol', 'Bitter',
-                                 'Sweet', 'Sour', 'Salty', 'Fruits', 'Hoppy', 'Spices', 'Malty']
-        
-    def load_and_preprocess_data(self):
-        self.df = pd.read_csv('./data/beer_profile_and_ratings.csv')
-        
-        self.df['mainstream'] = self.df.apply(
-            lambda row: self.matches_mainstream_pattern(row['Beer Name (Full)']), axis=1
-        )
-        self.df['mainstream'] = self.df['mainstream'] | (self.df['number_of_reviews'] >= 300)
-        
-        self.df['strength'] = self.df['ABV'].apply(
-            lambda x: 'Light' if x <= 5 else
-                      'Medium' if x <= 7 else
-                      'Strong' if x <= 10 else
-                      'Extra Strong'
-        )
-        
-        self.df = self.df.drop(columns=['Min IBU', 'Max IBU', 'review_aroma', 
-                                        'review_appearance', 'review_palate', 
-                                        'review_taste', 'Beer Name (Full)', 'Brewery'])
-        
-        cols = self.df.columns.tolist()
-        cols[1], cols[2] = cols[2], cols[1]
-        self.df = self.df[cols]
-        self.df['mainstream'] = self.df['mainstream'].astype(int)
-        
-    def matches_mainstream_pattern(self, beer_name_full):
-        combined_name = beer_name_full.lower()
-        for pattern in self.mainstream_patterns:
-            if pattern in combined_name:
-                return True
-        return False
+def build_trie_regex(patterns):
+    """Build one regex matching any of the literal patterns as a substring.
+
+    Patterns are merged into a prefix trie so the regex engine walks shared
+    prefixes once instead of trying every alternative at every position.
+    """
+    trie = {}
+    for pattern in patterns:
+        if not pattern:
+            return ''
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[''] = {}
     
-    def train_regression_model(self):
-        reg_df = self.df.drop(columns=['number_of_reviews', 'strength', 'Name', 'Description'])
-        
-        cols = reg_df.columns.tolist()
-        cols[-2], cols[-1] = cols[-1], cols[-2]
-        reg_df = reg_df[cols]
-        
-        y_reg = reg_df.iloc[:, -1]
-        X_reg = reg_df.iloc[:, :-1]
-        
-        X = X_reg.copy()
-        
-        self.scalar = MinMaxScaler()
-        X[self.scaling_features] = self.scalar.fit_transform(X[self.scaling_features])
-        
-        X['Style'] = X['Style'].str.split(' - ').str[0].str.split(' / ').str[0]
-        
-        self.encoder = OneHotEncoder(sparse_output=False)
-        encoded_array = self.encoder.fit_transform(X[['Style']])
-        feature_names = self.encoder.get_feature_names_out(['Style'])
-        encoded_df = pd.DataFrame(encoded_array, columns=feature_names, index=X_reg.index)
-        
-        self.X_reg_scaled = pd.concat([X.drop('Style', axis=1), encoded_df], axis=1)
-        
-        X_train = self.X_reg_scaled.to_numpy()
-        y_train = y_reg.to_numpy()
-        
-        self.gb_model = GradientBoostingRegressor(
-            n_estimators=150,
-            learning_rate=0.1,
-            max_depth=4
-        )
-        self.gb_model.fit(X_train, y_train)
-        
-        self.global_scaler_recommend = MinMaxScaler()
-        self.global_scaler_recommend.fit(self.df[self.scaling_features])
-        
-    def get_beer_features_from_text(self, user_input):
-        try:
-            # Try to get API key from Streamlit secrets first (for deployment)
-            if 'GROQ_API_KEY' in st.secrets:
-                api_key = st.secrets['GROQ_API_KEY']
-            else:
-                # Fall back to environment variable (for local development)
-                from dotenv import load_dotenv
-                load_dotenv()
-                api_key = os.getenv("GROQ_API_KEY")
-            
-            if not api_key:
-                raise ValueError("GROQ API key not found. Please set it in .env file or Streamlit secrets.")
-            
-            client = Groq(api_key=api_key)
-            
-            system_prompt = """
+    def to_regex(node):
+        if '' in node:
+            # A shorter pattern ends here; anything longer is redundant for a substring test
+            return ''
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    
+    return to_regex(trie) if trie else '(?!)'
+
+BUNDLE_VERSION = 5
+SEGMENT_PREFIX = 'beer-recommender-'
+
+def parse_json_object(content):
+    """The JSON object in an LLM reply, ignoring any text or code fence around it"""
+    start, end = content.find('{'), content.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError(f"No JSON object in reply: {content[:80]!r}")
+    return json.loads(content[start:end + 1])
+
+def snapshot_attribute(name):
+    # Reads the published ModelSnapshot; assigning publishes a copy with the field changed
+    def get(self):
+        return getattr(self.snapshot, name)
+    
+    def set(self, value):
+        self.snapshot = self.snapshot.replace(**{name: value})
+    
+    return property(get, set)
+
+STRENGTHS = ['Light', 'Medium', 'Strong', 'Extra Strong']
+
+SYSTEM_PROMPT = """
                             You are a beer flavor profile translator. Convert natural language beer preferences into numerical flavor profiles.
 
                             ## Output Format
@@ -302,39 +230,930 @@ class BeerRecommender:
                             ### Testing/Experimental Requests
                             If user mentions "test", "experiment", or asks for unusual combinations that would clearly conflict (e.g., "extremely sweet AND extremely bitter AND light body"), recognize this as potentially problematic and generate values that reflect the conflict.
                         """
+
+class BeerRecommender:
+    # pandas, scikit-learn and the Groq SDK are imported on first use (training,
+    # bundle load, first LLM call) so importing this module stays cheap.
+    # Everything needed to serve requests once trained; written by save_bundle.
+    # The training frames (df, X_reg_scaled) stay out: serving reads the compact catalog,
+    # which lives in its own memory-mapped directory next to the bundle.
+    bundle_attributes = [
+        'gb_model', 'scalar', 'global_scaler_recommend', 'encoder', 'encoder2',
+        'regression_columns', 'recommend_columns',
+        'recommend_index', 'regression_layout', 'recommend_layout', 'regression_fit'
+    ]
+    # Large arrays saved as .npy beside the bundle and memory-mapped on load
+    bundle_arrays = ['X_recommend_scaled']
+    
+    # Serving state lives in one immutable ModelSnapshot (see snapshot.py). Requests
+    # take self.snapshot once; training happens on a copy of the recommender and
+    # publishes a complete snapshot, so the one being served is never half-updated.
+    gb_model = snapshot_attribute('gb_model')
+    scalar = snapshot_attribute('scalar')
+    global_scaler_recommend = snapshot_attribute('global_scaler_recommend')
+    encoder = snapshot_attribute('encoder')
+    encoder2 = snapshot_attribute('encoder2')
+    regression_columns = snapshot_attribute('regression_columns')
+    recommend_columns = snapshot_attribute('recommend_columns')
+    recommend_index = snapshot_attribute('recommend_index')
+    regression_layout = snapshot_attribute('regression_layout')
+    recommend_layout = snapshot_attribute('recommend_layout')
+    regression_fit = snapshot_attribute('regression_fit')
+    X_recommend_scaled = snapshot_attribute('X_recommend_scaled')
+    catalog = snapshot_attribute('catalog')
+    
+    def __init__(self, data_path='./data/beer_profile_and_ratings.csv', llm_cache=None, llm_client=None,
+                 semantic_cache=None, metrics=None, config=None):
+        self.data_path = data_path
+        self.snapshot = ModelSnapshot()
+        # Background training (start_background_build / refits); see status()
+        self.training_thread = None
+        self.training_error = None
+        self.training_lock = threading.Lock()
+        # Consecutive failed trainings and when the last one failed (retry_background_build)
+        self.training_failures = 0
+        self.training_failed_at = None
+        # Secrets and LLM_* settings; app.py passes Config(secrets=st.secrets)
+        self.config = config if config is not None else Config()
+        self.llm_model = "llama-3.1-8b-instant"
+        # Built from config on first use unless injected
+        self._llm_client = llm_client
+        self.llm_cache = llm_cache if llm_cache is not None else LLMFeatureCache()
+        self.semantic_cache = semantic_cache if semantic_cache is not None else SemanticPromptCache()
+        self.rule_extractor = RuleBasedFeatureExtractor()
+        # Stage latencies and counters; add_hook() to feed another collector
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        # 'llm': always ask Groq; 'hybrid': skip Groq when the rules cover the prompt;
+        # 'rules': never call Groq
+        self.feature_mode = 'hybrid'
+        self.rule_confidence_threshold = 0.8
+        # Answer from the rules when the Groq call fails
+        self.rule_fallback = True
+        self.gb_params = {
+            'n_estimators': 150,
+            'learning_rate': 0.1,
+            'max_depth': 4
+        }
+        # Rating model (see regressors.py): 'gradient_boosting' is fitted with gb_params,
+        # 'hist_gradient_boosting' (multi-threaded, native categorical Style) with hist_gb_params
+        self.regressor = 'gradient_boosting'
+        self.hist_gb_params = {}
+        # Optional regressors.TrainingBudget: time/iteration limits and early stopping
+        self.training_budget = None
+        self.df = None
+        self.X_reg_scaled = None
+        self._query_buffers = threading.local()
+        self.recommend_n_neighbors = 10
+        # Beers returned per query (k), ranked by quality score among the nearest
+        # candidate_pool neighbors (default: max(recommend_n_neighbors, 5 * k))
+        self.recommend_top_k = 2
+        # Rankings behind "load more" cursors (see ranking.py)
+        self.cursors = CursorStore()
+        # Precomputed results for canned queries (warm_up / start_warm_up); set
+        # warm_results.queries to the prompts worth keeping
+        self.warm_results = WarmResults()
+        # Concurrent identical requests (same normalized prompt, snapshot and
+        # options) share one computation; see in_flight.stats()
+        self.in_flight = SingleFlight()
+        # 'auto' picks exact brute force or IVF per partition size (see neighbors.py);
+        # or one of 'brute', 'sklearn', 'kd_tree', 'ball_tree', 'ivf'
+        self.neighbor_backend = 'auto'
+        self.alt_rating_thresholds = [3.0]
+        # When upserts/deletes/review updates trigger a full retrain (see refit.py)
+        self.refit_policy = RefitPolicy()
+        # Retrain in a background thread when the policy fires (False: inline)
+        self.background_refit = True
+        # Directory (e.g. /dev/shm) where the loaded model's catalog, scaled features and
+        # neighbor indexes are shared with other processes (see shared_arrays.py); None
+        # falls back to the SHARED_SEGMENT_DIR setting, unset keeps them private
+        self.shared_segment_dir = None
+        self.shared_segment = None
+        self.update_lock = threading.Lock()
+        self.mainstream_patterns = [
+            'co.', 'inc', 'budweiser', 'bud', 'busch', 'michelob',
+            'miller', 'coors', 'keystone', 'blue moon',
+            'pabst', 'pbr', 'schlitz', 'old milwaukee',
+            'rolling rock', 'yuengling', 'natural light', 'natty',
+            'samuel adams', 'sam adams', 'boston lager',
+            'corona', 'modelo', 'pacifico',
+            'dos equis', 'tecate', 'sol', 'victoria',
+            'heineken', 'amstel', 'stella artois',
+            'becks', "beck's", 'st pauli', 'warsteiner',
+            'guinness', 'harp', 'smithwick', 'kilkenny',
+            'peroni', 'moretti', 'nastro azzurro',
+            'carlsberg', 'tuborg', 'kronenbourg',
+            'fosters', "foster's", 'grolsch', 'pilsner urquell',
+            'molson', 'labatt', 'moosehead', 'sleeman',
+            'sapporo', 'asahi', 'kirin', 'tsingtao', 'singha', 'tiger', 'leo',
+            'shock top', 'goose island', 'elysian', 'lagunitas',
+            'ballast point', '10 barrel', 'golden road',
+            'blue point', 'devils backbone', 'karbach',
+            'breckenridge', 'four peaks', 'wicked weed',
+            'sierra nevada', 'new belgium', 'fat tire',
+            'stone', 'brooklyn', 'dogfish head', 
+            "bell's", 'bells brewery', 'founders',
+            'deschutes', 'rogue', 'anchor steam',
+            'red stripe', 'newcastle', 'bass', 'boddingtons',
+            'murphy', 'beamish', 'tennents', 'carling',
+            'leinenkugel', 'magic hat', 'pyramid',
+            'widmer', 'redhook', 'kona', 'longboard',
+            'landshark', 'presidente', 'medalla',
+            'kingfisher', 'haywards', 'thunderbolt',
+            'kalyani', 'knockout', 'royal challenge',
+            'carlsberg elephant', 'bira 91', 'bira',
+            'simba', 'godfather', 'hunter', 'zingaro',
+            'london pilsner', 'kotsberg', 'bullet',
+            'khajuraho', 'taj mahal', 'flying horse', 'dansberg',
+            'golden eagle', 'guru', 'bad monkey', 'bee young',
+            'white rhino', 'white owl', 'effingut'
+        ]
+        self.mainstream_regex = None
+        self._mainstream_regex_patterns = None
+        self.scaling_features = ['ABV', 'Astringency', 'Body', 'Alcohol', 'Bitter',
+                                 'Sweet', 'Sour', 'Salty', 'Fruits', 'Hoppy', 'Spices', 'Malty']
+        
+    @property
+    def llm_client(self):
+        if self._llm_client is None:
+            from llm_transport import llm_client_from_env
+            self._llm_client = llm_client_from_env(
+                environ=self.config, api_key_provider=lambda: self.config.get('GROQ_API_KEY')
+            )
+        return self._llm_client
+    
+    @llm_client.setter
+    def llm_client(self, llm_client):
+        self._llm_client = llm_client
+    
+    def load_and_preprocess_data(self, catalog_dir='./artifacts'):
+        # The binary catalog is derived from the CSV once and memory-mapped afterwards;
+        # catalog_dir=None always parses the CSV.
+        if catalog_dir is None:
+            self.read_csv_catalog()
+            return
+        
+        self.catalog = self.load_catalog(catalog_dir)
+        if self.catalog is not None:
+            self.df = self.catalog.to_frame()
+            return
+        
+        self.read_csv_catalog()
+        try:
+            self.save_catalog(catalog_dir)
+        except OSError:
+            # Read-only deployments keep the in-memory catalog
+            return
+        self.catalog = self.load_catalog(catalog_dir)
+    
+    def data_fingerprint(self):
+        # The catalog depends on the CSV and on the mainstream patterns only
+        digest = hashlib.sha256()
+        self.hash_data_file(digest)
+        digest.update(json.dumps({'catalog_version': CATALOG_VERSION,
+                                  'mainstream_patterns': self.mainstream_patterns}).encode())
+        return digest.hexdigest()
+    
+    def hash_data_file(self, digest):
+        with open(self.data_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    
+    def catalog_path(self, catalog_dir, fingerprint):
+        return os.path.join(catalog_dir, f"catalog-v{CATALOG_VERSION}-{fingerprint[:16]}")
+    
+    def save_catalog(self, catalog_dir='./artifacts'):
+        fingerprint = self.data_fingerprint()
+        # Other catalogs are left alone (see remove_stale_artifacts)
+        return self.catalog.save(self.catalog_path(catalog_dir, fingerprint), fingerprint)
+    
+    def load_catalog(self, catalog_dir='./artifacts'):
+        fingerprint = self.data_fingerprint()
+        return CompactCatalog.load(self.catalog_path(catalog_dir, fingerprint), fingerprint)
+    
+    def read_csv_catalog(self):
+        import pandas as pd
+        
+        raw = pd.read_csv(self.data_path)
+        self.df = self.preprocess_frame(raw)
+        # The full beer name is the key for incremental updates
+        self.catalog = CompactCatalog.from_frame(self.df, STRENGTHS, keys=raw['Beer Name (Full)'])
+    
+    def preprocess_frame(self, raw):
+        df = raw.copy()
+        
+        df['mainstream'] = self.match_mainstream_names(df['Beer Name (Full)'])
+        df['mainstream'] = df['mainstream'] | (df['number_of_reviews'] >= 300)
+        
+        df['strength'] = df['ABV'].apply(
+            lambda x: 'Light' if x <= 5 else
+                      'Medium' if x <= 7 else
+                      'Strong' if x <= 10 else
+                      'Extra Strong'
+        )
+        
+        df = df.drop(columns=['Min IBU', 'Max IBU', 'review_aroma', 
+                              'review_appearance', 'review_palate', 
+                              'review_taste', 'Beer Name (Full)', 'Brewery'])
+        
+        cols = df.columns.tolist()
+        cols[1], cols[2] = cols[2], cols[1]
+        df = df[cols]
+        df['mainstream'] = df['mainstream'].astype(int)
+        return df
+        
+    def get_mainstream_regex(self):
+        # Recompile only when mainstream_patterns has been changed
+        patterns = tuple(self.mainstream_patterns)
+        if self.mainstream_regex is None or self._mainstream_regex_patterns != patterns:
+            self.mainstream_regex = re.compile(build_trie_regex(patterns))
+            self._mainstream_regex_patterns = patterns
+        return self.mainstream_regex
+    
+    def match_mainstream_names(self, beer_names_full):
+        regex = self.get_mainstream_regex()
+        return beer_names_full.str.lower().str.contains(regex, na=False)
+    
+    def matches_mainstream_pattern(self, beer_name_full):
+        return self.get_mainstream_regex().search(beer_name_full.lower()) is not None
+    
+    def regressor_params(self):
+        return self.gb_params if self.regressor == 'gradient_boosting' else self.hist_gb_params
+    
+    def train_regression_model(self):
+        """Train the rating model and the neighbor indexes on self.df.
+        
+        Training runs on a copy, and the finished snapshot is published in one
+        assignment: concurrent requests never see an unfitted model or a mix of
+        old and new scalers, columns and indexes.
+        """
+        trainer = self.training_copy(self.snapshot)
+        trainer.df = self.df
+        trainer.train_models()
+        self.X_reg_scaled = trainer.X_reg_scaled
+        self.publish(trainer.snapshot)
+    
+    def train_models(self):
+        # Writes each fitted piece to self.snapshot as it goes; only call on a training_copy()
+        import pandas as pd
+        from sklearn.preprocessing import MinMaxScaler, OneHotEncoder, OrdinalEncoder
+        
+        reg_df = self.df.drop(columns=['number_of_reviews', 'strength', 'Name', 'Description'])
+        
+        cols = reg_df.columns.tolist()
+        cols[-2], cols[-1] = cols[-1], cols[-2]
+        reg_df = reg_df[cols]
+        
+        y_reg = reg_df.iloc[:, -1]
+        X_reg = reg_df.iloc[:, :-1]
+        
+        X = X_reg.copy()
+        
+        self.scalar = MinMaxScaler()
+        X[self.scaling_features] = self.scalar.fit_transform(X[self.scaling_features])
+        
+        X['Style'] = X['Style'].str.split(' - ').str[0].str.split(' / ').str[0]
+        
+        spec = regressor_spec(self.regressor)
+        categorical_features = style_codes = None
+        if spec['style'] == 'onehot':
+            self.encoder = OneHotEncoder(sparse_output=False)
+            encoded_array = self.encoder.fit_transform(X[['Style']])
+            feature_names = self.encoder.get_feature_names_out(['Style'])
+            encoded_df = pd.DataFrame(encoded_array, columns=feature_names, index=X_reg.index)
             
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
+            self.X_reg_scaled = pd.concat([X.drop('Style', axis=1), encoded_df], axis=1)
+        else:
+            # One code column split on natively; unseen styles become NaN, the missing-value bin
+            self.encoder = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan)
+            codes = self.encoder.fit_transform(X[['Style']])[:, 0]
+            self.X_reg_scaled = X.drop('Style', axis=1).assign(Style=codes)
+            categorical_features = [self.X_reg_scaled.columns.get_loc('Style')]
+            style_codes = {style: code for code, style in enumerate(self.encoder.categories_[0])}
+        
+        X_train = self.X_reg_scaled.to_numpy(dtype=float)
+        y_train = y_reg.to_numpy()
+        
+        self.gb_model = make_regressor(self.regressor, self.regressor_params(), categorical_features)
+        self.regression_fit = fit_regressor(self.gb_model, X_train, y_train, spec['iterations'],
+                                            budget=self.training_budget)
+        self.regression_columns = self.X_reg_scaled.columns
+        self.regression_layout = self.build_query_layout(self.regression_columns, self.scalar, style_codes)
+        
+        self.global_scaler_recommend = MinMaxScaler()
+        self.global_scaler_recommend.fit(self.df[self.scaling_features])
+        
+        self.build_index()
+        self.refit_policy.reset(int(self.catalog.live.sum()))
+        
+    def build_index(self):
+        import pandas as pd
+        from sklearn.preprocessing import OneHotEncoder
+        
+        X_recommend = self.df[['Style'] + self.scaling_features].copy()
+        X_recommend['Style'] = X_recommend['Style'].str.split(' - ').str[0].str.split(' / ').str[0]
+        
+        self.encoder2 = OneHotEncoder(sparse_output=False)
+        encoded_array = self.encoder2.fit_transform(X_recommend[['Style']])
+        feature_names = self.encoder2.get_feature_names_out(['Style'])
+        encoded_df = pd.DataFrame(encoded_array, columns=feature_names, index=X_recommend.index)
+        X_recommend = pd.concat([X_recommend.drop('Style', axis=1), encoded_df], axis=1)
+        
+        X_recommend[self.scaling_features] = self.global_scaler_recommend.transform(
+            X_recommend[self.scaling_features]
+        )
+        
+        self.recommend_columns = X_recommend.columns
+        self.recommend_layout = self.build_query_layout(self.recommend_columns, self.global_scaler_recommend)
+        # float32 halves the neighbor indexes without changing which beers are returned
+        self.X_recommend_scaled = X_recommend.to_numpy(dtype=np.float32)
+        
+        # One fitted neighbor index per (mainstream only, strength, alt threshold)
+        # partition; alt_threshold None is the regular (unfiltered) lookup.
+        recommend_index = {}
+        for alt_threshold in [None] + list(self.alt_rating_thresholds):
+            for mainstream_only in (False, True):
+                for strength in STRENGTHS:
+                    key = (mainstream_only, strength, alt_threshold)
+                    recommend_index[key] = self.build_partition(*key)
+        self.recommend_index = recommend_index
+        
+    def partition_mask(self, mainstream_only, strength, alt_threshold, catalog=None, rows=slice(None)):
+        # Which of the catalog rows belong to the partition (deleted rows never do)
+        catalog = catalog if catalog is not None else self.catalog
+        mask = catalog.strength_codes[rows] == catalog.strengths.index(strength)
+        mask &= catalog.live[rows]
+        if alt_threshold is not None:
+            mask &= catalog.review_overall[rows] >= alt_threshold
+        if mainstream_only:
+            mask &= catalog.mainstream[rows] == 1
+        return mask
+    
+    def build_partition(self, mainstream_only, strength, alt_threshold, snapshot=None):
+        # Fitted index over the partition's catalog rows, or None when it is empty
+        snapshot = snapshot if snapshot is not None else self.snapshot
+        mask = self.partition_mask(mainstream_only, strength, alt_threshold, catalog=snapshot.catalog)
+        
+        partition = None
+        if mask.any():
+            knn = make_index(self.neighbor_backend, int(mask.sum()), n_neighbors=self.recommend_n_neighbors)
+            knn.fit(snapshot.X_recommend_scaled[mask])
+            # Catalog row of each indexed beer
+            partition = {
+                'knn': knn,
+                'rows': np.flatnonzero(mask).astype(np.int32)
+            }
+        return partition
+    
+    def partition_key(self, llm_output, alt=False, alt_rating_threshold=3.0):
+        return (
+            llm_output['mainstream'] == 1,
+            self.get_strength(llm_output['ABV']),
+            alt_rating_threshold if alt else None
+        )
+    
+    def get_partition(self, llm_output, alt=False, alt_rating_threshold=3.0, snapshot=None):
+        snapshot = snapshot if snapshot is not None else self.serving_snapshot()
+        key = self.partition_key(llm_output, alt=alt, alt_rating_threshold=alt_rating_threshold)
+        if key in snapshot.recommend_index:
+            partition = snapshot.recommend_index[key]
+        else:
+            # Thresholds outside alt_rating_thresholds are built on first use and kept
+            # by publishing a snapshot that has them, unless that would mean waiting
+            partition = self.build_partition(*key, snapshot=snapshot)
+            if self.update_lock.acquire(blocking=False):
+                try:
+                    if self.snapshot is snapshot:
+                        self.publish(snapshot.replace(recommend_index={**snapshot.recommend_index, key: partition}))
+                finally:
+                    self.update_lock.release()
+        
+        if partition is None:
+            raise ValueError(f"No beers available for partition {key}")
+        return partition
+        
+    def bundle_fingerprint(self):
+        # Any change to the data or to what training depends on invalidates the bundle
+        digest = hashlib.sha256()
+        self.hash_data_file(digest)
+        settings = {
+            'bundle_version': BUNDLE_VERSION,
+            'gb_params': self.gb_params,
+            'regressor': self.regressor,
+            'hist_gb_params': self.hist_gb_params,
+            'training_budget': self.training_budget.settings() if self.training_budget is not None else None,
+            'mainstream_patterns': self.mainstream_patterns,
+            'recommend_n_neighbors': self.recommend_n_neighbors,
+            'neighbor_backend': self.neighbor_backend,
+            'alt_rating_thresholds': self.alt_rating_thresholds
+        }
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+    
+    def bundle_path(self, bundle_dir, fingerprint):
+        return os.path.join(bundle_dir, f"recommender-v{BUNDLE_VERSION}-{fingerprint[:16]}.pkl")
+    
+    def bundle_array_path(self, bundle_path, name):
+        return f"{bundle_path[:-len('.pkl')]}.{name}.npy"
+    
+    def save_bundle(self, bundle_dir='./artifacts'):
+        if self.gb_model is None:
+            raise ValueError("Train the model before saving a bundle.")
+        
+        fingerprint = self.bundle_fingerprint()
+        path = self.bundle_path(bundle_dir, fingerprint)
+        bundle = {
+            'version': BUNDLE_VERSION,
+            'fingerprint': fingerprint,
+            'state': {name: getattr(self, name) for name in self.bundle_attributes}
+        }
+        
+        os.makedirs(bundle_dir, exist_ok=True)
+        if self.load_catalog(bundle_dir) is None:
+            self.save_catalog(bundle_dir)
+        
+        # Write then rename so readers never see a partial bundle; the pickle goes
+        # last, so a bundle that exists always has its arrays
+        for name in self.bundle_arrays:
+            self.write_atomic(self.bundle_array_path(path, name),
+                              lambda f, name=name: np.save(f, getattr(self, name)), bundle_dir)
+        self.write_atomic(path, lambda f: pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL), bundle_dir)
+        # Other bundles are left alone (see remove_stale_artifacts)
+        return path
+    
+    def remove_stale_artifacts(self, bundle_dir='./artifacts'):
+        """Delete the catalogs and model bundles in bundle_dir other than the current
+        ones for this recommender's data and settings; returns the paths removed.
+        
+        Never called automatically: bundles for other settings (another regressor,
+        neighbor backend, ...) may share the directory, and another process may be
+        about to map them. Processes already mapping removed files keep them until
+        they exit.
+        """
+        keep_catalog = self.catalog_path(bundle_dir, self.data_fingerprint())
+        keep_stem = self.bundle_path(bundle_dir, self.bundle_fingerprint())[:-len('.pkl')]
+        removed = []
+        for path in glob.glob(os.path.join(bundle_dir, 'catalog-v*')):
+            if path != keep_catalog and not path.endswith('.tmp'):
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+        for path in glob.glob(os.path.join(bundle_dir, 'recommender-*')):
+            if not path.startswith(keep_stem) and not path.endswith('.tmp'):
+                os.remove(path)
+                removed.append(path)
+        return removed
+    
+    def write_atomic(self, path, write, directory):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    def load_bundle(self, bundle_dir='./artifacts'):
+        fingerprint = self.bundle_fingerprint()
+        path = self.bundle_path(bundle_dir, fingerprint)
+        if not os.path.exists(path):
+            return False
+        
+        with open(path, 'rb') as f:
+            bundle = pickle.load(f)
+        if bundle.get('version') != BUNDLE_VERSION or bundle.get('fingerprint') != fingerprint:
+            return False
+        
+        catalog = self.load_catalog(bundle_dir)
+        if catalog is None:
+            return False
+        
+        state = dict(bundle['state'])
+        for name in self.bundle_arrays:
+            state[name] = np.load(self.bundle_array_path(path, name), mmap_mode='r')
+        self.publish(ModelSnapshot(catalog=catalog, **state))
+        self.refit_policy.reset(int(catalog.live.sum()))
+        return True
+    
+    def load_or_build(self, bundle_dir='./artifacts'):
+        self.publish(self.build_snapshot(bundle_dir))
+        return self
+    
+    def build_snapshot(self, bundle_dir='./artifacts'):
+        """Load the saved bundle, or train (and save) one, on a copy of this
+        recommender; returns the complete snapshot without publishing it
+        """
+        trainer = self.training_copy()
+        if not trainer.load_bundle(bundle_dir):
+            trainer.load_and_preprocess_data(bundle_dir)
+            trainer.train_models()
+            try:
+                trainer.save_bundle(bundle_dir)
+            except OSError:
+                # A read-only deployment can still serve from the freshly trained model
+                pass
+        
+        segment_dir = self.shared_segment_dir or self.config.get('SHARED_SEGMENT_DIR')
+        if segment_dir:
+            return self.share_snapshot(trainer.snapshot, segment_dir, trainer.bundle_fingerprint())
+        return trainer.snapshot
+    
+    def share_snapshot(self, snapshot, segment_dir, fingerprint):
+        """snapshot with its arrays moved into the shared segment for fingerprint, built
+        here unless another process already did; the private copies are then dropped"""
+        from shared_arrays import SEGMENT_VERSION, SharedSegment, attach_snapshot, snapshot_arrays
+        
+        name = f"{SEGMENT_PREFIX}v{SEGMENT_VERSION}-{fingerprint[:16]}.seg"
+        segment = SharedSegment.attach(segment_dir, name, fingerprint)
+        try:
+            shared = attach_snapshot(snapshot, segment) if segment is not None else None
+        except ValueError:
+            shared = None
+        if shared is None:
+            segment = SharedSegment.create(segment_dir, name, snapshot_arrays(snapshot), fingerprint)
+            SharedSegment.remove_stale(segment_dir, SEGMENT_PREFIX, keep=name)
+            shared = attach_snapshot(snapshot, segment)
+            self.metrics.increment('shared_segment_builds')
+        self.shared_segment = segment
+        return shared
+    
+    def release_shared_segment(self):
+        # The process that built the segment removes it on shutdown; attached ones keep it mapped
+        if self.shared_segment is not None and self.shared_segment.created:
+            self.shared_segment.unlink()
+    
+    def training_copy(self, snapshot=None):
+        # Shares settings, caches and metrics; training writes only reach its own
+        # snapshot and frames, which are dropped with it
+        trainer = copy.copy(self)
+        trainer.snapshot = snapshot if snapshot is not None else ModelSnapshot()
+        trainer.df = None
+        trainer.X_reg_scaled = None
+        return trainer
+    
+    def style_group(self, style):
+        # Same grouping as the Style one-hot columns ('IPA - American' -> 'IPA')
+        return style.split(' - ')[0].split(' / ')[0]
+    
+    def mainstream_flag(self, beer_name_full, number_of_reviews):
+        return int(self.matches_mainstream_pattern(beer_name_full) or number_of_reviews >= 300)
+    
+    def upsert_beers(self, beers):
+        """Add beers, or replace the ones whose 'Beer Name (Full)' is already known.
+        
+        Each beer is a dict with the CSV columns the recommender uses: Name,
+        Style, ABV, the flavor features, review_overall, number_of_reviews and
+        optionally Description. Returns the catalog rows written.
+        """
+        beers = list({beer['Beer Name (Full)']: beer for beer in beers}.values())
+        keys = [beer['Beer Name (Full)'] for beer in beers]
+        values = {
+            'keys': keys,
+            'names': [beer['Name'] for beer in beers],
+            'descriptions': [beer.get('Description', '') for beer in beers],
+            'style': [beer['Style'] for beer in beers],
+            'strength': [self.get_strength(beer['ABV']) for beer in beers],
+            'abv': [float(beer['ABV']) for beer in beers],
+            'flavors': [[beer[feat] for feat in CompactCatalog.flavor_features] for beer in beers],
+            'review_overall': [float(beer['review_overall']) for beer in beers],
+            'number_of_reviews': [int(beer['number_of_reviews']) for beer in beers],
+            'mainstream': [self.mainstream_flag(key, int(beer['number_of_reviews'])) for key, beer in zip(keys, beers)]
+        }
+        
+        def build(snapshot, rows):
+            # Scaled with the fitted recommendation layout, exactly like a query row;
+            # a style the encoder has not seen gets no one-hot column until the next refit
+            features = self.build_query_matrix(
+                [{**{feat: beer[feat] for feat in self.scaling_features}, 'style': self.style_group(beer['Style'])}
+                 for beer in beers],
+                snapshot.recommend_layout, type="Recommend"
             )
+            return values, features
+        
+        return self.apply_catalog_update(keys, build, append=True, counter='catalog_upserts')
+    
+    def delete_beers(self, keys):
+        """Remove beers by 'Beer Name (Full)'; unknown keys raise KeyError"""
+        keys = list(dict.fromkeys(keys))
+        return self.apply_catalog_update(keys, lambda snapshot, rows: ({}, None), live=False,
+                                         counter='catalog_deletes')
+    
+    def update_reviews(self, reviews):
+        """Set review_overall and/or number_of_reviews, given {beer name (full): {column: value}}.
+        
+        The mainstream flag follows the review count.
+        """
+        keys = list(reviews)
+        
+        def build(snapshot, rows):
+            catalog = snapshot.catalog
+            review_overall = [float(reviews[key].get('review_overall', catalog.review_overall[row]))
+                              for key, row in zip(keys, rows)]
+            number_of_reviews = [int(reviews[key].get('number_of_reviews', catalog.number_of_reviews[row]))
+                                 for key, row in zip(keys, rows)]
+            values = {
+                'review_overall': review_overall,
+                'number_of_reviews': number_of_reviews,
+                'mainstream': [self.mainstream_flag(key, count) for key, count in zip(keys, number_of_reviews)]
+            }
+            return values, None
+        
+        return self.apply_catalog_update(keys, build, counter='catalog_review_updates')
+    
+    def apply_catalog_update(self, keys, build, live=True, append=False, counter='catalog_updates'):
+        # build(snapshot, rows) -> (catalog values, scaled feature rows or None).
+        # Publishes one snapshot with the new catalog, feature matrix and the
+        # neighbor partitions a changed row left or joined refitted.
+        with self.update_lock, self.metrics.span('catalog_update'):
+            snapshot = self.serving_snapshot()
+            old_catalog = snapshot.catalog
+            rows = []
+            for key in keys:
+                row = old_catalog.row_of(key)
+                if row is None:
+                    if not append:
+                        raise KeyError(f"Unknown beer {key!r}")
+                    row = len(old_catalog) + sum(1 for previous in rows if previous >= len(old_catalog))
+                rows.append(row)
+            rows = np.array(rows, dtype=np.int64)
+            values, features = build(snapshot, rows)
+            catalog = old_catalog.with_rows(rows, values, live=[live] * len(rows))
             
-            return json.loads(response.choices[0].message.content)
-        except Exception as e:
-            raise Exception(f"Error calling GROQ API: {e}")
+            X_recommend_scaled = snapshot.X_recommend_scaled
+            if features is not None:
+                X_recommend_scaled = np.empty((len(catalog), X_recommend_scaled.shape[1]),
+                                              dtype=X_recommend_scaled.dtype)
+                X_recommend_scaled[:len(old_catalog)] = snapshot.X_recommend_scaled
+                X_recommend_scaled[rows] = features
+            
+            updated = snapshot.replace(catalog=catalog, X_recommend_scaled=X_recommend_scaled)
+            recommend_index = dict(snapshot.recommend_index)
+            existing_rows = rows[rows < len(old_catalog)]
+            for key, partition in recommend_index.items():
+                if (self.partition_mask(*key, catalog=catalog, rows=rows).any()
+                        or self.partition_mask(*key, catalog=old_catalog, rows=existing_rows).any()):
+                    recommend_index[key] = self.refresh_partition(key, partition, updated)
+            self.publish(updated.replace(recommend_index=recommend_index))
+            
+            self.refit_policy.record(keys)
+            self.metrics.increment(counter, len(keys))
+        self.refit_if_due()
+        return rows
     
-    def predict_rating(self, llm_output):
-        test_point = {col: 0 for col in self.X_reg_scaled.columns}
+    def refresh_partition(self, key, partition, snapshot):
+        # The partition's index type is kept; an IVF index keeps its centroids
+        mask = self.partition_mask(*key, catalog=snapshot.catalog)
+        if partition is None or not mask.any():
+            return self.build_partition(*key, snapshot=snapshot)
         
-        for feat in self.scaling_features:
-            test_point[feat] = [llm_output[feat]]
+        return {
+            'knn': partition['knn'].refit(snapshot.X_recommend_scaled[mask]),
+            'rows': np.flatnonzero(mask).astype(np.int32)
+        }
+    
+    def refit_if_due(self):
+        """Retrain when the refit policy says so (call periodically for max_age_seconds)"""
+        if not self.refit_policy.due():
+            return False
+        if self.background_refit:
+            self.run_in_background(self.refit)
+        else:
+            self.refit()
+        return True
+    
+    def refit(self):
+        """Full retrain on the updated catalog: regression model, scalers, encoders and
+        neighbor indexes. Deleted rows are dropped and the rest renumbered.
         
-        test_point['mainstream'] = llm_output['mainstream']
+        Requests keep using the current snapshot until the new one is published;
+        catalog updates wait for the retrain so none of them is lost.
+        """
+        with self.update_lock, self.metrics.span('refit'):
+            catalog = self.serving_snapshot().catalog.compacted()
+            trainer = self.training_copy(ModelSnapshot(catalog=catalog))
+            trainer.df = catalog.to_frame()
+            trainer.train_models()
+            self.publish(trainer.snapshot)
+            self.metrics.increment('refits')
+    
+    def publish(self, snapshot):
+        # One reference assignment: a request sees the old snapshot or the new one
+        self.snapshot = snapshot
+    
+    def serving_snapshot(self):
+        snapshot = self.snapshot
+        if not snapshot.ready:
+            raise ModelNotReady(self.status()['message'])
+        return snapshot
+    
+    def status(self):
+        """Serving state: 'ready', 'warming_up' (first model still loading or training),
+        'failed' or 'not_loaded', with a message for users and the snapshot version
+        """
+        training = self.training_thread is not None and self.training_thread.is_alive()
+        if self.snapshot.ready:
+            state, message = 'ready', "Ready"
+        elif training:
+            state, message = 'warming_up', "The beer model is warming up; try again in a moment."
+        elif self.training_error is not None:
+            state, message = 'failed', f"Model training failed: {self.training_error}"
+        else:
+            state, message = 'not_loaded', "No model loaded; call load_or_build() or start_background_build()."
+        return {
+            'state': state,
+            'message': message,
+            'training': training,
+            'snapshot_version': self.snapshot.version
+        }
+    
+    def after_fork(self):
+        # Called in a forked worker (server.py): locks, connections and clients held by
+        # the parent are replaced; the published snapshot is shared copy-on-write
+        self.training_lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        self._query_buffers = threading.local()
+        if self._llm_client is not None:
+            self._llm_client.after_fork()
+        for component in (self.llm_cache, self.semantic_cache, self.metrics, self.cursors, self.warm_results,
+                          self.in_flight):
+            component.after_fork()
+    
+    def start_background_build(self, bundle_dir='./artifacts'):
+        """Load or train the model in a background thread and return it at once.
         
-        style_column = f"Style_{llm_output['style']}"
-        if style_column in self.X_reg_scaled.columns:
-            test_point[style_column] = 1
+        Requests raise ModelNotReady until the first snapshot is published.
+        """
+        return self.run_in_background(self.load_or_build, bundle_dir)
+    
+    def retry_background_build(self, bundle_dir='./artifacts', backoff_seconds=30.0):
+        """start_background_build() again after a failed one, once its backoff has passed
+        (backoff_seconds, doubling with each consecutive failure up to 32x). Returns
+        the new thread, or None when nothing was started; safe to call on every request.
+        """
+        with self.training_lock:
+            if self.training_error is None or self.snapshot.ready:
+                return None
+            if self.training_thread is not None and self.training_thread.is_alive():
+                return None
+            backoff = backoff_seconds * 2 ** min(self.training_failures - 1, 5)
+            if time.monotonic() - self.training_failed_at < backoff:
+                return None
+            # Claims the retry: other callers see a fresh failure time until it finishes
+            self.training_failed_at = time.monotonic()
+        self.metrics.increment('training_retries')
+        return self.start_background_build(bundle_dir)
+    
+    def run_in_background(self, target, *args):
+        # One training job at a time; a failure is kept for status()
+        with self.training_lock:
+            if self.training_thread is not None and self.training_thread.is_alive():
+                return self.training_thread
+            self.training_error = None
+            self.training_thread = threading.Thread(target=self.run_training, args=(target,) + args,
+                                                    name='beer-buddy-training', daemon=True)
+            self.training_thread.start()
+            return self.training_thread
+    
+    def run_training(self, target, *args):
+        try:
+            with self.metrics.span('background_training'):
+                target(*args)
+        except Exception as e:
+            self.training_failures += 1
+            self.training_failed_at = time.monotonic()
+            self.training_error = e
+        else:
+            self.training_failures = 0
+    
+    def get_rule_features(self, user_input):
+        # Returns (features, use_without_llm); features is None in 'llm' mode
+        if self.feature_mode == 'llm':
+            return None, False
+        rule_output, confidence = self.rule_extractor.extract(user_input)
+        return rule_output, self.feature_mode == 'rules' or confidence >= self.rule_confidence_threshold
+    
+    def rule_fallback_features(self, user_input, rule_output, error):
+        if not self.rule_fallback:
+            raise error
+        if rule_output is None:
+            rule_output, _ = self.rule_extractor.extract(user_input)
+        return rule_output
+    
+    def record_feature_source(self, source):
+        self.metrics.increment(f"features_{source}")
+        self.metrics.annotate('feature_source', source)
+    
+    def get_cached_features(self, user_input, cache_key):
+        with self.metrics.span('llm_cache'):
+            cached = self.llm_cache.get(cache_key)
+        if cached is not None:
+            self.record_feature_source('llm_cache')
+            return cached
         
-        test_point = pd.DataFrame(test_point)
-        test_point[self.scaling_features] = self.scalar.transform(test_point[self.scaling_features])
-        test_point = test_point[self.X_reg_scaled.columns]
+        with self.metrics.span('semantic_cache'):
+            cached = self.semantic_cache.lookup(user_input)
+        if cached is not None:
+            self.record_feature_source('semantic_cache')
+        return cached
+    
+    def get_beer_features_from_text(self, user_input, on_token=None):
+        # on_token(text) receives the LLM reply as it streams in (LLM path only)
+        features, pending = self.local_features(user_input)
+        if pending is None:
+            return features
+        try:
+            with self.metrics.span('llm'):
+                if on_token is not None:
+                    llm_output = self.request_beer_features_streamed(user_input, on_token)
+                else:
+                    llm_output = self.request_beer_features(user_input)
+        except Exception as e:
+            return self.llm_failed(user_input, pending, e)
+        return self.llm_answered(user_input, pending, llm_output)
+    
+    def local_features(self, user_input):
+        """Features without the LLM: (features, None) when the rules or a cache
+        answer, else (None, pending) to pass to llm_answered / llm_failed.
         
-        test_point = test_point.to_numpy()
-        predicted_rating = self.gb_model.predict(test_point.reshape(1, -1))[0]
+        The sync and async paths share this and differ only in the LLM call.
+        """
+        with self.metrics.span('rules'):
+            rule_output, use_rules = self.get_rule_features(user_input)
+        if use_rules:
+            self.record_feature_source('rules')
+            return rule_output, None
+        
+        cache_key = make_cache_key(user_input, self.llm_model, SYSTEM_PROMPT)
+        cached = self.get_cached_features(user_input, cache_key)
+        if cached is not None:
+            return cached, None
+        return None, (rule_output, cache_key)
+    
+    def llm_answered(self, user_input, pending, llm_output):
+        _, cache_key = pending
+        self.record_feature_source('llm')
+        self.llm_cache.set(cache_key, llm_output)
+        self.semantic_cache.add(user_input, llm_output)
+        return llm_output
+    
+    def llm_failed(self, user_input, pending, error):
+        rule_output, _ = pending
+        llm_output = self.rule_fallback_features(user_input, rule_output, error)
+        self.record_feature_source('rule_fallback')
+        return llm_output
+    
+    def build_feature_request(self, user_input):
+        return {
+            'model': self.llm_model,
+            'messages': [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_input}
+            ],
+            'temperature': 0.3,
+            'response_format': {"type": "json_object"}
+        }
+    
+    def request_beer_features(self, user_input):
+        try:
+            content = self.llm_client.chat(**self.build_feature_request(user_input))
+            return json.loads(content)
+        except Exception as e:
+            raise Exception(f"Error calling GROQ API: {e}")
+    
+    def request_beer_features_streamed(self, user_input, on_token):
+        request = self.build_feature_request(user_input)
+        # Groq's JSON mode does not stream; the system prompt already asks for a JSON object
+        del request['response_format']
+        try:
+            parts = []
+            for text in self.llm_client.chat_stream(**request):
+                parts.append(text)
+                on_token(text)
+            return parse_json_object(''.join(parts))
+        except Exception as e:
+            raise Exception(f"Error calling GROQ API: {e}")
+    
+    async def request_beer_features_async(self, user_input):
+        try:
+            content = await self.llm_client.chat_async(**self.build_feature_request(user_input))
+            return json.loads(content)
+        except Exception as e:
+            raise Exception(f"Error calling GROQ API: {e}")
+    
+    async def get_beer_features_from_text_async(self, user_input):
+        features, pending = self.local_features(user_input)
+        if pending is None:
+            return features
+        try:
+            with self.metrics.span('llm'):
+                llm_output = await self.request_beer_features_async(user_input)
+        except Exception as e:
+            return self.llm_failed(user_input, pending, e)
+        return self.llm_answered(user_input, pending, llm_output)
+    
+    def predict_rating(self, llm_output, snapshot=None):
+        snapshot = snapshot if snapshot is not None else self.serving_snapshot()
+        test_point = self.fill_query_vector(llm_output, snapshot.regression_layout, type="Regressor")
+        predicted_rating = snapshot.gb_model.predict(test_point)[0]
         
         return predicted_rating
     
@@ -351,102 +1170,280 @@ class BeerRecommender:
     def get_quality_score(self, rating, num_reviews):
         return rating * (0.6 + 0.4 * np.log1p(num_reviews) / 10)
     
-    def generate_test_point(self, llm_output, X_train, scalar, type):
-        test_point = {col: 0 for col in X_train.columns}
+    def build_query_layout(self, columns, scalar, style_codes=None):
+        # Column positions and scaler coefficients for building query rows with plain numpy writes.
+        # Style is either one-hot (style_positions) or, given style_codes, one code column.
+        column_index = {col: i for i, col in enumerate(columns)}
+        return {
+            'width': len(columns),
+            'feature_positions': np.array([column_index[feat] for feat in self.scaling_features]),
+            'scale': scalar.scale_.copy(),
+            'offset': scalar.min_.copy(),
+            'style_positions': {col[len('Style_'):]: i for col, i in column_index.items()
+                                if col.startswith('Style_')},
+            'style_position': column_index.get('Style'),
+            'style_codes': style_codes,
+            'mainstream_position': column_index.get('mainstream')
+        }
+    
+    def query_buffers(self, layout):
+        # Preallocated per-thread scratch rows, reused by every single-query call
+        buffers = getattr(self._query_buffers, 'buffers', None)
+        if buffers is None:
+            buffers = self._query_buffers.buffers = {}
+        key = id(layout)
+        if key not in buffers or buffers[key][0] is not layout:
+            buffers[key] = (layout, np.zeros((1, layout['width'])), np.zeros(len(self.scaling_features)))
+        return buffers[key][1], buffers[key][2]
+    
+    def fill_query_vector(self, llm_output, layout, type):
+        vector, values = self.query_buffers(layout)
+        vector.fill(0)
         
-        for feat in self.scaling_features:
-            test_point[feat] = [llm_output[feat]]
+        for i, feat in enumerate(self.scaling_features):
+            values[i] = llm_output[feat]
+        # Same affine map as MinMaxScaler.transform (X * scale_ + min_)
+        np.multiply(values, layout['scale'], out=values)
+        np.add(values, layout['offset'], out=values)
+        vector[0, layout['feature_positions']] = values
         
-        style_column = f"Style_{llm_output['style']}"
-        if style_column in X_train.columns:
-            test_point[style_column] = 1
+        style_codes = layout.get('style_codes')
+        if style_codes is not None:
+            vector[0, layout['style_position']] = style_codes.get(llm_output['style'], np.nan)
+        else:
+            style_position = layout['style_positions'].get(llm_output['style'])
+            if style_position is not None:
+                vector[0, style_position] = 1
         
         if type == 'Regressor':
-            test_point['mainstream'] = llm_output['mainstream']
-        
-        test_point = pd.DataFrame(test_point)
-        test_point[self.scaling_features] = scalar.transform(test_point[self.scaling_features])
-        test_point = test_point[X_train.columns]
+            vector[0, layout['mainstream_position']] = llm_output['mainstream']
         
-        return test_point
+        return vector
     
-    def get_beer_recommendations(self, llm_output, alt=False, alt_rating_threshold=3.0):
-        X_recommend = self.df[['Style'] + self.scaling_features + ['mainstream', 'strength']].copy()
-        y_recommend = self.df[['Name', 'Description', 'review_overall', 'number_of_reviews']].copy()
-        
-        X_recommend['Style'] = X_recommend['Style'].str.split(' - ').str[0].str.split(' / ').str[0]
-        
-        self.encoder2 = OneHotEncoder(sparse_output=False)
-        encoded_array = self.encoder2.fit_transform(X_recommend[['Style']])
-        feature_names = self.encoder2.get_feature_names_out(['Style'])
-        encoded_df = pd.DataFrame(encoded_array, columns=feature_names, index=X_recommend.index)
-        X_recommend = pd.concat([X_recommend.drop('Style', axis=1), encoded_df], axis=1)
-        
-        if alt:
-            rating_mask = y_recommend['review_overall'] >= alt_rating_threshold
-            X_recommend = X_recommend[rating_mask]
-            y_recommend = y_recommend[rating_mask]
+    def generate_test_point(self, llm_output, layout, type):
+        return self.fill_query_vector(llm_output, layout, type).copy()
+    
+    def candidate_pool_size(self, k, candidate_pool=None):
+        # Also where k and candidate_pool are validated, before any neighbor search
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        if candidate_pool is not None and candidate_pool < 1:
+            raise ValueError(f"candidate_pool must be at least 1, got {candidate_pool}")
+        return candidate_pool if candidate_pool is not None else max(self.recommend_n_neighbors, 5 * k)
+    
+    def rank_query(self, llm_output, alt=False, alt_rating_threshold=3.0, snapshot=None, k=None, candidate_pool=None):
+        snapshot = snapshot if snapshot is not None else self.serving_snapshot()
+        k = k if k is not None else self.recommend_top_k
+        n_neighbors = self.candidate_pool_size(k, candidate_pool)
+        partition = self.get_partition(llm_output, alt=alt, alt_rating_threshold=alt_rating_threshold,
+                                       snapshot=snapshot)
         
-        if llm_output['mainstream'] == 1:
-            mainstream_mask = X_recommend['mainstream'] == 1
-            X_recommend = X_recommend[mainstream_mask]
-            y_recommend = y_recommend[mainstream_mask]
+        test_point_recommendation = self.fill_query_vector(llm_output, snapshot.recommend_layout, type="Recommend")
         
-        strength = self.get_strength(llm_output['ABV'])
-        strength_mask = X_recommend['strength'] == strength
-        X_recommend_sub = X_recommend[strength_mask]
-        y_recommend_sub = y_recommend[strength_mask]
+        distances, indices = partition['knn'].kneighbors(test_point_recommendation,
+                                                         n_neighbors=n_neighbors)
         
-        X_recommend_sub = X_recommend_sub.drop(columns=['strength', 'mainstream'])
+        return self.rank_neighbors(partition, distances[0], indices[0], catalog=snapshot.catalog, k=k)
+    
+    def get_beer_recommendations(self, llm_output, alt=False, alt_rating_threshold=3.0, snapshot=None, k=None,
+                                 candidate_pool=None, offset=0, limit=None):
+        check_page(offset, limit)
+        ranking = self.rank_query(llm_output, alt=alt, alt_rating_threshold=alt_rating_threshold, snapshot=snapshot,
+                                  k=k, candidate_pool=candidate_pool)
+        return ranking.page(offset, limit)
+    
+    def recommend_page(self, llm_output, k=20, limit=10, candidate_pool=None, alt=False, alt_rating_threshold=3.0,
+                       snapshot=None):
+        """First page of a k-beer ranking plus a cursor for the next (None when done);
+        limit=None returns the whole ranking"""
+        check_cursor_limit(limit)
+        ranking = self.rank_query(llm_output, alt=alt, alt_rating_threshold=alt_rating_threshold, snapshot=snapshot,
+                                  k=k, candidate_pool=candidate_pool)
+        ranking_id = self.cursors.add(ranking)
+        return self.cursor_page(ranking_id, ranking, 0, limit)
+    
+    def next_page(self, cursor, limit=10):
+        """The page at cursor, sliced from the stored ranking (no neighbor search);
+        raises ranking.CursorExpired once the ranking is gone"""
+        check_cursor_limit(limit)
+        ranking_id, ranking, offset = self.cursors.get(cursor)
+        return self.cursor_page(ranking_id, ranking, offset, limit)
+    
+    def cursor_page(self, ranking_id, ranking, offset, limit):
+        self.metrics.increment('recommendation_pages')
+        end = len(ranking) if limit is None else offset + limit
+        return {
+            'recommendations': ranking.page(offset, limit),
+            'next_cursor': self.cursors.cursor(ranking_id, end, ranking),
+            'total': len(ranking)
+        }
+    
+    def rank_neighbors(self, partition, distances, indices, catalog=None, k=None):
+        # Quality scores for the whole candidate pool in one numpy pass; ties keep neighbor order
+        catalog = catalog if catalog is not None else self.catalog
+        k = k if k is not None else self.recommend_top_k
+        rows = partition['rows'][indices]
+        ratings = catalog.review_overall[rows].astype(np.float64)
+        num_reviews = catalog.number_of_reviews[rows].astype(np.int64)
+        quality_scores = self.get_quality_score(ratings, num_reviews)
         
-        X_recommend_sub[self.scaling_features] = self.global_scaler_recommend.transform(
-            X_recommend_sub[self.scaling_features]
-        )
+        best = top_k_order(quality_scores, k)
+        return Ranking(catalog, rows[best], distances[best], indices[best], ratings[best], num_reviews[best],
+                       quality_scores[best])
+    
+    def get_recommendations(self, user_input, on_progress=None, **ranking):
+        # 'timings' holds the milliseconds spent in each stage of this request
+        # Fails fast (ModelNotReady) before any LLM call while the model warms up
+        # on_progress(stage, value) sees each partial result as soon as it exists:
+        # 'llm_token' (streamed reply text), 'user_features', 'predicted_rating',
+        # 'recommendations', then 'alt_recommendations' when the rating is low
+        # ranking: k, candidate_pool, offset, limit (see get_beer_recommendations)
+        snapshot = self.serving_snapshot()
+        tag, warm = self.warm_lookup(user_input, snapshot, ranking, on_progress)
+        if warm is not None:
+            return warm
         
-        X_recommend_scaled = X_recommend_sub
-        X_recommend_scaled_np = X_recommend_scaled.to_numpy()
-        y_recommend_np = y_recommend_sub.to_numpy()
+        def compute():
+            results = self.compute_recommendations(user_input, snapshot, on_progress, **ranking)
+            return self.keep_warm(user_input, tag, ranking, results)
         
-        test_point_recommendation = self.generate_test_point(
-            llm_output, X_recommend_scaled, self.global_scaler_recommend, type="Recommend"
-        )
-        test_point_recommendation_np = test_point_recommendation.values[0]
-        
-        knn = NearestNeighbors(n_neighbors=10, metric='euclidean')
-        knn.fit(X_recommend_scaled_np)
-        
-        distances, indices = knn.kneighbors([test_point_recommendation_np])
-        
-        top_10_beers = []
-        for i, idx in enumerate(indices[0]):
-            beer_info = {
-                'name': y_recommend_np[idx][0],
-                'description': y_recommend_np[idx][1],
-                'rating': y_recommend_np[idx][2],
-                'num_reviews': y_recommend_np[idx][3],
-                'distance': distances[0][i],
-                'index': idx
-            }
-            top_10_beers.append(beer_info)
+        # Duplicates arriving meanwhile wait for this computation instead of repeating it
+        results, shared = self.in_flight.do(self.flight_key(user_input, tag, ranking), compute)
+        return self.replay_results(results, 'coalesced', on_progress) if shared else results
+    
+    def compute_recommendations(self, user_input, snapshot, on_progress=None, **ranking):
+        on_token = None
+        if on_progress is not None:
+            on_token = lambda text: on_progress('llm_token', text)
+        with self.metrics.trace() as trace:
+            with self.metrics.span('features'):
+                llm_output = self.get_beer_features_from_text(user_input, on_token=on_token)
+            results = self.recommend_from_features(llm_output, snapshot=snapshot, on_progress=on_progress, **ranking)
+        return self.traced_results(results, trace)
+    
+    def traced_results(self, results, trace):
+        results['timings'] = trace.timings()
+        results['feature_source'] = trace.attributes.get('feature_source')
+        return results
+    
+    def warm_lookup(self, user_input, snapshot, ranking, on_progress=None):
+        # (tag, warmed results replayed through on_progress, or None)
+        tag = self.warm_tag(snapshot)
+        if not ranking:
+            warm = self.warm_results.get(user_input, tag)
+            if warm is not None:
+                return tag, self.replay_results(warm, 'warm_results', on_progress)
+        return tag, None
+    
+    def keep_warm(self, user_input, tag, ranking, results):
+        # Degraded results (the LLM failed, rule fallback) are never warmed: the tag
+        # ignores where features came from, so they would outlive the outage
+        if not ranking and results['feature_source'] != 'rule_fallback':
+            # A canned query invalidated by a new snapshot is warm again after one request
+            self.warm_results.set(user_input, tag, results)
+        return results
+    
+    def warm_tag(self, snapshot):
+        # What a warmed result depends on besides the prompt
+        system_prompt_hash = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()
+        return (snapshot.version, self.llm_model, system_prompt_hash, self.feature_mode)
+    
+    def flight_key(self, user_input, tag, ranking):
+        return (normalize_prompt(user_input), tag, tuple(sorted(ranking.items())))
+    
+    def replay_results(self, results, source, on_progress=None):
+        # Results computed elsewhere (warmed, or by a coalesced request): the stages
+        # are reported at once and the request is timed as what it cost here
+        with self.metrics.trace() as trace:
+            self.record_feature_source(source)
+            if on_progress is not None:
+                on_progress('user_features', results['user_features'])
+                for stage in ('predicted_rating', 'recommendations', 'alt_recommendations'):
+                    if results[stage] is not None:
+                        on_progress(stage, results[stage])
+        return {**results, 'timings': trace.timings(), 'feature_source': source}
+    
+    def warm_up(self, queries=None):
+        """Compute and keep full results for the canned queries (given queries replace
+        warm_results.queries) under the published snapshot; returns how many were warmed"""
+        if queries is not None:
+            self.warm_results.queries = queries
+        snapshot = self.serving_snapshot()
+        tag = self.warm_tag(snapshot)
+        warmed = 0
+        with self.metrics.span('warm_up'):
+            for query in self.warm_results.queries:
+                try:
+                    results = self.compute_recommendations(query, snapshot)
+                except Exception:
+                    self.metrics.increment('warm_up_errors')
+                    continue
+                if results['feature_source'] == 'rule_fallback':
+                    # Left cold; the first real request warms it once the LLM answers
+                    self.metrics.increment('warm_up_degraded')
+                    continue
+                self.warm_results.set(query, tag, results)
+                warmed += 1
+        return warmed
+    
+    def start_warm_up(self, queries=None):
+        """warm_up() in a background thread, after the background build (if any) has
+        published a model; returns the thread"""
+        def run():
+            training = self.training_thread
+            if training is not None:
+                training.join()
+            if self.snapshot.ready:
+                self.warm_up(queries)
         
-        for beer in top_10_beers:
-            beer['quality_score'] = self.get_quality_score(beer['rating'], beer['num_reviews'])
+        thread = threading.Thread(target=run, name='beer-buddy-warm-up', daemon=True)
+        thread.start()
+        return thread
+    
+    async def get_recommendations_async(self, user_input, on_progress=None, **ranking):
+        # get_recommendations for asyncio; the LLM reply is not streamed, so
+        # on_progress sees every stage but 'llm_token'
+        snapshot = self.serving_snapshot()
+        tag, warm = self.warm_lookup(user_input, snapshot, ranking, on_progress)
+        if warm is not None:
+            return warm
         
-        top_10_beers.sort(key=lambda x: x['quality_score'], reverse=True)
+        async def compute():
+            results = await self.compute_recommendations_async(user_input, snapshot, on_progress, **ranking)
+            return self.keep_warm(user_input, tag, ranking, results)
         
-        return top_10_beers[:2]
+        # Shares flights with get_recommendations: threads and tasks coalesce alike
+        results, shared = await self.in_flight.do_async(self.flight_key(user_input, tag, ranking), compute)
+        return self.replay_results(results, 'coalesced', on_progress) if shared else results
+    
+    async def compute_recommendations_async(self, user_input, snapshot, on_progress=None, **ranking):
+        with self.metrics.trace() as trace:
+            with self.metrics.span('features'):
+                llm_output = await self.get_beer_features_from_text_async(user_input)
+            results = self.recommend_from_features(llm_output, snapshot=snapshot, on_progress=on_progress, **ranking)
+        return self.traced_results(results, trace)
     
-    def get_recommendations(self, user_input):
-        llm_output = self.get_beer_features_from_text(user_input)
-        predicted_rating = self.predict_rating(llm_output)
+    def recommend_from_features(self, llm_output, snapshot=None, on_progress=None, **ranking):
+        # Every stage reads the same snapshot, even if a new one is published meanwhile
+        snapshot = snapshot if snapshot is not None else self.serving_snapshot()
+        progress = on_progress if on_progress is not None else lambda stage, value: None
+        progress('user_features', llm_output)
+        with self.metrics.span('predict_rating'):
+            predicted_rating = self.predict_rating(llm_output, snapshot=snapshot)
+        progress('predicted_rating', predicted_rating)
         
         # Get regular recommendations
-        recommendations = self.get_beer_recommendations(llm_output, alt=False)
+        with self.metrics.span('recommendations'):
+            recommendations = self.get_beer_recommendations(llm_output, alt=False, snapshot=snapshot, **ranking)
+        progress('recommendations', recommendations)
         
         # Get alternative recommendations if rating is low
         alt_recommendations = None
         if predicted_rating < 3.0:
-            alt_recommendations = self.get_beer_recommendations(llm_output, alt=True, alt_rating_threshold=3.0)
+            with self.metrics.span('alt_recommendations'):
+                alt_recommendations = self.get_beer_recommendations(llm_output, alt=True, alt_rating_threshold=3.0,
+                                                                    snapshot=snapshot, **ranking)
+            progress('alt_recommendations', alt_recommendations)
         
         return {
             'predicted_rating': predicted_rating,
@@ -454,3 +1451,111 @@ class BeerRecommender:
             'alt_recommendations': alt_recommendations,
             'user_features': llm_output
         }
+    
+    def build_query_matrix(self, llm_outputs, layout, type):
+        values = np.array([[llm_output[feat] for feat in self.scaling_features]
+                           for llm_output in llm_outputs], dtype=float)
+        
+        matrix = np.zeros((len(llm_outputs), layout['width']))
+        matrix[:, layout['feature_positions']] = values * layout['scale'] + layout['offset']
+        
+        style_codes = layout.get('style_codes')
+        for row, llm_output in enumerate(llm_outputs):
+            if style_codes is not None:
+                matrix[row, layout['style_position']] = style_codes.get(llm_output['style'], np.nan)
+            else:
+                style_position = layout['style_positions'].get(llm_output['style'])
+                if style_position is not None:
+                    matrix[row, style_position] = 1
+        
+        if type == 'Regressor':
+            matrix[:, layout['mainstream_position']] = [llm_output['mainstream'] for llm_output in llm_outputs]
+        
+        return matrix
+    
+    def get_beer_recommendations_batch(self, llm_outputs, query_matrix, alt=False, alt_rating_threshold=3.0,
+                                       snapshot=None, k=None, candidate_pool=None):
+        snapshot = snapshot if snapshot is not None else self.serving_snapshot()
+        k = k if k is not None else self.recommend_top_k
+        n_neighbors = self.candidate_pool_size(k, candidate_pool)
+        groups = {}
+        for row, llm_output in enumerate(llm_outputs):
+            key = self.partition_key(llm_output, alt=alt, alt_rating_threshold=alt_rating_threshold)
+            groups.setdefault(key, []).append(row)
+        
+        # One multi-query kneighbors call per partition
+        results = [None] * len(llm_outputs)
+        for rows in groups.values():
+            partition = self.get_partition(llm_outputs[rows[0]], alt=alt, alt_rating_threshold=alt_rating_threshold,
+                                           snapshot=snapshot)
+            distances, indices = partition['knn'].kneighbors(query_matrix[rows], n_neighbors=n_neighbors)
+            for i, row in enumerate(rows):
+                results[row] = self.rank_neighbors(partition, distances[i], indices[i], catalog=snapshot.catalog,
+                                                   k=k).page()
+        
+        return results
+    
+    def features_to_llm_outputs(self, features, styles=None):
+        if len(features) == 0:
+            return []
+        if isinstance(features[0], dict):
+            return list(features)
+        
+        # Array rows are the scaling features followed by the mainstream flag
+        features = np.asarray(features, dtype=float)
+        expected_width = len(self.scaling_features) + 1
+        if features.ndim != 2 or features.shape[1] != expected_width:
+            raise ValueError(
+                f"Expected an (N x {expected_width}) array of {self.scaling_features + ['mainstream']}"
+            )
+        if styles is None:
+            styles = [''] * len(features)
+        
+        llm_outputs = []
+        for row, style in zip(features, styles):
+            llm_output = dict(zip(self.scaling_features, row.tolist()))
+            llm_output['mainstream'] = int(row[-1])
+            llm_output['style'] = style
+            llm_outputs.append(llm_output)
+        return llm_outputs
+    
+    def recommend_from_features_batch(self, features, styles=None, snapshot=None):
+        llm_outputs = self.features_to_llm_outputs(features, styles)
+        if not llm_outputs:
+            return []
+        
+        snapshot = snapshot if snapshot is not None else self.serving_snapshot()
+        regression_matrix = self.build_query_matrix(llm_outputs, snapshot.regression_layout, type="Regressor")
+        predicted_ratings = snapshot.gb_model.predict(regression_matrix)
+        
+        recommend_matrix = self.build_query_matrix(llm_outputs, snapshot.recommend_layout, type="Recommend")
+        recommendations = self.get_beer_recommendations_batch(llm_outputs, recommend_matrix, alt=False,
+                                                              snapshot=snapshot)
+        
+        # Alternatives only for the queries whose predicted rating is low
+        alt_recommendations = [None] * len(llm_outputs)
+        alt_rows = np.flatnonzero(predicted_ratings < 3.0)
+        if len(alt_rows):
+            alt_results = self.get_beer_recommendations_batch(
+                [llm_outputs[row] for row in alt_rows], recommend_matrix[alt_rows],
+                alt=True, alt_rating_threshold=3.0, snapshot=snapshot
+            )
+            for row, alt_result in zip(alt_rows, alt_results):
+                alt_recommendations[row] = alt_result
+        
+        return [
+            {
+                'predicted_rating': predicted_ratings[row],
+                'recommendations': recommendations[row],
+                'alt_recommendations': alt_recommendations[row],
+                'user_features': llm_outputs[row]
+            }
+            for row in range(len(llm_outputs))
+        ]
+    
+    def get_recommendations_batch(self, user_inputs):
+        snapshot = self.serving_snapshot()
+        with self.metrics.span('batch_features'):
+            llm_outputs = [self.get_beer_features_from_text(user_input) for user_input in user_inputs]
+        with self.metrics.span('batch_recommend'):
+            return self.recommend_from_features_batch(llm_outputs, snapshot=snapshot)
@@ -0,0 +1,864 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the beer recommender hot paths
+Run this from the beer-buddy directory: python benchmark.py
+
+Runs offline: the Groq API is replaced by a local stand-in that answers with
+fixed feature dicts. Stage results are written to a JSON file that can be
+passed back with --compare to diff two commits.
+"""
+
+import sys
+sys.path.append('.')
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import string
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import httpx
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+
+from beer_recommender import STRENGTHS, BeerRecommender
+from catalog import CompactCatalog, StringStore
+from neighbors import BACKENDS, BruteForceIndex, SklearnIndex, make_index
+from regressors import TrainingBudget
+from llm_client import LLMClient
+from llm_transport import RecordingTransport, ReplayTransport, StubChatServer
+from terminal_output import format_terminal_output
+
+def legacy_mainstream_flags(recommender, beer_names_full):
+    """Row-by-row pattern loop that load_and_preprocess_data used before the compiled matcher"""
+    def matches(beer_name_full):
+        combined_name = beer_name_full.lower()
+        for pattern in recommender.mainstream_patterns:
+            if pattern in combined_name:
+                return True
+        return False
+
+    frame = beer_names_full.to_frame()
+    return frame.apply(lambda row: matches(row['Beer Name (Full)']), axis=1)
+
+def legacy_test_point(recommender, llm_output, columns, scalar, type):
+    """DataFrame-based query row that predict_rating/generate_test_point built before the layouts"""
+    test_point = {col: 0 for col in columns}
+
+    for feat in recommender.scaling_features:
+        test_point[feat] = [llm_output[feat]]
+
+    style_column = f"Style_{llm_output['style']}"
+    if style_column in columns:
+        test_point[style_column] = 1
+
+    if type == 'Regressor':
+        test_point['mainstream'] = llm_output['mainstream']
+
+    test_point = pd.DataFrame(test_point)
+    test_point[recommender.scaling_features] = scalar.transform(test_point[recommender.scaling_features])
+    return test_point[columns].to_numpy()
+
+def legacy_serving_state(recommender):
+    """Object-column frames, float64 matrix and per-partition object arrays served before the compact catalog"""
+    df = recommender.df
+    X_recommend_scaled = recommender.X_recommend_scaled.astype(np.float64)
+    y_recommend = df[['Name', 'Description', 'review_overall', 'number_of_reviews']]
+    recommend_index = {}
+    for alt_threshold in [None] + list(recommender.alt_rating_thresholds):
+        for mainstream_only in (False, True):
+            for strength in STRENGTHS:
+                mask = (df['strength'] == strength).to_numpy()
+                if alt_threshold is not None:
+                    mask &= (df['review_overall'] >= alt_threshold).to_numpy()
+                if mainstream_only:
+                    mask &= (df['mainstream'] == 1).to_numpy()
+                if mask.any():
+                    knn = NearestNeighbors(n_neighbors=recommender.recommend_n_neighbors)
+                    recommend_index[(mainstream_only, strength, alt_threshold)] = {
+                        'knn': knn.fit(X_recommend_scaled[mask]), 'y': y_recommend[mask].to_numpy()
+                    }
+    return {'df': df, 'X_reg_scaled': recommender.X_reg_scaled, 'X_recommend_scaled': X_recommend_scaled,
+            'y_recommend': y_recommend, 'recommend_index': recommend_index}
+
+def synthetic_patterns(count, seed=0):
+    """Random brand-like patterns that do not occur in the catalog"""
+    rng = random.Random(seed)
+    return ['zq' + ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12)))
+            for _ in range(count)]
+
+def best_of(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def benchmark_mainstream_matching(row_scales=(1, 10, 100), extra_patterns=(0, 1000), repeat=3):
+    """Compare the legacy apply loop with the compiled multi-pattern matcher"""
+    names = pd.read_csv('./data/beer_profile_and_ratings.csv')['Beer Name (Full)']
+    base_patterns = list(BeerRecommender().mainstream_patterns)
+
+    print(f"{'rows':>8} {'patterns':>9} {'apply loop':>12} {'compiled':>12} {'speedup':>8}")
+    for scale in row_scales:
+        scaled_names = pd.concat([names] * scale, ignore_index=True)
+        for extra in extra_patterns:
+            recommender = BeerRecommender()
+            recommender.mainstream_patterns = base_patterns + synthetic_patterns(extra)
+
+            legacy_time, legacy = best_of(lambda: legacy_mainstream_flags(recommender, scaled_names), repeat)
+            compiled_time, compiled = best_of(lambda: recommender.match_mainstream_names(scaled_names), repeat)
+
+            if not (legacy.to_numpy() == compiled.to_numpy()).all():
+                raise AssertionError("Compiled matcher flags differ from the apply loop")
+
+            print(f"{len(scaled_names):>8} {len(recommender.mainstream_patterns):>9} "
+                  f"{legacy_time * 1000:>10.1f}ms {compiled_time * 1000:>10.1f}ms "
+                  f"{legacy_time / compiled_time:>7.1f}x")
+
+EXAMPLE_FEATURES = [
+    {'ABV': 4.0, 'Astringency': 10, 'Body': 30, 'Alcohol': 15, 'Bitter': 30, 'Sweet': 40, 'Sour': 85,
+     'Salty': 2, 'Fruits': 140, 'Hoppy': 50, 'Spices': 20, 'Malty': 60, 'mainstream': 1, 'style': 'Wheat Beer'},
+    {'ABV': 6.8, 'Astringency': 20, 'Body': 75, 'Alcohol': 40, 'Bitter': 110, 'Sweet': 50, 'Sour': 30,
+     'Salty': 2, 'Fruits': 145, 'Hoppy': 155, 'Spices': 20, 'Malty': 75, 'mainstream': 1, 'style': 'IPA'},
+    {'ABV': 6.0, 'Astringency': 65, 'Body': 50, 'Alcohol': 30, 'Bitter': 20, 'Sweet': 40, 'Sour': 265,
+     'Salty': 5, 'Fruits': 90, 'Hoppy': 20, 'Spices': 30, 'Malty': 40, 'mainstream': 0, 'style': 'Wild Ale'},
+    {'ABV': 0.5, 'Astringency': 3, 'Body': 12, 'Alcohol': 12, 'Bitter': 5, 'Sweet': 15, 'Sour': 5,
+     'Salty': 1, 'Fruits': 5, 'Hoppy': 5, 'Spices': 5, 'Malty': 20, 'mainstream': 1, 'style': 'Low Alcohol Beer'},
+]
+
+def per_call_us(func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(EXAMPLE_FEATURES[i % len(EXAMPLE_FEATURES)])
+    return (time.perf_counter() - start) / calls * 1e6
+
+def benchmark_query_vectors(recommender, calls=2000):
+    """Per-query cost of building query rows: DataFrame path vs precomputed layouts"""
+    for llm_output in EXAMPLE_FEATURES:
+        legacy = legacy_test_point(recommender, llm_output, recommender.regression_columns,
+                                   recommender.scalar, 'Regressor')
+        current = recommender.fill_query_vector(llm_output, recommender.regression_layout, 'Regressor')
+        if not (legacy == current).all():
+            raise AssertionError("Layout query vector differs from the DataFrame path")
+        if recommender.gb_model.predict(legacy)[0] != recommender.predict_rating(llm_output):
+            raise AssertionError("predict_rating score changed")
+
+    legacy_regression_columns = recommender.regression_columns
+    rows = [
+        ('regression vector',
+         lambda f: legacy_test_point(recommender, f, legacy_regression_columns, recommender.scalar, 'Regressor'),
+         lambda f: recommender.fill_query_vector(f, recommender.regression_layout, 'Regressor')),
+        ('recommend vector',
+         lambda f: legacy_test_point(recommender, f, recommender.recommend_columns,
+                                     recommender.global_scaler_recommend, 'Recommend'),
+         lambda f: recommender.fill_query_vector(f, recommender.recommend_layout, 'Recommend')),
+        ('predict_rating',
+         lambda f: recommender.gb_model.predict(
+             legacy_test_point(recommender, f, legacy_regression_columns, recommender.scalar, 'Regressor')),
+         recommender.predict_rating),
+    ]
+
+    print(f"{'stage':<18} {'DataFrame':>12} {'layout':>12} {'speedup':>8}")
+    for name, legacy_func, current_func in rows:
+        legacy_us = per_call_us(legacy_func, calls)
+        current_us = per_call_us(current_func, calls)
+        print(f"{name:<18} {legacy_us:>10.1f}us {current_us:>10.1f}us {legacy_us / current_us:>7.1f}x")
+
+class NoCache:
+    """Cache stand-in that never hits, so every request reaches the (stubbed) LLM"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def lookup(self, prompt):
+        return None
+
+    def add(self, prompt, features):
+        pass
+
+def stub_llm_client():
+    """LLMClient whose transport answers 'benchmark prompt <i>' with EXAMPLE_FEATURES[i]"""
+    def handler(request):
+        prompt = json.loads(request.content)['messages'][-1]['content']
+        features = EXAMPLE_FEATURES[int(prompt.rsplit(' ', 1)[-1]) % len(EXAMPLE_FEATURES)]
+        return httpx.Response(200, json={
+            'id': 'benchmark', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': json.dumps(features)}}]
+        })
+
+    return LLMClient(api_key='offline', transport=httpx.MockTransport(handler))
+
+def synthetic_catalog(source_path, scale, seed=0):
+    """The real catalog plus scale - 1 jittered copies with distinct names"""
+    df = pd.read_csv(source_path)
+    if scale == 1:
+        return df
+
+    rng = np.random.default_rng(seed)
+    int_features = ['Astringency', 'Body', 'Alcohol', 'Bitter', 'Sweet', 'Sour', 'Salty',
+                    'Fruits', 'Hoppy', 'Spices', 'Malty']
+    copies = [df]
+    for copy_id in range(1, scale):
+        copy = df.copy()
+        copy['Name'] = copy['Name'] + f' #{copy_id}'
+        copy['Beer Name (Full)'] = copy['Beer Name (Full)'] + f' #{copy_id}'
+        copy['ABV'] = (copy['ABV'] * rng.normal(1, 0.03, len(copy))).clip(lower=0).round(2)
+        copy[int_features] = (copy[int_features] + rng.integers(-3, 4, (len(copy), len(int_features)))).clip(lower=0)
+        copy['review_overall'] = (copy['review_overall'] + rng.normal(0, 0.1, len(copy))).clip(1, 5)
+        copy['number_of_reviews'] = (copy['number_of_reviews'] * rng.uniform(0.8, 1.2, len(copy))).astype(int)
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+def percentiles_ms(timings):
+    timings = np.asarray(timings) * 1000
+    return {
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'mean_ms': float(timings.mean())
+    }
+
+def traced(func):
+    """Run func once under tracemalloc; returns (result, seconds, peak MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+def query_stage(func, queries, memory_queries=20):
+    """Latency percentiles over `queries` calls, plus traced peak memory of a short separate pass"""
+    timings = []
+    for i in range(queries):
+        start = time.perf_counter()
+        func(i)
+        timings.append(time.perf_counter() - start)
+    stats = percentiles_ms(timings)
+    stats['peak_mb'] = traced(lambda: [func(i) for i in range(memory_queries)])[2]
+    return stats
+
+def benchmark_stages(scale, queries):
+    """Cold load, training and per-request latencies on a catalog scale times the real size"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = os.path.join(tmp_dir, 'beer_profile_and_ratings.csv')
+        synthetic_catalog('./data/beer_profile_and_ratings.csv', scale).to_csv(
+            data_path, index=False, encoding='utf-8-sig'
+        )
+
+        recommender = BeerRecommender(data_path=data_path, llm_cache=NoCache(),
+                                      llm_client=stub_llm_client(), semantic_cache=NoCache())
+        recommender.feature_mode = 'llm'
+
+        # First load parses the CSV and writes the binary catalog; later ones map it
+        _, elapsed, peak = traced(lambda: recommender.load_and_preprocess_data(tmp_dir))
+        results['rows'] = len(recommender.df)
+        results['load_and_preprocess_data'] = {'seconds': elapsed, 'peak_mb': peak}
+
+        _, elapsed, peak = traced(lambda: recommender.load_catalog(tmp_dir))
+        results['load_catalog_mmap'] = {'seconds': elapsed, 'peak_mb': peak}
+
+        _, elapsed, peak = traced(lambda: recommender.load_and_preprocess_data(tmp_dir))
+        results['load_and_preprocess_data_binary'] = {'seconds': elapsed, 'peak_mb': peak}
+
+        _, elapsed, peak = traced(recommender.train_regression_model)
+        results['train_regression_model'] = {'seconds': elapsed, 'peak_mb': peak}
+
+    def features(i):
+        # Small ABV jitter so repeated queries are not byte-identical
+        llm_output = dict(EXAMPLE_FEATURES[i % len(EXAMPLE_FEATURES)])
+        llm_output['ABV'] = round(llm_output['ABV'] + (i % 7) * 0.01, 2)
+        return llm_output
+
+    results['predict_rating'] = query_stage(lambda i: recommender.predict_rating(features(i)), queries)
+    results['get_beer_recommendations'] = query_stage(
+        lambda i: recommender.get_beer_recommendations(features(i)), queries)
+    results['get_beer_recommendations_alt'] = query_stage(
+        lambda i: recommender.get_beer_recommendations(features(i), alt=True), queries)
+    results['get_recommendations'] = query_stage(
+        lambda i: recommender.get_recommendations(f'benchmark prompt {i}'), queries)
+    results['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+def print_stages(scale, results):
+    print(f"\n{scale}x catalog ({results['rows']} rows)")
+    for stage in ('load_and_preprocess_data', 'load_catalog_mmap', 'load_and_preprocess_data_binary',
+                  'train_regression_model'):
+        print(f"  {stage:<30} {results[stage]['seconds'] * 1000:>10.1f}ms   peak {results[stage]['peak_mb']:.1f}MB")
+    for stage in ('predict_rating', 'get_beer_recommendations', 'get_beer_recommendations_alt', 'get_recommendations'):
+        stats = results[stage]
+        print(f"  {stage:<30} p50 {stats['p50_ms']:.3f}ms  p95 {stats['p95_ms']:.3f}ms  "
+              f"p99 {stats['p99_ms']:.3f}ms   peak {stats['peak_mb']:.1f}MB")
+    print(f"  {'process peak RSS':<30} {results['peak_rss_mb']:>10.1f}MB")
+
+EXAMPLE_PROMPTS = [
+    "I want a light 🍊 citrusy beer",
+    "Give me a 🌺 hoppy IPA with tropical notes",
+    "I want a sessionable pilsner",
+    "Something 🍋 sour and funky with brett character",
+    "Just a Bad beer"
+]
+
+def deep_bytes(value, seen=None):
+    """Bytes held by value and everything it references, each object counted once"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return sum(deep_bytes(value[column].to_numpy(), seen) for column in value.columns)
+    if isinstance(value, np.ndarray):
+        size = value.nbytes
+        if value.dtype == object:
+            size += sum(deep_bytes(item, seen) for item in value.ravel())
+        return size
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(deep_bytes(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(deep_bytes(item, seen) for item in value)
+    if isinstance(value, (CompactCatalog, StringStore, NearestNeighbors, BruteForceIndex, SklearnIndex)):
+        return deep_bytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+def benchmark_catalog_memory(scale):
+    """Serving-state memory: legacy frames and object arrays vs the compact catalog"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = os.path.join(tmp_dir, 'beer_profile_and_ratings.csv')
+        synthetic_catalog('./data/beer_profile_and_ratings.csv', scale).to_csv(
+            data_path, index=False, encoding='utf-8-sig'
+        )
+        recommender = BeerRecommender(data_path=data_path, llm_cache=NoCache(),
+                                      llm_client=stub_llm_client(), semantic_cache=NoCache())
+        # The model is not measured; one shallow tree is enough to build the state
+        recommender.gb_params = {'n_estimators': 1, 'max_depth': 1}
+        recommender.load_and_preprocess_data(None)
+        recommender.train_regression_model()
+
+    legacy = legacy_serving_state(recommender)
+    compact = {name: getattr(recommender, name) for name in ('catalog', 'X_recommend_scaled', 'recommend_index')}
+    return {
+        'rows': len(recommender.catalog),
+        'legacy_mb': deep_bytes(legacy) / 2 ** 20,
+        'compact_mb': deep_bytes(compact) / 2 ** 20,
+        'legacy_mb_by_part': {name: deep_bytes(value) / 2 ** 20 for name, value in legacy.items()},
+        'compact_mb_by_part': {name: deep_bytes(value) / 2 ** 20 for name, value in compact.items()},
+        'catalog_mb_by_column': {name: nbytes / 2 ** 20
+                                 for name, nbytes in recommender.catalog.memory_usage().items()}
+    }
+
+def print_catalog_memory(scale, stats):
+    print(f"\n{scale}x catalog ({stats['rows']} rows): {stats['legacy_mb']:.1f}MB -> {stats['compact_mb']:.1f}MB "
+          f"({stats['legacy_mb'] / stats['compact_mb']:.1f}x smaller)")
+    for name, mb in stats['legacy_mb_by_part'].items():
+        print(f"  before {name:<24} {mb:>9.1f}MB")
+    for name, mb in stats['compact_mb_by_part'].items():
+        print(f"  after  {name:<24} {mb:>9.1f}MB")
+    for name, mb in stats['catalog_mb_by_column'].items():
+        print(f"         catalog.{name:<16} {mb:>9.2f}MB")
+
+def benchmark_end_to_end(queries, replay_latency, cassette_path=None):
+    """get_recommendations + format_terminal_output against a replayed cassette.
+
+    Without a cassette, one is recorded first from a local stub server.
+    """
+    recommender = BeerRecommender(llm_cache=NoCache(), semantic_cache=NoCache())
+    recommender.load_or_build()
+    recommender.feature_mode = 'llm'
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if cassette_path is None:
+            cassette_path = os.path.join(tmp_dir, 'cassette.json')
+            stub = StubChatServer().start()
+            try:
+                recommender.llm_client = LLMClient(api_key='stub', base_url=stub.url,
+                                                   transport=RecordingTransport(cassette_path))
+                for prompt in EXAMPLE_PROMPTS:
+                    recommender.get_recommendations(prompt)
+            finally:
+                stub.stop()
+
+        replay = ReplayTransport(cassette_path, latency=replay_latency, seed=0)
+        recommender.llm_client = LLMClient(api_key='replay', transport=replay)
+
+        def run(i):
+            prompt = EXAMPLE_PROMPTS[i % len(EXAMPLE_PROMPTS)]
+            results = recommender.get_recommendations(prompt)
+            return format_terminal_output(prompt, results['predicted_rating'], results['recommendations'],
+                                          results.get('alt_recommendations'))
+
+        recommender.metrics.reset()
+        stats = query_stage(run, queries)
+    stats['stage_mean_ms'] = {stage: stage_stats['mean_ms']
+                              for stage, stage_stats in recommender.metrics.snapshot()['stages'].items()}
+    stats['replay_latency_ms'] = replay_latency * 1000
+    stats['cassette_misses'] = replay.counters['missing']
+    return stats
+
+# `import beer_recommender` must stay cheap: none of these may load at import time
+HEAVY_MODULES = ['streamlit', 'groq', 'httpx', 'sklearn', 'pandas']
+IMPORT_BUDGET_MS = 250
+
+def benchmark_import(repeat):
+    """Cold `import beer_recommender` per `python -X importtime` (best of `repeat` runs)"""
+    best_ms, heavy = None, []
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import beer_recommender'],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stderr
+        # Lines look like "import time:   self [us] | cumulative | package"
+        modules = {}
+        for line in stderr.splitlines():
+            parts = line.split('|')
+            if line.startswith('import time:') and parts[1].strip().isdigit():
+                modules[parts[2].strip()] = int(parts[1]) / 1000
+        heavy = sorted({name.split('.')[0] for name in modules} & set(HEAVY_MODULES))
+        best_ms = min(best_ms, modules['beer_recommender']) if best_ms else modules['beer_recommender']
+    return {'import_ms': best_ms, 'budget_ms': IMPORT_BUDGET_MS, 'heavy_modules': heavy}
+
+def synthetic_neighbor_matrix(X, layout, n_rows, seed=0, jitter=0.05):
+    """n_rows of the recommendation matrix: real rows with jittered flavor features"""
+    rng = np.random.default_rng(seed)
+    matrix = np.asarray(X, dtype=np.float32)[rng.integers(0, len(X), n_rows)]
+    positions = layout['feature_positions']
+    matrix[:, positions] += rng.normal(0, jitter, (n_rows, len(positions))).astype(np.float32)
+    return matrix
+
+def neighbor_queries(recommender, queries, seed=1):
+    """Example profiles, jittered catalog rows and (a third) uniformly random profiles"""
+    layout = recommender.recommend_layout
+    Q = synthetic_neighbor_matrix(recommender.X_recommend_scaled, layout, queries, seed=seed).astype(np.float64)
+    rng = np.random.default_rng(seed)
+    style_positions = list(layout['style_positions'].values())
+    for i in range(queries - queries // 3, queries):
+        Q[i] = 0
+        Q[i, layout['feature_positions']] = rng.uniform(0, 1, len(layout['feature_positions']))
+        Q[i, style_positions[rng.integers(len(style_positions))]] = 1
+    for i, features in enumerate(EXAMPLE_FEATURES):
+        Q[i] = recommender.generate_test_point(features, layout, "Recommend")[0]
+    return Q
+
+def benchmark_neighbors(sizes, queries, min_recall=0.95):
+    """Build time, single-query latency and recall@10 against exact search per backend"""
+    recommender = BeerRecommender(llm_cache=NoCache(), semantic_cache=NoCache(), llm_client=stub_llm_client())
+    recommender.load_or_build()
+    k = recommender.recommend_n_neighbors
+    results = {}
+    for n_rows in sizes:
+        X = synthetic_neighbor_matrix(recommender.X_recommend_scaled, recommender.recommend_layout, n_rows)
+        Q = neighbor_queries(recommender, queries)
+        _, exact = BruteForceIndex(n_neighbors=k).fit(X).kneighbors(Q)
+
+        stats = {}
+        for backend in BACKENDS:
+            start = time.perf_counter()
+            index = make_index(backend, n_rows, n_neighbors=k).fit(X)
+            build_seconds = time.perf_counter() - start
+
+            timings, found = [], []
+            for query in Q:
+                start = time.perf_counter()
+                found.append(index.kneighbors(query[None, :])[1][0])
+                timings.append(time.perf_counter() - start)
+            recall = np.mean([len(np.intersect1d(row, exact_row)) / k for row, exact_row in zip(found, exact)])
+            stats[backend] = {'build_seconds': build_seconds, 'recall': float(recall), **percentiles_ms(timings)}
+
+        usable = [backend for backend in stats if stats[backend]['recall'] >= min_recall]
+        results[str(n_rows)] = {'backends': stats,
+                                'fastest': min(usable, key=lambda backend: stats[backend]['p50_ms']),
+                                'auto': make_index('auto', n_rows).__class__.__name__}
+    return results
+
+def print_neighbors(results):
+    print(f"{'rows':>9} {'backend':<10} {'build':>9} {'p50':>9} {'p95':>9} {'recall@10':>10}")
+    for n_rows, size_results in results.items():
+        for backend, stats in size_results['backends'].items():
+            print(f"{n_rows:>9} {backend:<10} {stats['build_seconds'] * 1000:>7.0f}ms {stats['p50_ms']:>7.3f}ms "
+                  f"{stats['p95_ms']:>7.3f}ms {stats['recall']:>10.3f}")
+        print(f"{'':>9} fastest with recall >= 0.95: {size_results['fastest']}  (auto uses {size_results['auto']})")
+
+def regressor_configs(budget_seconds):
+    """Rating models compared by the regressors report: name -> (regressor, TrainingBudget)"""
+    return {
+        'gradient_boosting': ('gradient_boosting', None),
+        'hist_gradient_boosting': ('hist_gradient_boosting', None),
+        'gradient_boosting+budget': ('gradient_boosting',
+                                     TrainingBudget(seconds=budget_seconds, max_iterations=1000)),
+        'hist_gradient_boosting+budget': ('hist_gradient_boosting',
+                                          TrainingBudget(seconds=budget_seconds, max_iterations=1000))
+    }
+
+def benchmark_regressors(scales, queries, budget_seconds, holdout_fraction=0.2):
+    """Training time, single-query predict latency and holdout MAE per rating model.
+
+    A seeded holdout_fraction of the catalog is kept out of training (and out of
+    the budgets' own early-stopping split) and only used for the MAE.
+    """
+    results = {}
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_path = os.path.join(tmp_dir, 'beer_profile_and_ratings.csv')
+            synthetic_catalog('./data/beer_profile_and_ratings.csv', scale).to_csv(
+                data_path, index=False, encoding='utf-8-sig'
+            )
+            source = BeerRecommender(data_path=data_path, llm_cache=NoCache(),
+                                     llm_client=stub_llm_client(), semantic_cache=NoCache())
+            source.load_and_preprocess_data(None)
+
+        catalog = source.catalog
+        rng = np.random.default_rng(0)
+        holdout = np.sort(rng.choice(len(catalog), int(len(catalog) * holdout_fraction), replace=False))
+        train_catalog = catalog.with_rows(holdout, {}, live=np.zeros(len(holdout), dtype=bool)).compacted()
+        holdout_frame = source.df.iloc[holdout]
+        holdout_features = [
+            {**{feat: row[feat] for feat in source.scaling_features},
+             'style': source.style_group(row['Style']), 'mainstream': row['mainstream']}
+            for row in holdout_frame.to_dict('records')
+        ]
+        ratings = holdout_frame['review_overall'].to_numpy()
+
+        models = {}
+        for name, (regressor, budget) in regressor_configs(budget_seconds).items():
+            recommender = BeerRecommender(llm_cache=NoCache(), llm_client=stub_llm_client(), semantic_cache=NoCache())
+            recommender.regressor = regressor
+            recommender.training_budget = budget
+            recommender.catalog = train_catalog
+            recommender.df = train_catalog.to_frame()
+            start = time.perf_counter()
+            recommender.train_regression_model()
+            train_seconds = time.perf_counter() - start
+
+            matrix = recommender.build_query_matrix(holdout_features, recommender.regression_layout, type="Regressor")
+            start = time.perf_counter()
+            predictions = recommender.gb_model.predict(matrix)
+            batch_seconds = time.perf_counter() - start
+            timings = []
+            for i in range(queries):
+                start = time.perf_counter()
+                recommender.predict_rating(holdout_features[i % len(holdout_features)])
+                timings.append(time.perf_counter() - start)
+            models[name] = {
+                'train_seconds': train_seconds,
+                'fit_seconds': recommender.regression_fit['seconds'],
+                'iterations': recommender.regression_fit['iterations'],
+                'stopped_by': recommender.regression_fit['stopped_by'],
+                'holdout_mae': float(np.mean(np.abs(predictions - ratings))),
+                'batch_predict_us_per_row': batch_seconds / len(matrix) * 1e6,
+                **percentiles_ms(timings)
+            }
+        results[str(scale)] = {'rows': len(catalog), 'style_columns': len(source.df['Style'].map(source.style_group).unique()),
+                               'models': models}
+    return results
+
+def print_regressors(results, budget_seconds):
+    print(f"(budget: {budget_seconds}s wall clock, early stopping on a 10% split; "
+          f"MAE on a separate 20% holdout; {os.cpu_count()} CPU)")
+    print(f"{'rows':>8} {'model':<30} {'fit':>9} {'iters':>6} {'stopped by':<15} {'predict p50':>11} "
+          f"{'p95':>9} {'batch/row':>10} {'MAE':>7}")
+    for scale, scale_results in results.items():
+        for name, stats in scale_results['models'].items():
+            print(f"{scale_results['rows']:>8} {name:<30} {stats['fit_seconds']:>8.2f}s {stats['iterations']:>6} "
+                  f"{stats['stopped_by']:<15} {stats['p50_ms']:>9.3f}ms {stats['p95_ms']:>7.3f}ms "
+                  f"{stats['batch_predict_us_per_row']:>8.2f}us {stats['holdout_mae']:>7.4f}")
+
+def worker_memory_mb(pid):
+    """RSS and private (unshared) memory of a process, from /proc (Linux only)"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if rest.strip().endswith('kB'):
+                values[name] = int(rest.split()[0]) / 1024
+    return values['Rss'], values['Private_Clean'] + values['Private_Dirty']
+
+def load_test(url, clients, seconds):
+    """`clients` keep-alive connections posting example prompts for `seconds`"""
+    import http.client
+    import threading
+    from urllib.parse import urlsplit
+
+    address = urlsplit(url)
+    timings, statuses, lock = [], {}, threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset):
+        connection = http.client.HTTPConnection(address.hostname, address.port, timeout=30)
+        i = offset
+        while time.perf_counter() < deadline:
+            body = json.dumps({'query': EXAMPLE_PROMPTS[i % len(EXAMPLE_PROMPTS)]})
+            start = time.perf_counter()
+            connection.request('POST', '/recommend', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            with lock:
+                timings.append(time.perf_counter() - start)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            i += 1
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = percentiles_ms(timings)
+    stats['requests_per_second'] = len(timings) / (time.perf_counter() - start)
+    stats['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+    return stats
+
+def benchmark_server(worker_counts, clients, seconds):
+    """Throughput of `python server.py` (rule-based features, no LLM) per worker count,
+    and how much of each worker's memory is shared with the parent"""
+    results = {}
+    for workers in worker_counts:
+        process = subprocess.Popen(
+            [sys.executable, 'server.py', '--port', '0', '--workers', str(workers), '--feature-mode', 'rules'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        try:
+            url = process.stdout.readline().split()[2]
+            for _ in range(100):
+                if httpx.get(f"{url}/readyz").status_code == 200:
+                    break
+                time.sleep(0.1)
+            stats = load_test(url, clients, seconds)
+            with open(f'/proc/{process.pid}/task/{process.pid}/children') as f:
+                children = [int(pid) for pid in f.read().split()]
+            memory = [worker_memory_mb(pid) for pid in children]
+            stats['parent_rss_mb'] = worker_memory_mb(process.pid)[0]
+            stats['worker_rss_mb'] = float(np.mean([rss for rss, _ in memory]))
+            stats['worker_private_mb'] = float(np.mean([private for _, private in memory]))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        results[str(workers)] = stats
+    return results
+
+def print_server(results, clients):
+    print(f"{'workers':>7} {'req/s':>8} {'p50':>9} {'p99':>9}  {'worker RSS':>10} {'private':>9}  statuses")
+    for workers, stats in results.items():
+        print(f"{workers:>7} {stats['requests_per_second']:>8.1f} {stats['p50_ms']:>7.2f}ms {stats['p99_ms']:>7.2f}ms  "
+              f"{stats['worker_rss_mb']:>8.1f}MB {stats['worker_private_mb']:>7.1f}MB  {stats['statuses']}")
+    print(f"  ({clients} keep-alive clients, {os.cpu_count()} CPUs)")
+
+# Loads the model in a separate process, answers a few queries, reports and waits
+SERVING_PROCESS = """
+import sys
+sys.path.append('.')
+from beer_recommender import BeerRecommender
+recommender = BeerRecommender(data_path=sys.argv[1])
+recommender.shared_segment_dir = sys.argv[3] or None
+recommender.feature_mode = 'rules'
+recommender.load_or_build(sys.argv[2])
+for prompt in %r:
+    recommender.get_recommendations(prompt)
+print('ready', flush=True)
+sys.stdin.read()
+"""
+
+def worker_pss_mb(pid):
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) / 1024
+
+def benchmark_shared_memory(scale, processes=2):
+    """Private and proportional (PSS) memory of independent serving processes,
+    with the arrays in a shared segment and without"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir, tempfile.TemporaryDirectory(dir=shared_segment_root()) as shm_dir:
+        data_path = os.path.join(tmp_dir, 'beer_profile_and_ratings.csv')
+        synthetic_catalog('./data/beer_profile_and_ratings.csv', scale).to_csv(
+            data_path, index=False, encoding='utf-8-sig'
+        )
+        bundle_dir = os.path.join(tmp_dir, 'artifacts')
+        BeerRecommender(data_path=data_path, llm_cache=NoCache(), semantic_cache=NoCache()).load_or_build(bundle_dir)
+        script = SERVING_PROCESS % (EXAMPLE_PROMPTS,)
+        for mode, segment_dir in (('private', ''), ('shared', shm_dir)):
+            children = []
+            try:
+                for _ in range(processes):
+                    child = subprocess.Popen([sys.executable, '-c', script, data_path, bundle_dir, segment_dir],
+                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                             stderr=subprocess.DEVNULL, text=True)
+                    children.append(child)
+                    # One at a time, so only the first builds the segment
+                    child.stdout.readline()
+                memory = [worker_memory_mb(child.pid) for child in children]
+                results[mode] = {
+                    'rss_mb': float(np.mean([rss for rss, _ in memory])),
+                    'private_mb': float(np.mean([private for _, private in memory])),
+                    'pss_mb': float(np.mean([worker_pss_mb(child.pid) for child in children]))
+                }
+            finally:
+                for child in children:
+                    child.kill()
+                    child.wait()
+    return results
+
+def shared_segment_root():
+    from shared_arrays import default_segment_dir
+    return default_segment_dir()
+
+def print_shared_memory(scale, results, processes):
+    print(f"  {scale}x, {processes} processes: " + "   ".join(
+        f"{mode} private {stats['private_mb']:.1f}MB pss {stats['pss_mb']:.1f}MB" for mode, stats in results.items()))
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(previous, current):
+    """Print the relative change of every timing between two result files"""
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')})")
+    for scale, stages in current['scales'].items():
+        old_stages = previous.get('scales', {}).get(scale)
+        if old_stages is None:
+            continue
+        for stage, stats in stages.items():
+            if not isinstance(stats, dict) or stage not in old_stages:
+                continue
+            key = 'seconds' if 'seconds' in stats else 'p50_ms'
+            old, new = old_stages[stage][key], stats[key]
+            change = (new - old) / old * 100 if old else 0.0
+            print(f"  {scale}x {stage:<30} {key:<8} {old:>10.4f} -> {new:>10.4f} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Beer recommender benchmarks")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is reported)")
+    parser.add_argument('--only', choices=['import', 'stages', 'memory', 'shared', 'neighbors', 'regressors',
+                                           'server', 'e2e', 'mainstream', 'query'],
+                        help="Run a single benchmark")
+    parser.add_argument('--scales', default='1,10,100',
+                        help="Comma-separated catalog multipliers for the stage benchmark")
+    parser.add_argument('--queries', type=int, default=200, help="Requests per latency measurement")
+    parser.add_argument('--output', default='bench_results.json', help="Where to write stage results")
+    parser.add_argument('--neighbor-sizes', default='3000,30000,300000,1000000',
+                        help="Comma-separated index sizes for the neighbor backend benchmark")
+    parser.add_argument('--regressor-scales', default='1,10',
+                        help="Comma-separated catalog multipliers for the rating model comparison")
+    parser.add_argument('--train-budget', type=float, default=2.0,
+                        help="Wall-clock training budget in seconds for the budgeted rating models")
+    parser.add_argument('--server-workers', default='1,2,4',
+                        help="Comma-separated worker counts for the HTTP server load test")
+    parser.add_argument('--server-clients', type=int, default=8, help="Concurrent clients in the load test")
+    parser.add_argument('--server-seconds', type=float, default=10.0, help="Load test duration per worker count")
+    parser.add_argument('--compare', help="Earlier results file to diff against")
+    parser.add_argument('--cassette', help="Recorded LLM responses for the end-to-end run "
+                                           "(default: record one from a local stub server)")
+    parser.add_argument('--replay-latency', type=float, default=0.0,
+                        help="Simulated LLM latency in seconds for the end-to-end run")
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'queries': args.queries,
+        'scales': {}
+    }
+
+    import_ok = True
+    if args.only in (None, 'import'):
+        stats = benchmark_import(args.repeat)
+        results['import'] = stats
+        import_ok = stats['import_ms'] <= stats['budget_ms'] and not stats['heavy_modules']
+        print(f"import beer_recommender           {stats['import_ms']:.1f}ms (budget {stats['budget_ms']}ms)"
+              f"{'' if import_ok else '   OVER BUDGET'}")
+        if stats['heavy_modules']:
+            print(f"  heavy modules loaded at import: {', '.join(stats['heavy_modules'])}")
+
+    if args.only in (None, 'stages'):
+        print("\nStage latencies (offline, stubbed LLM)")
+        for scale in [int(scale) for scale in args.scales.split(',')]:
+            results['scales'][str(scale)] = benchmark_stages(scale, args.queries)
+            print_stages(scale, results['scales'][str(scale)])
+
+    if args.only in (None, 'memory'):
+        print("\nServing-state memory")
+        results['memory'] = {}
+        for scale in [int(scale) for scale in args.scales.split(',')]:
+            results['memory'][str(scale)] = benchmark_catalog_memory(scale)
+            print_catalog_memory(scale, results['memory'][str(scale)])
+
+    if args.only in (None, 'shared'):
+        print("\nPer-process memory of independent serving processes (private vs shared segment)")
+        results['shared_memory'] = {}
+        for scale in [int(scale) for scale in args.scales.split(',')]:
+            results['shared_memory'][str(scale)] = benchmark_shared_memory(scale)
+            print_shared_memory(scale, results['shared_memory'][str(scale)], 2)
+
+    if args.only in (None, 'neighbors'):
+        print("\nNeighbor backends (single-query latency, recall against exact search)")
+        results['neighbors'] = benchmark_neighbors([int(size) for size in args.neighbor_sizes.split(',')],
+                                                   min(args.queries, 200))
+        print_neighbors(results['neighbors'])
+
+    if args.only in (None, 'regressors'):
+        print("\nRating models (training time, predict latency, holdout MAE)")
+        results['regressors'] = benchmark_regressors([int(scale) for scale in args.regressor_scales.split(',')],
+                                                     min(args.queries, 200), args.train_budget)
+        print_regressors(results['regressors'], args.train_budget)
+
+    if args.only in (None, 'server'):
+        print("\nHTTP server (server.py, rule-based features)")
+        results['server'] = benchmark_server([int(workers) for workers in args.server_workers.split(',')],
+                                             args.server_clients, args.server_seconds)
+        print_server(results['server'], args.server_clients)
+
+    if args.only in (None, 'e2e'):
+        stats = benchmark_end_to_end(args.queries, args.replay_latency, args.cassette)
+        results['end_to_end'] = stats
+        print(f"\nEnd to end (replayed LLM, {stats['replay_latency_ms']:.0f}ms simulated latency)")
+        print(f"  get_recommendations + format    p50 {stats['p50_ms']:.3f}ms  p95 {stats['p95_ms']:.3f}ms  "
+              f"p99 {stats['p99_ms']:.3f}ms   peak {stats['peak_mb']:.1f}MB")
+        for stage, mean_ms in stats['stage_mean_ms'].items():
+            print(f"    {stage:<30} mean {mean_ms:.3f}ms")
+
+    if args.only in (None, 'import', 'stages', 'memory', 'shared', 'neighbors', 'regressors', 'server', 'e2e'):
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                compare_results(json.load(f), results)
+
+    if args.only in (None, 'mainstream'):
+        print("\nMainstream brand matching")
+        benchmark_mainstream_matching(repeat=args.repeat)
+
+    if args.only in (None, 'query'):
+        print("\nQuery vector construction")
+        recommender = BeerRecommender()
+        recommender.load_and_preprocess_data()
+        recommender.train_regression_model()
+        benchmark_query_vectors(recommender)
+
+    if not import_ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
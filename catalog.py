@@ -0,0 +1,299 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+CATALOG_VERSION = 2
+
+class StringStore:
+    """Immutable list of strings packed into one UTF-8 buffer.
+
+    Each distinct string is stored once; ids maps a row to its string and
+    offsets[id]:offsets[id + 1] is that string's slice of data. Three numpy
+    arrays replace one Python object per row, and a string is only decoded
+    when it is read.
+    """
+
+    def __init__(self, data, offsets, ids):
+        self.data = data
+        self.offsets = offsets
+        self.ids = ids
+
+    @classmethod
+    def from_strings(cls, strings):
+        unique = {}
+        ids = np.empty(len(strings), dtype=np.int32)
+        for row, string in enumerate(strings):
+            ids[row] = unique.setdefault('' if string is None else str(string), len(unique))
+        encoded = [string.encode('utf-8') for string in unique]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).copy()
+        return cls(data, offsets, ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        string_id = self.ids[row]
+        return self.data[self.offsets[string_id]:self.offsets[string_id + 1]].tobytes().decode('utf-8')
+
+    def to_array(self):
+        """Every row decoded, as an object array (distinct strings decoded once)"""
+        buffer = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        strings = np.empty(len(offsets) - 1, dtype=object)
+        strings[:] = [buffer[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+        return strings[self.ids]
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes + self.ids.nbytes
+
+    def with_rows(self, rows, strings, length):
+        """A copy with strings written at rows, grown to length rows.
+
+        New strings are appended to the buffer (deduplicated within the batch
+        only); ones no longer referenced stay until the catalog is rebuilt.
+        """
+        if strings is None:
+            if length != len(self):
+                raise ValueError("Appended rows need a value for every column")
+            return self
+        added = StringStore.from_strings(strings)
+        ids = np.empty(length, dtype=np.int32)
+        ids[:len(self)] = self.ids
+        ids[rows] = added.ids + (len(self.offsets) - 1)
+        data = np.concatenate([self.data, added.data])
+        offsets = np.concatenate([self.offsets, added.offsets[1:] + self.offsets[-1]])
+        return StringStore(data, offsets, ids)
+
+class CompactCatalog:
+    """The preprocessed beer table, one array per column.
+
+    Style and strength are category codes, flavor counts int16 and ratings
+    float64. ABV stays float64 because training reads it back from here.
+    Names, descriptions and keys (the full beer name, unique per beer) live in
+    StringStores and are only decoded for the beers that are returned.
+
+    Incremental updates go through with_rows(), which returns a new catalog
+    and leaves this one untouched for readers. Deleted rows stay in place with
+    live False until compacted() drops them.
+
+    save() writes the columns as .npy files plus a meta.json; load() memory-maps
+    them, so worker processes share the pages instead of parsing the CSV.
+    """
+
+    flavor_features = ['Astringency', 'Body', 'Alcohol', 'Bitter', 'Sweet', 'Sour',
+                       'Salty', 'Fruits', 'Hoppy', 'Spices', 'Malty']
+    array_columns = ['style_codes', 'strength_codes', 'abv', 'flavors', 'mainstream',
+                     'review_overall', 'number_of_reviews']
+    string_columns = ['names', 'descriptions', 'keys']
+
+    def __init__(self, columns):
+        self.live = None
+        self.key_rows = None
+        for name, value in columns.items():
+            setattr(self, name, value)
+        if self.live is None:
+            self.live = np.ones(len(self), dtype=bool)
+
+    @classmethod
+    def from_frame(cls, df, strength_order, keys=None):
+        # keys default to the beer names, which are not unique in the dataset
+        styles, style_codes = np.unique(df['Style'].to_numpy(dtype=str), return_inverse=True)
+        strength_codes = np.array([strength_order.index(strength) for strength in df['strength']], dtype=np.int8)
+        return cls({
+            'frame_columns': df.columns.tolist(),
+            'styles': [str(style) for style in styles],
+            'style_codes': style_codes.astype(np.int16),
+            'strengths': list(strength_order),
+            'strength_codes': strength_codes,
+            'abv': df['ABV'].to_numpy(dtype=np.float64),
+            'flavors': exact_downcast(df[cls.flavor_features].to_numpy(), np.int16),
+            'mainstream': df['mainstream'].to_numpy(dtype=np.int8),
+            # Kept at full precision: quality scores (and so the ranking) depend on it
+            'review_overall': df['review_overall'].to_numpy(dtype=np.float64),
+            'number_of_reviews': exact_downcast(df['number_of_reviews'].to_numpy(), np.int32),
+            'names': StringStore.from_strings(df['Name']),
+            'descriptions': StringStore.from_strings(df['Description']),
+            'keys': StringStore.from_strings(df['Name'] if keys is None else keys)
+        })
+
+    def to_frame(self):
+        """The preprocessed DataFrame this catalog was built from, column for column"""
+        import pandas as pd
+
+        columns = {
+            'Name': self.names.to_array(),
+            'Description': self.descriptions.to_array(),
+            'Style': np.array(self.styles, dtype=object)[self.style_codes],
+            'ABV': np.array(self.abv),
+            'review_overall': np.array(self.review_overall),
+            'number_of_reviews': self.number_of_reviews.astype(np.int64),
+            'mainstream': self.mainstream.astype(np.int64),
+            'strength': np.array(self.strengths, dtype=object)[self.strength_codes]
+        }
+        for i, feat in enumerate(self.flavor_features):
+            columns[feat] = self.flavors[:, i].astype(np.int64)
+        return pd.DataFrame(columns)[self.frame_columns]
+
+    def __len__(self):
+        return len(self.style_codes)
+
+    def strength_mask(self, strength):
+        return self.strength_codes == self.strengths.index(strength)
+
+    def row_of(self, key):
+        """Row of the beer with this key (the first, if repeated), or None"""
+        if self.key_rows is None:
+            self.key_rows = {}
+            for row, row_key in enumerate(self.keys.to_array()):
+                self.key_rows.setdefault(row_key, row)
+        return self.key_rows.get(key)
+
+    def with_rows(self, rows, values, live=None):
+        """A new catalog with values written at rows.
+
+        values maps column names to one entry per row; styles and strengths are
+        given as 'style' and 'strength' labels. Rows from len(self) on are
+        appended and need every column. live (one bool per row) deletes or
+        restores rows.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        length = max(len(self), int(rows.max()) + 1) if len(rows) else len(self)
+        columns = {name: value for name, value in vars(self).items() if name != 'key_rows'}
+        values = dict(values)
+        if 'style' in values:
+            styles = list(self.styles)
+            codes = {style: code for code, style in enumerate(styles)}
+            values['style_codes'] = [codes.setdefault(style, len(codes)) for style in values.pop('style')]
+            columns['styles'] = styles + list(codes)[len(styles):]
+        if 'strength' in values:
+            values['strength_codes'] = [self.strengths.index(strength) for strength in values.pop('strength')]
+
+        for name in self.array_columns:
+            columns[name] = write_rows(getattr(self, name), rows, values.get(name), length)
+        for name in self.string_columns:
+            columns[name] = getattr(self, name).with_rows(rows, values.get(name), length)
+        columns['live'] = write_rows(self.live, rows, live, length)
+        catalog = CompactCatalog(columns)
+        if self.key_rows is not None:
+            # Keys of existing rows never change, so the lookup only grows
+            catalog.key_rows = dict(self.key_rows)
+            for row, key in zip(rows.tolist(), values.get('keys', [])):
+                catalog.key_rows.setdefault(key, row)
+        return catalog
+
+    def compacted(self):
+        """The live rows only, renumbered from 0"""
+        keep = np.flatnonzero(self.live)
+        columns = {name: value for name, value in vars(self).items() if name not in ('key_rows', 'live')}
+        for name in self.array_columns:
+            columns[name] = np.asarray(getattr(self, name))[keep]
+        for name in self.string_columns:
+            store = getattr(self, name)
+            columns[name] = StringStore(store.data, store.offsets, np.asarray(store.ids)[keep])
+        return CompactCatalog(columns)
+
+    def memory_usage(self):
+        """Bytes per column"""
+        usage = {}
+        for name, value in vars(self).items():
+            if isinstance(value, (np.ndarray, StringStore)):
+                usage[name] = value.nbytes
+        return usage
+
+    def arrays(self):
+        arrays = {name: getattr(self, name) for name in self.array_columns}
+        for name in self.string_columns:
+            store = getattr(self, name)
+            arrays.update({f"{name}.data": store.data, f"{name}.offsets": store.offsets,
+                           f"{name}.ids": store.ids})
+        return arrays
+
+    def save(self, directory, fingerprint):
+        """Write the catalog to `directory` (created whole, or not at all)"""
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, suffix='.tmp')
+        try:
+            for name, array in self.arrays().items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+            meta = {
+                'version': CATALOG_VERSION,
+                'fingerprint': fingerprint,
+                'rows': len(self),
+                'frame_columns': self.frame_columns,
+                'styles': self.styles,
+                'strengths': self.strengths
+            }
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            # Another process finished the same conversion first
+            if not os.path.exists(os.path.join(directory, 'meta.json')):
+                raise
+        return directory
+
+    @classmethod
+    def load(cls, directory, fingerprint=None, mmap_mode='r'):
+        """Memory-mapped catalog, or None if it is missing or from other data/version"""
+        try:
+            with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != CATALOG_VERSION or (fingerprint is not None and meta.get('fingerprint') != fingerprint):
+            return None
+
+        def array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        columns = {name: array(name) for name in cls.array_columns}
+        for name in cls.string_columns:
+            columns[name] = StringStore(array(f"{name}.data"), array(f"{name}.offsets"), array(f"{name}.ids"))
+        columns.update({key: meta[key] for key in ('frame_columns', 'styles', 'strengths')})
+        return cls(columns)
+
+def exact_downcast(values, dtype):
+    """values as dtype when that loses nothing, otherwise unchanged"""
+    downcast = values.astype(dtype)
+    return downcast if np.array_equal(downcast, values) else values
+
+def write_rows(column, rows, values, length):
+    """Copy of column grown to length with values written at rows (widening the dtype if needed)"""
+    if values is None:
+        if length != len(column):
+            raise ValueError("Appended rows need a value for every column")
+        return column
+    values = exact_downcast(np.asarray(values), column.dtype)
+    updated = np.empty((length,) + column.shape[1:], dtype=np.promote_types(column.dtype, values.dtype))
+    updated[:len(column)] = column
+    updated[rows] = values
+    return updated
+
+if __name__ == "__main__":
+    import argparse
+
+    from beer_recommender import BeerRecommender
+
+    parser = argparse.ArgumentParser(description="Convert the beer CSV into the binary catalog")
+    parser.add_argument('--data', default='./data/beer_profile_and_ratings.csv', help="Source CSV")
+    parser.add_argument('--out', default='./artifacts', help="Directory for the catalog")
+    parser.add_argument('--clean', action='store_true',
+                        help="Also remove catalogs and model bundles other than the current ones "
+                             "for the default settings (stop servers using them first)")
+    args = parser.parse_args()
+
+    recommender = BeerRecommender(data_path=args.data)
+    recommender.load_and_preprocess_data(args.out)
+    if args.clean:
+        for path in recommender.remove_stale_artifacts(args.out):
+            print(f"removed {path}")
+    path = recommender.catalog_path(args.out, recommender.data_fingerprint())
+    print(f"{len(recommender.catalog)} beers in {path}")
@@ -0,0 +1,47 @@
+import os
+
+class Config:
+    """Settings and secrets for the recommender.
+
+    get(name) looks in `values`, then `secrets` (any mapping, e.g. Streamlit's
+    st.secrets), then the environment, which is first filled from a .env file
+    when python-dotenv is installed. Nothing here imports Streamlit, so the
+    recommender runs the same in batch jobs and workers.
+    """
+
+    def __init__(self, values=None, secrets=None, environ=None, dotenv=True):
+        self.values = dict(values or {})
+        self.secrets = secrets
+        self.environ = environ
+        self.dotenv = dotenv
+        self.dotenv_loaded = False
+
+    def get_secret(self, name):
+        if self.secrets is None:
+            return None
+        try:
+            return self.secrets[name] if name in self.secrets else None
+        except FileNotFoundError:
+            # st.secrets raises when no secrets.toml exists
+            return None
+
+    def get_environ(self):
+        if self.environ is not None:
+            return self.environ
+        if self.dotenv and not self.dotenv_loaded:
+            self.dotenv_loaded = True
+            try:
+                from dotenv import load_dotenv
+            except ImportError:
+                pass
+            else:
+                load_dotenv()
+        return os.environ
+
+    def get(self, name, default=None):
+        if name in self.values:
+            return self.values[name]
+        value = self.get_secret(name)
+        if value is not None:
+            return value
+        return self.get_environ().get(name, default)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+def normalize_prompt(prompt):
+    """Canonical form of a prompt: NFKC, lowercased, single-spaced"""
+    prompt = unicodedata.normalize('NFKC', prompt).lower()
+    return re.sub(r'\s+', ' ', prompt).strip()
+
+def make_cache_key(prompt, model, system_prompt):
+    """Cache key for one LLM call; changes with the prompt, the model or the system prompt"""
+    system_prompt_hash = hashlib.sha256(system_prompt.encode()).hexdigest()
+    payload = json.dumps([normalize_prompt(prompt), model, system_prompt_hash])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class LLMFeatureCache:
+    """Two-tier cache of extracted beer features: in-process LRU in front of SQLite.
+
+    Entries older than ttl_seconds are treated as misses. The memory tier holds
+    at most max_memory_entries, the disk tier at most max_disk_entries (least
+    recently used rows are evicted first). Pass path=None for memory only.
+    """
+
+    def __init__(self, path='./artifacts/llm_cache.sqlite', max_memory_entries=1024,
+                 max_disk_entries=100000, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()
+        self.connection = None
+        self.lock = threading.Lock()
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+            'expired': 0
+        }
+
+    def connect(self):
+        if self.connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_features ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS llm_features_accessed ON llm_features (accessed_at)"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self.is_expired(created_at, now):
+                    self.memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return dict(value)
+                del self.memory[key]
+                self.counters['expired'] += 1
+
+            if self.path is not None:
+                connection = self.connect()
+                row = connection.execute(
+                    "SELECT value, created_at FROM llm_features WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self.is_expired(row[1], now):
+                        connection.execute(
+                            "UPDATE llm_features SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        connection.commit()
+                        value = json.loads(row[0])
+                        self.remember(key, value, row[1])
+                        self.counters['disk_hits'] += 1
+                        return dict(value)
+                    connection.execute("DELETE FROM llm_features WHERE key = ?", (key,))
+                    connection.commit()
+                    self.counters['expired'] += 1
+
+            self.counters['misses'] += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.remember(key, dict(value), now)
+            if self.path is None:
+                return
+
+            connection = self.connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_features (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            if self.ttl_seconds is not None:
+                connection.execute(
+                    "DELETE FROM llm_features WHERE created_at < ?", (now - self.ttl_seconds,)
+                )
+            overflow = connection.execute("SELECT COUNT(*) FROM llm_features").fetchone()[0] - self.max_disk_entries
+            if overflow > 0:
+                connection.execute(
+                    "DELETE FROM llm_features WHERE key IN "
+                    "(SELECT key FROM llm_features ORDER BY accessed_at LIMIT ?)", (overflow,)
+                )
+                self.counters['disk_evictions'] += overflow
+            connection.commit()
+
+    def remember(self, key, value, created_at):
+        self.memory[key] = (value, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+            self.counters['memory_evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.path is not None:
+                connection = self.connect()
+                connection.execute("DELETE FROM llm_features")
+                connection.commit()
+
+    def after_fork(self):
+        # A SQLite connection must not be shared with the parent process; reconnect lazily
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self.memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import weakref
+
+import httpx
+from groq import AsyncGroq, Groq
+
+class LLMClient:
+    """Long-lived Groq clients (sync and async) shared by every request.
+
+    Connections are pooled and kept alive between calls. Timeouts and retries
+    are handed to the Groq SDK, which retries 408/409/429/5xx responses and
+    connection errors with exponential backoff (honouring Retry-After).
+    At most max_concurrency calls are in flight upstream at once: one cap for
+    all threads, and one per event loop for the async path.
+
+    Pass transport (an httpx transport, e.g. httpx.MockTransport) to replace
+    the network with a local stand-in; async_transport defaults to it.
+    """
+
+    def __init__(self, api_key=None, api_key_provider=None, base_url=None, timeout=30.0,
+                 connect_timeout=5.0, max_retries=3, max_concurrency=8, max_connections=20,
+                 max_keepalive_connections=10, keepalive_expiry=60.0, transport=None,
+                 async_transport=None):
+        self.api_key = api_key
+        self.api_key_provider = api_key_provider
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.transport = transport
+        self.async_transport = async_transport if async_transport is not None else transport
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.async_semaphores = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def get_api_key(self):
+        if self.api_key is None and self.api_key_provider is not None:
+            self.api_key = self.api_key_provider()
+        if not self.api_key:
+            raise ValueError("GROQ API key not found. Please set it in .env file or Streamlit secrets.")
+        return self.api_key
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                http_client = httpx.Client(
+                    transport=self.transport, limits=self.limits, timeout=self.timeout
+                )
+                self._client = Groq(
+                    api_key=self.get_api_key(), base_url=self.base_url, timeout=self.timeout,
+                    max_retries=self.max_retries, http_client=http_client
+                )
+            return self._client
+
+    def get_async_client(self):
+        # httpx async pools are bound to the event loop that first used them
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if loop not in self._async_clients:
+                http_client = httpx.AsyncClient(
+                    transport=self.async_transport, limits=self.limits, timeout=self.timeout
+                )
+                self._async_clients[loop] = AsyncGroq(
+                    api_key=self.get_api_key(), base_url=self.base_url, timeout=self.timeout,
+                    max_retries=self.max_retries, http_client=http_client
+                )
+                self.async_semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+            return self._async_clients[loop], self.async_semaphores[loop]
+
+    def chat(self, **request):
+        """Run one chat completion and return the message content"""
+        with self.semaphore:
+            response = self.client.chat.completions.create(**request)
+        return response.choices[0].message.content
+
+    def chat_stream(self, **request):
+        """Run one streamed chat completion, yielding the content as it arrives"""
+        with self.semaphore:
+            stream = self.client.chat.completions.create(stream=True, **request)
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+
+    async def chat_async(self, **request):
+        client, semaphore = self.get_async_client()
+        async with semaphore:
+            response = await client.chat.completions.create(**request)
+        return response.choices[0].message.content
+
+    def after_fork(self):
+        """In a forked child: drop the parent's clients and locks (not closed; the parent
+        still owns them). New clients are built on first use."""
+        self.lock = threading.Lock()
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.async_semaphores = weakref.WeakKeyDictionary()
+
+    def close(self):
+        with self.lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            self._async_clients.clear()
+            self.async_semaphores.clear()
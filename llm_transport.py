@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Record/replay and stub transports for the Groq chat-completions API
+
+    LLM_TRANSPORT=record LLM_CASSETTE=cassette.json   capture live responses
+    LLM_TRANSPORT=replay LLM_CASSETTE=cassette.json   serve them from disk (no network)
+    LLM_TRANSPORT=stub   LLM_STUB_URL=http://...      talk to a local stub server
+
+Start a stub server with: python llm_transport.py --port 8765
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from llm_client import LLMClient
+from rule_extractor import RuleBasedFeatureExtractor
+
+CASSETTE_VERSION = 1
+
+# Response headers worth keeping in a cassette; the rest are per-request noise
+RECORDED_HEADERS = ['content-type', 'retry-after', 'x-should-retry']
+
+def request_key(request):
+    """Stable key of a chat request: method, path and the canonical JSON body"""
+    try:
+        body = json.dumps(json.loads(request.content), sort_keys=True)
+    except ValueError:
+        body = request.content.decode('utf-8', 'replace')
+    payload = f"{request.method} {request.url.path}\n{body}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def chat_completion_body(content, model='stub'):
+    """Minimal chat-completions JSON the Groq SDK accepts"""
+    return {
+        'id': 'chatcmpl-stub',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'finish_reason': 'stop',
+            'message': {'role': 'assistant', 'content': content}
+        }],
+        'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+    }
+
+def chat_completion_chunks(content, model='stub', size=16):
+    """Server-sent events of a streamed chat completion, size characters per chunk"""
+    def event(delta, finish_reason=None):
+        chunk = {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    events = [event({'role': 'assistant', 'content': content[start:start + size]})
+              for start in range(0, len(content), size)]
+    events.append(event({}, finish_reason='stop'))
+    events.append("data: [DONE]\n\n")
+    return events
+
+class Cassette:
+    """Recorded request/response pairs in a JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.interactions = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version in {path}")
+            self.interactions = data['interactions']
+
+    def get(self, key):
+        return self.interactions.get(key)
+
+    def record(self, key, request, response):
+        try:
+            request_body = json.loads(request.content)
+        except ValueError:
+            request_body = request.content.decode('utf-8', 'replace')
+        with self.lock:
+            self.interactions[key] = {
+                'request': {'method': request.method, 'path': request.url.path, 'body': request_body},
+                'response': {
+                    'status': response.status_code,
+                    'headers': {name: response.headers[name] for name in RECORDED_HEADERS
+                                if name in response.headers},
+                    'body': response.content.decode('utf-8')
+                }
+            }
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': CASSETTE_VERSION, 'interactions': self.interactions}, f,
+                      indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Forwards requests to the real API and saves every successful response"""
+
+    def __init__(self, cassette_path, transport=None, async_transport=None):
+        self.cassette = Cassette(cassette_path)
+        self.transport = transport if transport is not None else httpx.HTTPTransport()
+        self.async_transport = async_transport if async_transport is not None else httpx.AsyncHTTPTransport()
+
+    def keep(self, request, response):
+        # Errors (429s, outages) are not worth replaying
+        if response.status_code < 400:
+            self.cassette.record(request_key(request), request, response)
+
+    def replayable(self, response):
+        # The body is already decoded, so encoding/length headers no longer apply
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')]
+        return httpx.Response(response.status_code, headers=headers, content=response.content)
+
+    def handle_request(self, request):
+        response = self.transport.handle_request(request)
+        response.read()
+        self.keep(request, response)
+        return self.replayable(response)
+
+    async def handle_async_request(self, request):
+        response = await self.async_transport.handle_async_request(request)
+        await response.aread()
+        self.keep(request, response)
+        return self.replayable(response)
+
+    def close(self):
+        self.transport.close()
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Serves responses from a cassette, optionally after a simulated network latency.
+
+    A request that was never recorded gets a 404 that the SDK does not retry.
+    """
+
+    def __init__(self, cassette_path, latency=0.0, jitter=0.0, seed=None):
+        self.cassette = Cassette(cassette_path)
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.counters = {'replayed': 0, 'missing': 0}
+
+    def delay(self):
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def build_response(self, request):
+        interaction = self.cassette.get(request_key(request))
+        if interaction is None:
+            self.counters['missing'] += 1
+            return httpx.Response(
+                404, headers={'x-should-retry': 'false'},
+                json={'error': {'message': 'No recorded response for this request', 'type': 'cassette_miss'}}
+            )
+        self.counters['replayed'] += 1
+        response = interaction['response']
+        return httpx.Response(response['status'], headers=response['headers'],
+                              content=response['body'].encode('utf-8'))
+
+    def handle_request(self, request):
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+        return self.build_response(request)
+
+    async def handle_async_request(self, request):
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self.build_response(request)
+
+def rule_based_responder(extractor=None):
+    """Responder that answers with the offline rule extractor's features"""
+    extractor = extractor if extractor is not None else RuleBasedFeatureExtractor()
+
+    def respond(request_body):
+        features, _ = extractor.extract(request_body['messages'][-1]['content'])
+        return json.dumps(features)
+
+    return respond
+
+class StubChatServer:
+    """Local HTTP server that speaks the chat-completions JSON shape.
+
+    responder(request_body) returns the assistant message content; it defaults
+    to the rule-based extractor. Requests with "stream": true get it back as
+    server-sent events, with latency spread across the chunks. Runs in a
+    background thread.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, responder=None, latency=0.0):
+        self.responder = responder if responder is not None else rule_based_responder()
+        self.latency = latency
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not self.path.endswith('/chat/completions'):
+                    self.send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+                    return
+                try:
+                    request_body = json.loads(body)
+                    content = stub.responder(request_body)
+                except Exception as e:
+                    self.send_json(400, {'error': {'message': str(e)}})
+                    return
+                model = request_body.get('model', 'stub')
+                if request_body.get('stream'):
+                    self.send_events(chat_completion_chunks(content, model))
+                    return
+                if stub.latency:
+                    time.sleep(stub.latency)
+                self.send_json(200, chat_completion_body(content, model))
+
+            def send_events(self, events):
+                data = [event.encode() for event in events]
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Content-Length', str(sum(len(chunk) for chunk in data)))
+                self.end_headers()
+                for chunk in data:
+                    if stub.latency:
+                        time.sleep(stub.latency / len(data))
+                    self.wfile.write(chunk)
+                    self.wfile.flush()
+
+            def send_json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def llm_client_from_env(environ=None, api_key_provider=None, **client_options):
+    """LLMClient configured by LLM_TRANSPORT (live, record, replay or stub)"""
+    environ = os.environ if environ is None else environ
+    mode = environ.get('LLM_TRANSPORT', 'live')
+    cassette_path = environ.get('LLM_CASSETTE', './artifacts/llm_cassette.json')
+
+    if mode == 'live':
+        return LLMClient(api_key_provider=api_key_provider, **client_options)
+    if mode == 'record':
+        return LLMClient(api_key_provider=api_key_provider,
+                         transport=RecordingTransport(cassette_path), **client_options)
+    if mode == 'replay':
+        latency = float(environ.get('LLM_REPLAY_LATENCY', 0))
+        return LLMClient(api_key='replay', transport=ReplayTransport(cassette_path, latency=latency),
+                         **client_options)
+    if mode == 'stub':
+        return LLMClient(api_key='stub', base_url=environ.get('LLM_STUB_URL', 'http://127.0.0.1:8765'),
+                         **client_options)
+    raise ValueError(f"Unknown LLM_TRANSPORT {mode!r}; expected live, record, replay or stub")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local chat-completions stub server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before answering")
+    args = parser.parse_args()
+
+    stub = StubChatServer(args.host, args.port, latency=args.latency)
+    print(f"Stub chat-completions server on {stub.url}/openai/v1/chat/completions")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
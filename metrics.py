@@ -0,0 +1,183 @@
+import bisect
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds (Prometheus convention)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Trace of the request running in this thread / asyncio task
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+class Trace:
+    """Stage timings of one request, in milliseconds.
+
+    A stage entered more than once (e.g. two KNN lookups) accumulates.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.attributes = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def timings(self):
+        return {stage: round(ms, 3) for stage, ms in self.stages.items()}
+
+class Span:
+    """Times a with-block into StageMetrics; failures also count as errors"""
+
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, error=exc_type is not None)
+        return False
+
+class StageMetrics:
+    """Per-stage latency histograms and counters, with hooks for outside collectors.
+
+    Wrap work in span(stage); spans opened inside trace() are also recorded on
+    that request's Trace. Every finished span calls hook(stage, seconds, trace)
+    for each registered hook (trace is None outside a request).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.hooks = []
+        self.stages = {}
+        self.counters = {}
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def stage_stats(self, stage):
+        if stage not in self.stages:
+            self.stages[stage] = {'count': 0, 'errors': 0, 'sum': 0.0, 'max': 0.0,
+                                  'buckets': [0] * len(self.buckets)}
+        return self.stages[stage]
+
+    def observe(self, stage, seconds, error=False):
+        with self.lock:
+            stats = self.stage_stats(stage)
+            stats['count'] += 1
+            stats['errors'] += error
+            stats['sum'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            bucket = bisect.bisect_left(self.buckets, seconds)
+            if bucket < len(self.buckets):
+                stats['buckets'][bucket] += 1
+
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+        for hook in self.hooks:
+            try:
+                hook(stage, seconds, trace)
+            except Exception:
+                # A broken collector must not fail the request
+                self.increment('hook_errors')
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def annotate(self, key, value):
+        """Attach a value (e.g. where the features came from) to the current request"""
+        trace = current_trace.get()
+        if trace is not None:
+            trace.attributes[key] = value
+
+    def span(self, stage):
+        return Span(self, stage)
+
+    @contextmanager
+    def trace(self, stage='total'):
+        """Start a request: yields its Trace, closed by a `stage` span over the whole block"""
+        trace = Trace()
+        token = current_trace.set(trace)
+        try:
+            with self.span(stage):
+                yield trace
+        finally:
+            current_trace.reset(token)
+
+    def snapshot(self):
+        with self.lock:
+            stages = {}
+            for stage, stats in self.stages.items():
+                stages[stage] = {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'mean_ms': stats['sum'] / stats['count'] * 1000 if stats['count'] else 0.0,
+                    'max_ms': stats['max'] * 1000,
+                    'sum_seconds': stats['sum'],
+                    'buckets': dict(zip([str(bound) for bound in self.buckets], stats['buckets']))
+                }
+            return {'counters': dict(self.counters), 'stages': stages}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix='beer_buddy'):
+        """Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+
+            if self.stages:
+                lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, stats in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, stats['buckets']):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats["count"]}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {stats["sum"]}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+            if self.stages:
+                lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+            for stage, stats in sorted(self.stages.items()):
+                lines.append(f'{prefix}_stage_errors_total{{stage="{stage}"}} {stats["errors"]}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Write JSON (*.json) or Prometheus text (anything else) atomically"""
+        text = self.to_json() if path.endswith('.json') else self.to_prometheus()
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        return path
+
+    def after_fork(self):
+        # A forked child starts its own counts (and must not inherit a held lock)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
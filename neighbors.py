@@ -0,0 +1,182 @@
+import copy
+
+import numpy as np
+
+# Default backend per partition size, from `python benchmark.py --only neighbors`
+# (one CPU): exact brute force takes ~1.5ms per query at 30k rows and ~5ms at
+# 100k; IVF answers 100k-1M rows in 1-9ms with recall@10 >= 0.99, but costs
+# seconds to build and is not exact, so it only takes over for large partitions.
+AUTO_BACKENDS = [(50_000, 'brute'), (None, 'ivf')]
+
+class BruteForceIndex:
+    """Exact search: one BLAS matrix product per query chunk.
+
+    Candidates come from float32 squared distances; the best few are then
+    re-measured in float64, so distances and ordering match exact search.
+    Ties are broken by row order.
+    """
+
+    # Fitted state that is plain numpy arrays (shareable, see shared_arrays.py)
+    array_attributes = ('X', 'norms')
+
+    def __init__(self, n_neighbors=10, chunk_size=256, refine=16):
+        self.n_neighbors = n_neighbors
+        self.chunk_size = chunk_size
+        self.refine = refine
+
+    def fit(self, X):
+        self.X = np.asarray(X, dtype=np.float32)
+        self.norms = np.einsum('ij,ij->i', self.X, self.X)
+        return self
+
+    @property
+    def n_samples(self):
+        return len(self.X)
+
+    def refit(self, X):
+        """A new index over updated rows; this one keeps serving unchanged"""
+        return copy.copy(self).fit(X)
+
+    def kneighbors(self, X, n_neighbors=None):
+        k = min(n_neighbors or self.n_neighbors, self.n_samples)
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        distances = np.empty((len(X), k))
+        indices = np.empty((len(X), k), dtype=np.int64)
+        for start in range(0, len(X), self.chunk_size):
+            chunk = X[start:start + self.chunk_size]
+            squared = self.norms - 2 * (chunk.astype(np.float32) @ self.X.T)
+            for i, query in enumerate(chunk):
+                distances[start + i], indices[start + i] = self.refine_candidates(
+                    query, squared[i], np.arange(self.n_samples), k
+                )
+        return distances, indices
+
+    def refine_candidates(self, query, approximate, candidates, k):
+        # approximate: squared distances (up to a constant) of candidates to query
+        keep = min(len(candidates), k + self.refine)
+        if keep < len(candidates):
+            best = np.argpartition(approximate, keep - 1)[:keep]
+            candidates = candidates[best]
+        exact = np.sqrt(((self.X[candidates] - query) ** 2).sum(axis=1))
+        order = np.lexsort((candidates, exact))[:k]
+        return exact[order], candidates[order]
+
+class SklearnIndex:
+    """scikit-learn NearestNeighbors: KD-tree, Ball-tree or its own choice ('auto'); exact"""
+
+    # The fitted trees stay private to each process
+    array_attributes = ()
+
+    def __init__(self, n_neighbors=10, algorithm='auto', leaf_size=40):
+        self.n_neighbors = n_neighbors
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+
+    def fit(self, X):
+        from sklearn.neighbors import NearestNeighbors
+
+        self.knn = NearestNeighbors(n_neighbors=self.n_neighbors, algorithm=self.algorithm,
+                                    leaf_size=self.leaf_size, metric='euclidean')
+        self.knn.fit(X)
+        return self
+
+    @property
+    def n_samples(self):
+        return self.knn.n_samples_fit_
+
+    def refit(self, X):
+        return copy.copy(self).fit(X)
+
+    def kneighbors(self, X, n_neighbors=None):
+        k = min(n_neighbors or self.n_neighbors, self.n_samples)
+        return self.knn.kneighbors(np.atleast_2d(X), n_neighbors=k)
+
+class IVFIndex(BruteForceIndex):
+    """Approximate search over an inverted file: rows are bucketed by their
+    nearest k-means centroid and a query scans only the n_probe closest buckets.
+
+    n_lists defaults to ~sqrt(rows) and n_probe to 5% of the buckets; the
+    centroids are trained on at most train_size sampled rows.
+    """
+
+    array_attributes = BruteForceIndex.array_attributes + ('centroids', 'centroid_norms', 'list_rows', 'list_offsets')
+
+    def __init__(self, n_neighbors=10, n_lists=None, n_probe=None, train_size=20_000, seed=0, refine=16):
+        super().__init__(n_neighbors=n_neighbors, refine=refine)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_size = train_size
+        self.seed = seed
+
+    def fit(self, X):
+        from sklearn.cluster import KMeans
+
+        super().fit(X)
+        n_lists = self.n_lists or max(1, int(np.sqrt(self.n_samples)))
+        n_lists = min(n_lists, self.n_samples)
+        rng = np.random.default_rng(self.seed)
+        sample = self.X
+        if self.n_samples > self.train_size:
+            sample = self.X[rng.choice(self.n_samples, self.train_size, replace=False)]
+        kmeans = KMeans(n_clusters=n_lists, n_init=1, max_iter=10, random_state=self.seed).fit(sample)
+        self.centroids = kmeans.cluster_centers_.astype(np.float32)
+        self.centroid_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        return self.assign_lists()
+
+    def refit(self, X):
+        """A new index over updated rows that reuses these centroids (no k-means)"""
+        index = copy.copy(self)
+        BruteForceIndex.fit(index, X)
+        return index.assign_lists()
+
+    def assign_lists(self):
+        n_lists = len(self.centroids)
+        assignments = np.empty(self.n_samples, dtype=np.int64)
+        for start in range(0, self.n_samples, 65536):
+            block = self.X[start:start + 65536]
+            assignments[start:start + 65536] = np.argmin(self.centroid_norms - 2 * (block @ self.centroids.T), axis=1)
+        # Rows grouped by bucket: bucket b is list_rows[list_offsets[b]:list_offsets[b + 1]]
+        self.list_rows = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.searchsorted(assignments[self.list_rows], np.arange(n_lists + 1))
+        self.probe = min(n_lists, self.n_probe or max(1, int(np.ceil(0.05 * n_lists))))
+        return self
+
+    def kneighbors(self, X, n_neighbors=None):
+        k = min(n_neighbors or self.n_neighbors, self.n_samples)
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        distances = np.empty((len(X), k))
+        indices = np.empty((len(X), k), dtype=np.int64)
+        centroid_scores = self.centroid_norms - 2 * (X.astype(np.float32) @ self.centroids.T)
+        for i, query in enumerate(X):
+            probe = self.probe
+            while True:
+                buckets = np.argpartition(centroid_scores[i], probe - 1)[:probe]
+                candidates = np.concatenate([self.list_rows[self.list_offsets[b]:self.list_offsets[b + 1]]
+                                             for b in buckets])
+                # Widen the probe until the buckets hold at least k rows
+                if len(candidates) >= k or probe == len(self.centroids):
+                    break
+                probe = min(len(self.centroids), probe * 2)
+            approximate = self.norms[candidates] - 2 * (self.X[candidates] @ query.astype(np.float32))
+            distances[i], indices[i] = self.refine_candidates(query, approximate, candidates, k)
+        return distances, indices
+
+BACKENDS = {
+    'brute': BruteForceIndex,
+    'sklearn': SklearnIndex,
+    'kd_tree': lambda **options: SklearnIndex(algorithm='kd_tree', **options),
+    'ball_tree': lambda **options: SklearnIndex(algorithm='ball_tree', **options),
+    'ivf': IVFIndex
+}
+
+def choose_backend(n_rows):
+    for max_rows, name in AUTO_BACKENDS:
+        if max_rows is None or n_rows <= max_rows:
+            return name
+
+def make_index(backend, n_rows, n_neighbors=10, **options):
+    """Unfitted index for a partition of n_rows ('auto' picks by size)"""
+    name = choose_backend(n_rows) if backend == 'auto' else backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown neighbor backend {backend!r}; expected auto or one of {sorted(BACKENDS)}")
+    return BACKENDS[name](n_neighbors=n_neighbors, **options)
@@ -0,0 +1,128 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+class CursorExpired(LookupError):
+    """Raised for a pagination cursor that is unknown, expired or evicted"""
+
+def top_k_order(scores, k):
+    """Positions of the k highest scores, best first.
+
+    argpartition finds the k best without sorting the whole pool; only they
+    (and anything tied with the k-th) are sorted. Ties keep position order,
+    exactly like a stable sort of the full list.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.arange(len(scores))
+    if k < len(scores):
+        best = np.argpartition(-scores, k - 1)[:k]
+        candidates = np.flatnonzero(scores >= scores[best].min())
+    order = np.lexsort((candidates, -scores[candidates]))[:k]
+    return candidates[order]
+
+def check_page(offset, limit):
+    if offset < 0:
+        raise ValueError(f"offset must be 0 or more, got {offset}")
+    if limit is not None and limit < 0:
+        raise ValueError(f"limit must be 0 or more, got {limit}")
+
+def check_cursor_limit(limit):
+    # A page of 0 would hand back the same cursor forever
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit must be at least 1 (or None for the rest), got {limit}")
+
+class Ranking:
+    """The k best neighbors of one query by quality score, as arrays.
+
+    Holds the catalog it was ranked against, so every page of a ranking reads
+    the same beers even if a newer catalog is published meanwhile. Names and
+    descriptions are decoded only for the page asked for.
+    """
+
+    def __init__(self, catalog, rows, distances, indices, ratings, num_reviews, quality_scores):
+        self.catalog = catalog
+        self.rows = rows
+        self.distances = distances
+        self.indices = indices
+        self.ratings = ratings
+        self.num_reviews = num_reviews
+        self.quality_scores = quality_scores
+
+    def __len__(self):
+        return len(self.rows)
+
+    def page(self, offset=0, limit=None):
+        """Results offset to offset + limit (limit None: the rest)"""
+        check_page(offset, limit)
+        stop = len(self) if limit is None else min(len(self), offset + limit)
+        return [
+            {
+                'name': self.catalog.names[self.rows[i]],
+                'description': self.catalog.descriptions[self.rows[i]],
+                'rating': float(self.ratings[i]),
+                'num_reviews': int(self.num_reviews[i]),
+                'distance': self.distances[i],
+                'index': self.indices[i],
+                'quality_score': self.quality_scores[i]
+            }
+            for i in range(offset, stop)
+        ]
+
+class CursorStore:
+    """Rankings kept for "load more": a cursor names a ranking and an offset into it.
+
+    Later pages are sliced from the stored ranking, so they never repeat the
+    neighbor search and never shift. Least recently used rankings are evicted
+    beyond max_entries, and any older than max_age_seconds expire.
+    """
+
+    def __init__(self, max_entries=1024, max_age_seconds=600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self.rankings = OrderedDict()
+        self.ids = itertools.count(1)
+        # Set per process after a fork, so sibling workers never issue the same id
+        self.id_prefix = ''
+        self.lock = threading.Lock()
+
+    def add(self, ranking):
+        with self.lock:
+            ranking_id = f"{self.id_prefix}{next(self.ids):x}"
+            self.rankings[ranking_id] = (ranking, self.clock())
+            while len(self.rankings) > self.max_entries:
+                self.rankings.popitem(last=False)
+        return ranking_id
+
+    def cursor(self, ranking_id, offset, ranking):
+        # None once the ranking is exhausted
+        return f"{ranking_id}:{offset}" if offset < len(ranking) else None
+
+    def get(self, cursor):
+        """(ranking_id, ranking, offset) for a cursor"""
+        ranking_id, _, offset = str(cursor).partition(':')
+        with self.lock:
+            entry = self.rankings.get(ranking_id)
+            if entry is not None and self.max_age_seconds is not None \
+                    and self.clock() - entry[1] > self.max_age_seconds:
+                del self.rankings[ranking_id]
+                entry = None
+            if entry is None or not offset.isdigit():
+                raise CursorExpired(f"Unknown or expired cursor {cursor!r}; start a new search")
+            self.rankings.move_to_end(ranking_id)
+        return ranking_id, entry[0], int(offset)
+
+    def after_fork(self):
+        # Rankings stay readable, but each process issues its own cursors
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.id_prefix = f"{os.getpid():x}-"
+
+    def __len__(self):
+        return len(self.rankings)
@@ -0,0 +1,52 @@
+import time
+
+class RefitPolicy:
+    """When incremental catalog updates should trigger a full retrain.
+
+    Upserts, deletes and review updates reach the catalog, the scaled features
+    and the neighbor indexes immediately. The regression model, the scalers and
+    the encoders refit together, once one of these limits is reached (None
+    disables a limit):
+
+    - max_changed_fraction: drift, the share of catalog rows changed since the
+      last fit (new styles only get their own one-hot column after a refit)
+    - max_changes: changed rows since the last fit
+    - max_age_seconds: time since the last fit, when any change is pending
+    """
+
+    def __init__(self, max_changed_fraction=0.05, max_changes=None, max_age_seconds=None, clock=time.monotonic):
+        self.max_changed_fraction = max_changed_fraction
+        self.max_changes = max_changes
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self.changed_keys = set()
+        self.catalog_rows = 0
+        self.fitted_at = clock()
+
+    def record(self, keys):
+        self.changed_keys.update(keys)
+
+    def reset(self, catalog_rows):
+        self.changed_keys = set()
+        self.catalog_rows = catalog_rows
+        self.fitted_at = self.clock()
+
+    def drift(self):
+        return len(self.changed_keys) / max(1, self.catalog_rows)
+
+    def due(self):
+        if not self.changed_keys:
+            return False
+        if self.max_changed_fraction is not None and self.drift() >= self.max_changed_fraction:
+            return True
+        if self.max_changes is not None and len(self.changed_keys) >= self.max_changes:
+            return True
+        return self.max_age_seconds is not None and self.clock() - self.fitted_at >= self.max_age_seconds
+
+    def stats(self):
+        return {
+            'pending_changes': len(self.changed_keys),
+            'drift': self.drift(),
+            'seconds_since_fit': self.clock() - self.fitted_at,
+            'refit_due': self.due()
+        }
@@ -0,0 +1,132 @@
+import time
+
+import numpy as np
+
+# Rating model backends. 'style' is how Style reaches the model: one-hot columns,
+# or one integer code column the booster splits on natively. 'iterations' is the
+# parameter a TrainingBudget grows.
+REGRESSORS = {
+    'gradient_boosting': {
+        'style': 'onehot',
+        'iterations': 'n_estimators',
+        'defaults': {}
+    },
+    'hist_gradient_boosting': {
+        'style': 'ordinal',
+        'iterations': 'max_iter',
+        # Multi-threaded (OpenMP); early stopping is left to TrainingBudget
+        'defaults': {'max_iter': 300, 'learning_rate': 0.1, 'max_leaf_nodes': 31,
+                     'early_stopping': False, 'random_state': 0}
+    }
+}
+
+def regressor_spec(name):
+    if name not in REGRESSORS:
+        raise ValueError(f"Unknown regressor {name!r}; expected one of {sorted(REGRESSORS)}")
+    return REGRESSORS[name]
+
+def make_regressor(name, params=None, categorical_features=None):
+    """Unfitted regressor; categorical_features are the Style code column(s) for 'ordinal' backends"""
+    spec = regressor_spec(name)
+    params = {**spec['defaults'], **(params or {})}
+    if name == 'gradient_boosting':
+        from sklearn.ensemble import GradientBoostingRegressor
+        return GradientBoostingRegressor(**params)
+
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    return HistGradientBoostingRegressor(categorical_features=categorical_features, **params)
+
+class TrainingBudget:
+    """Limits for fitting the rating model, checked between warm-started steps.
+
+    seconds caps wall-clock time and max_iterations the number of iterations
+    (default: the model's own). With early_stopping, validation_fraction of
+    the rows (seeded) is held out and training stops once the holdout MAE has
+    not improved by tol for n_iter_no_change iterations.
+
+    Steps start at `step` iterations and double: every warm start re-predicts
+    the trees fitted so far, so fixed small steps would cost quadratic time.
+
+    Like scikit-learn's own early stopping, the model keeps the iterations
+    fitted after the best one; holdout_mae is the returned model's, and
+    best_iterations / best_holdout_mae say where the holdout score peaked.
+    """
+
+    def __init__(self, seconds=None, max_iterations=None, early_stopping=True, validation_fraction=0.1,
+                 n_iter_no_change=20, tol=1e-4, step=10, seed=0, clock=time.perf_counter):
+        self.seconds = seconds
+        self.max_iterations = max_iterations
+        self.early_stopping = early_stopping
+        self.validation_fraction = validation_fraction
+        self.n_iter_no_change = n_iter_no_change
+        self.tol = tol
+        self.step = step
+        self.seed = seed
+        self.clock = clock
+
+    def settings(self):
+        return {name: value for name, value in vars(self).items() if name != 'clock'}
+
+    def fit(self, model, X, y, iterations_param):
+        """Fit model in warm-started steps; returns what stopped it and where"""
+        limit = self.max_iterations or model.get_params()[iterations_param]
+        X_val = y_val = None
+        if self.early_stopping:
+            order = np.random.default_rng(self.seed).permutation(len(X))
+            n_val = max(1, int(len(X) * self.validation_fraction))
+            X, y, X_val, y_val = X[order[n_val:]], y[order[n_val:]], X[order[:n_val]], y[order[:n_val]]
+
+        model.set_params(warm_start=True)
+        start = self.clock()
+        iterations, best_mae, best_at, stopped_by = 0, np.inf, 0, 'max_iterations'
+        mae = None
+        step, step_seconds = self.step, 0.0
+        while iterations < limit:
+            step = min(step, limit - iterations)
+            if self.seconds is not None and iterations:
+                # The last step's cost per iteration (overhead included) estimates the next
+                per_iteration = step_seconds / previous_step
+                remaining = self.seconds - (self.clock() - start)
+                if remaining < per_iteration:
+                    stopped_by = 'seconds'
+                    break
+                step = max(1, min(step, int(remaining / per_iteration)))
+            iterations += step
+            step_start = self.clock()
+            model.set_params(**{iterations_param: iterations})
+            model.fit(X, y)
+            step_seconds, previous_step = self.clock() - step_start, step
+            step *= 2
+
+            if X_val is not None:
+                mae = float(np.mean(np.abs(model.predict(X_val) - y_val)))
+                if mae < best_mae - self.tol:
+                    best_mae, best_at = mae, iterations
+                elif iterations - best_at >= self.n_iter_no_change:
+                    stopped_by = 'early_stopping'
+                    break
+        model.set_params(warm_start=False)
+        return {
+            'iterations': iterations,
+            'seconds': self.clock() - start,
+            'stopped_by': stopped_by,
+            # Of the model as returned, trained `iterations` iterations
+            'holdout_mae': mae,
+            'best_iterations': best_at if X_val is not None else None,
+            'best_holdout_mae': best_mae if X_val is not None else None
+        }
+
+def fit_regressor(model, X, y, iterations_param, budget=None):
+    """Fit model (within budget, if given); returns a summary of the fit"""
+    if budget is not None:
+        return budget.fit(model, X, y, iterations_param)
+    start = time.perf_counter()
+    model.fit(X, y)
+    return {
+        'iterations': model.get_params()[iterations_param],
+        'seconds': time.perf_counter() - start,
+        'stopped_by': 'complete',
+        'holdout_mae': None,
+        'best_iterations': None,
+        'best_holdout_mae': None
+    }
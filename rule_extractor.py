@@ -0,0 +1,293 @@
+import json
+import re
+import unicodedata
+
+# Deterministic versions of the keyword tables in SYSTEM_PROMPT (beer_recommender.py).
+# Values are absolute feature values; percentages in the prompt are of the range max.
+
+STYLE_TEMPLATES = {
+    'IPA': {'Hoppy': 155, 'Bitter': 110, 'ABV': 6.8, 'Body': 75, 'Malty': 75},
+    'Pilsner': {'Hoppy': 65, 'Bitter': 45, 'ABV': 4.5, 'Body': 30, 'Malty': 80},
+    'Wheat Beer': {'Hoppy': 45, 'Body': 35, 'ABV': 4.2, 'Fruits': 85, 'Sour': 65},
+    'Lager': {'Hoppy': 60, 'Bitter': 55, 'ABV': 5.0, 'Body': 50, 'Malty': 60},
+    'Stout': {'Body': 140, 'Malty': 180, 'ABV': 6.5, 'Hoppy': 35},
+    'Tripel': {'ABV': 9.0, 'Spices': 155, 'Fruits': 95, 'Sweet': 115},
+    'Wild Ale': {'Sour': 265, 'Astringency': 65, 'Hoppy': 20},
+    'Red Ale': {'Malty': 185, 'Sweet': 145, 'Body': 95, 'Bitter': 35},
+}
+
+# phrase -> (catalog style, template or None)
+STYLE_KEYWORDS = {
+    'ipa': ('IPA', 'IPA'),
+    'india pale ale': ('IPA', 'IPA'),
+    'pilsner': ('Pilsner', 'Pilsner'),
+    'pilsener': ('Pilsner', 'Pilsner'),
+    'pils': ('Pilsner', 'Pilsner'),
+    'wheat': ('Wheat Beer', 'Wheat Beer'),
+    'hefeweizen': ('Wheat Beer', 'Wheat Beer'),
+    'witbier': ('Wheat Beer', 'Wheat Beer'),
+    'lager': ('Lager', 'Lager'),
+    'stout': ('Stout', 'Stout'),
+    'tripel': ('Tripel', 'Tripel'),
+    'sour': ('Wild Ale', 'Wild Ale'),
+    'wild ale': ('Wild Ale', 'Wild Ale'),
+    'lambic': ('Lambic', 'Wild Ale'),
+    'gueuze': ('Lambic', 'Wild Ale'),
+    'amber': ('Red Ale', 'Red Ale'),
+    'red ale': ('Red Ale', 'Red Ale'),
+    'dubbel': ('Dubbel', None),
+    'quad': ('Quadrupel (Quad)', None),
+    'quadrupel': ('Quadrupel (Quad)', None),
+}
+
+# phrase -> feature values
+STRENGTH_KEYWORDS = {
+    'light': {'ABV': 3.8, 'Body': 30, 'Alcohol': 15},
+    'low alcohol': {'ABV': 3.8, 'Body': 30, 'Alcohol': 15},
+    'sessionable': {'ABV': 4.5, 'Body': 35, 'Alcohol': 20},
+    'session': {'ABV': 4.5, 'Body': 35, 'Alcohol': 20},
+    'refreshing': {'ABV': 4.5, 'Body': 35, 'Alcohol': 20},
+    'medium': {'ABV': 5.5, 'Body': 70, 'Alcohol': 55},
+    'regular': {'ABV': 5.5, 'Body': 70, 'Alcohol': 55},
+    'strong': {'ABV': 8.0, 'Body': 80, 'Alcohol': 88},
+    'very strong': {'ABV': 10.5, 'Body': 140, 'Alcohol': 115},
+    'imperial': {'ABV': 10.5, 'Body': 140, 'Alcohol': 115},
+}
+
+FLAVOR_KEYWORDS = {
+    'citrusy': {'Fruits': 140, 'Sour': 85},
+    'citrus': {'Fruits': 140, 'Sour': 85},
+    'tropical': {'Fruits': 145, 'Sour': 15},
+    'orangey': {'Fruits': 155},
+    'orange': {'Fruits': 155},
+    'fruity': {'Fruits': 120},
+    'chocolate': {'Spices': 140, 'Malty': 210},
+    'coffee': {'Spices': 140, 'Astringency': 55},
+    'spicy': {'Spices': 155},
+    'funky': {'Sour': 265, 'Astringency': 65},
+    'brett': {'Sour': 265, 'Astringency': 65},
+    'tart': {'Sour': 240, 'Astringency': 45},
+    'hoppy': {'Hoppy': 150, 'Bitter': 110},
+    'hops': {'Hoppy': 150, 'Bitter': 110},
+    'bitter': {'Bitter': 122},
+    'sweet': {'Sweet': 145},
+    'sweetness': {'Sweet': 145},
+    'dessert': {'Sweet': 195, 'Body': 160},
+    'dry': {'Sweet': 15},
+    'malty': {'Malty': 185},
+}
+
+# Explicit values that override the generic modifier arithmetic
+MODIFIED_FLAVORS = {
+    ('very', 'hoppy'): {'Hoppy': 160, 'Bitter': 128},
+    ('very', 'sweet'): {'Sweet': 202},
+    ('very', 'malty'): {'Malty': 210},
+    ('no', 'hops'): {'Hoppy': 20, 'Bitter': 20},
+    ('no', 'hoppy'): {'Hoppy': 20, 'Bitter': 20},
+    ('not too', 'malty'): {'Malty': 60},
+}
+
+# phrase -> (kind, fraction of max or multiplier)
+INTENSITY_MODIFIERS = {
+    'very': ('at_least', 0.775),
+    'really': ('at_least', 0.775),
+    'extremely': ('at_least', 0.925),
+    'super': ('at_least', 0.925),
+    'slightly': ('scale', 0.5),
+    'a bit': ('scale', 0.5),
+    'a little': ('scale', 0.5),
+    'less': ('scale', 0.5),
+    'more': ('at_least', 0.775),
+    'hint of': ('scale', 0.5),
+    'a hint of': ('scale', 0.5),
+    'not too': ('set', 0.25),
+    'no': ('set', 0.075),
+    'without': ('set', 0.075),
+}
+
+BAD_BEER_KEYWORDS = ['bad', 'terrible', 'awful', 'worst', 'horrible', 'disgusting', 'undrinkable']
+
+BAD_BEER_PROFILE = {
+    'ABV': 0.5, 'Astringency': 3, 'Body': 12, 'Alcohol': 12, 'Bitter': 6, 'Sweet': 15,
+    'Sour': 6, 'Salty': 1, 'Fruits': 5, 'Hoppy': 6, 'Spices': 6, 'Malty': 20,
+    'mainstream': 1, 'style': 'Low Alcohol Beer'
+}
+
+NON_MAINSTREAM_KEYWORDS = [
+    'belgian', 'tripel', 'dubbel', 'quad', 'quadrupel', 'sour', 'wild', 'wild ale', 'lambic',
+    'gueuze', 'brett', 'funky', 'craft', 'artisanal', 'specialty', 'experimental'
+]
+
+EMOJI_KEYWORDS = {
+    '🍊': 'orangey', '🍋': 'citrusy', '🍍': 'tropical', '🥭': 'tropical', '🍓': 'fruity',
+    '🍒': 'fruity', '🍫': 'chocolate', '☕': 'coffee', '🌶': 'spicy', '🍯': 'sweet'
+}
+
+# Words that carry no beer information and do not count against confidence.
+# Polarity words (less, more, too, bit, little) are not filler: dropping them
+# would turn "less bitter" into "bitter".
+FILLER_WORDS = set("""
+    a an the i i'm im me my we us you your want wants wanted would like love need give get
+    looking look for find some something anything just one kind sort of with and or but to
+    that which is it its it's be please pls plz thanks beer beers brew ale notes note
+    character flavor flavour flavors flavours taste tasting profile style drink can could
+    have has maybe really quite lot lots also in on at by from
+    good nice great
+""".split())
+
+class RuleBasedFeatureExtractor:
+    """Offline translation of a prompt into the same dict the LLM returns.
+
+    extract() returns (features, confidence). Confidence is the share of
+    meaningful prompt words the tables recognized, so 1.0 means every word
+    was understood and the LLM is unlikely to add anything. A modifier only
+    counts as understood when it modifies a flavor; a negated style or
+    strength ("no sour") is ignored and counts as not understood.
+    """
+
+    def __init__(self, ranges_path='./data/beer_ranges.json'):
+        with open(ranges_path, encoding='utf-8') as f:
+            ranges = json.load(f)
+        self.ranges = ranges['ranges']
+        self.catalog_styles = {style.lower(): style for style in ranges['beer_styles']}
+
+        self.phrases = {}
+        for phrase in list(self.catalog_styles) + list(STYLE_KEYWORDS):
+            self.phrases[phrase] = 'style'
+        for phrase in STRENGTH_KEYWORDS:
+            self.phrases[phrase] = 'strength'
+        for phrase in FLAVOR_KEYWORDS:
+            self.phrases[phrase] = 'flavor'
+        for phrase in INTENSITY_MODIFIERS:
+            self.phrases[phrase] = 'modifier'
+        for phrase in BAD_BEER_KEYWORDS:
+            self.phrases[phrase] = 'bad'
+        for phrase in NON_MAINSTREAM_KEYWORDS:
+            self.phrases.setdefault(phrase, 'mainstream')
+        self.max_phrase_words = max(len(phrase.split()) for phrase in self.phrases)
+
+    def tokenize(self, prompt):
+        prompt = unicodedata.normalize('NFKC', prompt).lower()
+        for emoji, keyword in EMOJI_KEYWORDS.items():
+            prompt = prompt.replace(emoji, f' {keyword} ')
+        # Anything that is not a word (other emoji, punctuation) is dropped
+        return re.findall(r"[a-zà-ÿ0-9]+(?:'[a-z]+)?", prompt)
+
+    def match_phrases(self, tokens):
+        matches = []
+        position = 0
+        while position < len(tokens):
+            for width in range(min(self.max_phrase_words, len(tokens) - position), 0, -1):
+                phrase = ' '.join(tokens[position:position + width])
+                if phrase in self.phrases:
+                    matches.append((self.phrases[phrase], phrase, width))
+                    position += width
+                    break
+            else:
+                matches.append((None, tokens[position], 1))
+                position += 1
+        return matches
+
+    def apply_modifier(self, modifier, flavor, values):
+        override = MODIFIED_FLAVORS.get((modifier, flavor))
+        if override is not None:
+            return dict(override)
+
+        kind, amount = INTENSITY_MODIFIERS[modifier]
+        modified = {}
+        for feat, value in values.items():
+            feat_max = self.ranges[feat]['max']
+            if kind == 'at_least':
+                modified[feat] = max(value, amount * feat_max)
+            elif kind == 'scale':
+                modified[feat] = value * amount
+            else:
+                modified[feat] = amount * feat_max
+        return modified
+
+    def extract(self, prompt):
+        tokens = self.tokenize(prompt)
+        matches = self.match_phrases(tokens)
+
+        content_words = 0
+        recognized_words = 0
+        style = None
+        template = None
+        strength = None
+        bad = False
+        flavors = []
+        negations = []
+        # Phrases that apply (not negated), for the mainstream rules
+        phrases = set()
+        modifier = None
+        for kind, phrase, width in matches:
+            if kind is None and phrase in FILLER_WORDS:
+                modifier = None
+                continue
+            content_words += width
+            if kind == 'modifier':
+                # A modifier followed by another one modifies nothing
+                modifier = (phrase, width)
+                continue
+            negated = modifier is not None and INTENSITY_MODIFIERS[modifier[0]][0] == 'set'
+            if kind == 'flavor':
+                recognized_words += width + (modifier[1] if modifier is not None else 0)
+                if negated:
+                    negations.append((modifier[0], phrase))
+                else:
+                    flavors.append((modifier[0] if modifier is not None else None, phrase))
+                    phrases.add(phrase)
+            elif kind is not None and not negated:
+                recognized_words += width
+                phrases.add(phrase)
+                if kind == 'bad':
+                    bad = True
+                elif kind == 'style' and style is None:
+                    if phrase in STYLE_KEYWORDS:
+                        style, template = STYLE_KEYWORDS[phrase]
+                    else:
+                        style = self.catalog_styles[phrase]
+                        template = style if style in STYLE_TEMPLATES else None
+                elif kind == 'strength':
+                    strength = phrase
+            modifier = None
+        confidence = recognized_words / content_words if content_words else 0.0
+
+        if bad:
+            return dict(BAD_BEER_PROFILE), confidence
+
+        features = {feat: info['mean'] for feat, info in self.ranges.items()}
+        # Processing order from the system prompt: style, strength, flavors, negations
+        if template is not None:
+            features.update(STYLE_TEMPLATES[template])
+        elif style is None and strength == 'light':
+            # Light Beer template: everything but strength kept low
+            for feat, info in self.ranges.items():
+                features[feat] = 0.15 * info['max']
+            features.update({'ABV': 3.2, 'Body': 25})
+            style = 'Lager'
+        if strength is not None:
+            features.update(STRENGTH_KEYWORDS[strength])
+        for flavor_modifier, flavor in flavors:
+            values = FLAVOR_KEYWORDS[flavor]
+            if flavor_modifier is not None:
+                values = self.apply_modifier(flavor_modifier, flavor, values)
+            features.update(values)
+        for negation, flavor in negations:
+            features.update(self.apply_modifier(negation, flavor, FLAVOR_KEYWORDS[flavor]))
+
+        mainstream = 1
+        if phrases & set(NON_MAINSTREAM_KEYWORDS) or 'dessert' in phrases:
+            mainstream = 0
+        if style in ('Tripel', 'Dubbel', 'Quadrupel (Quad)', 'Lambic', 'Wild Ale', 'Brett Beer'):
+            mainstream = 0
+        if strength in ('imperial', 'very strong') and features['ABV'] > 9:
+            mainstream = 0
+
+        llm_output = {'ABV': round(float(features['ABV']), 1)}
+        for feat in self.ranges:
+            if feat != 'ABV':
+                llm_output[feat] = int(round(features[feat]))
+        llm_output['mainstream'] = mainstream
+        llm_output['style'] = style if style is not None else 'Lager'
+        return llm_output, confidence
@@ -0,0 +1,167 @@
+import re
+import threading
+
+import numpy as np
+
+from llm_cache import normalize_prompt
+from rule_extractor import FILLER_WORDS, INTENSITY_MODIFIERS
+
+# Words that change a flavor's direction or amount even where the extractor has no
+# rule for them; never stripped, so "less sweet stout" cannot reuse "sweet stout"
+POLARITY_WORDS = {'less', 'more', 'little', 'bit', 'too'}
+
+# Words that flip or scale a flavor; prompts only match when they use the same ones
+MODIFIER_WORDS = ({word for phrase in INTENSITY_MODIFIERS for word in phrase.split()} - FILLER_WORDS) | POLARITY_WORDS
+
+# Words dropped before matching
+STRIPPED_WORDS = FILLER_WORDS - POLARITY_WORDS
+
+class SemanticPromptCache:
+    """Reuses LLM features for prompts that are near-duplicates of earlier ones.
+
+    Prompts are reduced to their meaningful words (emoji, punctuation and
+    filler words dropped), turned into hashed character n-gram TF-IDF vectors
+    and compared by cosine similarity against every stored prompt in one
+    matrix-vector product. A lookup at or above `threshold` returns the
+    stored features, provided both prompts use the same modifier words
+    ("no", "very", "slightly", "less", ...), so "no hops" never reuses "hops".
+    Holds at most `max_entries` prompts; the least recently used one is
+    evicted first. Everything runs in-process.
+    """
+
+    def __init__(self, threshold=0.9, max_entries=1024, n_features=2 ** 12, ngram_range=(2, 4)):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self._vectorizer = None
+        self.term_counts = np.zeros((0, n_features), dtype=np.float32)
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.prompts = []
+        self.features = []
+        self.modifiers = []
+        self.last_used = np.zeros(0, dtype=np.int64)
+        self.clock = 0
+        self.weighted = None
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def after_fork(self):
+        self.lock = threading.Lock()
+
+    @property
+    def vectorizer(self):
+        # scikit-learn is imported on the first prompt, not when the cache is created
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            self._vectorizer = HashingVectorizer(
+                analyzer='char_wb', ngram_range=self.ngram_range, n_features=self.n_features,
+                alternate_sign=False, norm=None
+            )
+        return self._vectorizer
+    
+    def canonical_text(self, prompt):
+        words = re.findall(r"[a-z0-9]+(?:'[a-z]+)?", normalize_prompt(prompt))
+        return ' '.join(word for word in words if word not in STRIPPED_WORDS)
+
+    def vectorize(self, prompt):
+        text = self.canonical_text(prompt)
+        if not text:
+            return None, None
+        modifiers = frozenset(text.split()) & MODIFIER_WORDS
+        return self.vectorizer.transform([text]).toarray()[0].astype(np.float32), modifiers
+
+    def idf(self):
+        n_entries = len(self.prompts)
+        return (np.log((1 + n_entries) / (1 + self.doc_freq)) + 1).astype(np.float32)
+
+    def weighted_matrix(self):
+        # TF-IDF rows are rebuilt only after the stored prompts change
+        if self.weighted is None:
+            weighted = self.term_counts[:len(self.prompts)] * self.idf()
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            self.weighted = weighted / norms
+        return self.weighted
+
+    def lookup(self, prompt):
+        """Stored features of the most similar prompt, or None below the threshold"""
+        counts, modifiers = self.vectorize(prompt)
+        with self.lock:
+            if counts is None or not self.prompts:
+                self.counters['misses'] += 1
+                return None
+
+            query = counts * self.idf()
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                self.counters['misses'] += 1
+                return None
+            similarities = self.weighted_matrix() @ (query / norm)
+            for slot, entry_modifiers in enumerate(self.modifiers):
+                if entry_modifiers != modifiers:
+                    similarities[slot] = -1
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.counters['misses'] += 1
+                return None
+
+            self.clock += 1
+            self.last_used[best] = self.clock
+            self.counters['hits'] += 1
+            return dict(self.features[best])
+
+    def add(self, prompt, features):
+        counts, modifiers = self.vectorize(prompt)
+        if counts is None:
+            return
+        with self.lock:
+            self.clock += 1
+            present = counts > 0
+            if len(self.prompts) < self.max_entries:
+                slot = len(self.prompts)
+                if slot == len(self.term_counts):
+                    self.grow()
+                self.prompts.append(prompt)
+                self.features.append(dict(features))
+                self.modifiers.append(modifiers)
+            else:
+                slot = int(np.argmin(self.last_used[:len(self.prompts)]))
+                self.doc_freq -= self.term_counts[slot] > 0
+                self.prompts[slot] = prompt
+                self.features[slot] = dict(features)
+                self.modifiers[slot] = modifiers
+                self.counters['evictions'] += 1
+            self.term_counts[slot] = counts
+            self.doc_freq += present
+            self.last_used[slot] = self.clock
+            self.weighted = None
+
+    def grow(self):
+        capacity = min(self.max_entries, max(16, 2 * len(self.term_counts)))
+        term_counts = np.zeros((capacity, self.term_counts.shape[1]), dtype=np.float32)
+        term_counts[:len(self.term_counts)] = self.term_counts
+        last_used = np.zeros(capacity, dtype=np.int64)
+        last_used[:len(self.last_used)] = self.last_used
+        self.term_counts = term_counts
+        self.last_used = last_used
+
+    def clear(self):
+        with self.lock:
+            self.term_counts = np.zeros((0, self.term_counts.shape[1]), dtype=np.float32)
+            self.doc_freq[:] = 0
+            self.prompts = []
+            self.features = []
+            self.modifiers = []
+            self.last_used = np.zeros(0, dtype=np.int64)
+            self.weighted = None
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.prompts)
+        # Every hit is a Groq call that did not have to be made
+        stats['llm_calls_avoided'] = stats['hits']
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Standalone JSON HTTP service around BeerRecommender
+
+    python server.py --port 8000 --workers 4
+
+The parent process loads the model bundle (or trains) once and then forks the
+workers. They share the model, catalog and neighbor indexes copy-on-write and
+accept connections on one listening socket; a worker that dies is replaced.
+
+    GET  /healthz     liveness: the worker is up
+    GET  /readyz      readiness: 200 while a model is loaded and the worker is not draining
+    GET  /metrics     this worker's stage metrics (Prometheus text)
+    POST /recommend   {"query": "..."} or {"features": {...}}, plus optional
+                      k, candidate_pool, offset, limit and budget_ms
+    POST /recommend_page  the same with k, limit, candidate_pool: the first page
+                      of the recommendations plus a next_cursor
+    POST /next_page   {"cursor": "...", "limit": 10}: the next page, sliced from
+                      the ranking kept by the worker that issued the cursor
+
+Cursors live in the worker that issued them. Workers share one socket, so a
+client pages on the keep-alive connection that got the first page (which
+stays on that worker); any other worker answers 410 for the cursor.
+"""
+
+import gc
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Option -> smallest allowed value
+RANKING_OPTIONS = {'k': 1, 'candidate_pool': 1, 'offset': 0, 'limit': 1}
+PAGE_OPTIONS = ('k', 'candidate_pool', 'limit')
+MAX_BODY_BYTES = 64 * 1024
+# An idle keep-alive connection is closed after this long (it also bounds how long
+# a draining worker waits for idle connections)
+KEEP_ALIVE_SECONDS = 5
+# Largest accepted budget_ms (the pool's wait cannot take an unbounded timeout)
+MAX_BUDGET_MS = 10 * 60 * 1000
+
+def to_json(value):
+    # numpy scalars and arrays in recommendation results
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def check_features(features):
+    # Feature values must be numbers, except the style name
+    for name, value in features.items():
+        expected = str if name == 'style' else (int, float)
+        if isinstance(value, bool) or not isinstance(value, expected) or value != value:
+            raise ValueError(f"feature {name!r} must be {'text' if expected is str else 'a number'}, "
+                             f"got {value!r}")
+
+class RecommenderService:
+    """Request handling for one worker, independent of HTTP.
+
+    Each request runs on a pool of `threads` and gets budget_seconds (or the
+    request's budget_ms) of wall time, queueing included; past that it is
+    answered with 504 and its result discarded. The pool also caps how many
+    requests a worker computes at once.
+    """
+
+    def __init__(self, recommender, budget_seconds=5.0, threads=8):
+        self.recommender = recommender
+        self.budget_seconds = budget_seconds
+        self.threads = threads
+        self.draining = False
+        self.executor = None
+
+    def after_fork(self):
+        self.recommender.after_fork()
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='recommend')
+
+    def ready(self):
+        return not self.draining and self.recommender.status()['state'] == 'ready'
+
+    def handle(self, method, path, body=None):
+        """(status, payload); payload is a dict, or text for /metrics"""
+        if method == 'GET' and path == '/healthz':
+            return 200, {'status': 'ok', 'pid': os.getpid()}
+        if method == 'GET' and path == '/readyz':
+            status = self.recommender.status()
+            return (200 if self.ready() else 503), {**status, 'draining': self.draining, 'pid': os.getpid()}
+        if method == 'GET' and path == '/metrics':
+            return 200, self.recommender.metrics.to_prometheus()
+        if method == 'POST' and path == '/recommend':
+            return self.recommend(body)
+        if method == 'POST' and path == '/recommend_page':
+            return self.recommend(body, paged=True)
+        if method == 'POST' and path == '/next_page':
+            return self.next_page(body)
+        return 404, {'error': f"Unknown endpoint {method} {path}"}
+
+    def parse(self, body, options):
+        """(request, ranking options, budget seconds); raises ValueError for a bad request"""
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError as e:
+            raise ValueError(f"invalid JSON: {e}")
+        if not isinstance(request, dict):
+            raise ValueError("expected a JSON object")
+        ranking = {}
+        for name in options:
+            if request.get(name) is None:
+                continue
+            value = int(request[name])
+            if value < RANKING_OPTIONS[name]:
+                raise ValueError(f"{name} must be at least {RANKING_OPTIONS[name]}, got {value}")
+            ranking[name] = value
+        budget_ms = float(request.get('budget_ms', self.budget_seconds * 1000))
+        # Also rejects NaN and Infinity
+        if not 0 < budget_ms <= MAX_BUDGET_MS:
+            raise ValueError(f"budget_ms must be above 0 and at most {MAX_BUDGET_MS}, got {budget_ms:g}")
+        return request, ranking, budget_ms / 1000
+
+    def recommend(self, body, paged=False):
+        try:
+            request, ranking, budget = self.parse(body, PAGE_OPTIONS if paged else RANKING_OPTIONS)
+            query, features = request.get('query'), request.get('features')
+            if not (isinstance(query, str) and query.strip()) and not isinstance(features, dict):
+                raise ValueError('expected "query" (text) or "features" (object)')
+            if features is not None:
+                check_features(features)
+        except (ValueError, TypeError, OverflowError) as e:
+            return 400, {'error': f"Bad request: {e}"}
+
+        if paged:
+            return self.run(budget, self.first_page, query, features, **ranking)
+        if features is not None:
+            return self.run(budget, self.recommender.recommend_from_features, features, **ranking)
+        return self.run(budget, self.recommender.get_recommendations, query, **ranking)
+
+    def first_page(self, query, features, **ranking):
+        if features is None:
+            features = self.recommender.get_beer_features_from_text(query)
+        return {**self.recommender.recommend_page(features, **ranking), 'user_features': features}
+
+    def next_page(self, body):
+        try:
+            request, ranking, budget = self.parse(body, ('limit',))
+            if not isinstance(request.get('cursor'), str):
+                raise ValueError('expected "cursor" (text)')
+        except (ValueError, TypeError, OverflowError) as e:
+            return 400, {'error': f"Bad request: {e}"}
+        return self.run(budget, self.recommender.next_page, request['cursor'], **ranking)
+
+    def run(self, budget, fn, *args, **kwargs):
+        """Run fn on the pool within budget seconds and map its errors to statuses"""
+        from ranking import CursorExpired
+        from snapshot import ModelNotReady
+
+        start = time.perf_counter()
+        future = self.executor.submit(fn, *args, **kwargs)
+        try:
+            results = future.result(timeout=budget)
+        except FutureTimeout:
+            future.cancel()
+            self.recommender.metrics.increment('latency_budget_exceeded')
+            return 504, {'error': f"Latency budget of {budget * 1000:.0f}ms exceeded"}
+        except ModelNotReady as e:
+            return 503, {'error': str(e)}
+        except CursorExpired as e:
+            return 410, {'error': str(e), 'pid': os.getpid()}
+        except KeyError as e:
+            return 400, {'error': f"Bad request: missing feature {e}"}
+        except (ValueError, TypeError) as e:
+            return 400, {'error': f"Bad request: {e}"}
+        results['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        return 200, results
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        timeout = KEEP_ALIVE_SECONDS
+
+        def do_GET(self):
+            self.respond(*service.handle('GET', self.path.split('?')[0]))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+                self.respond(413, {'error': 'Request body too large'})
+                return
+            body = self.rfile.read(length)
+            try:
+                status, payload = service.handle('POST', self.path.split('?')[0], body)
+            except Exception as e:
+                status, payload = 500, {'error': str(e)}
+            self.respond(status, payload)
+
+        def respond(self, status, payload):
+            if isinstance(payload, str):
+                data, content_type = payload.encode(), 'text/plain; version=0.0.4'
+            else:
+                data, content_type = json.dumps(payload, default=to_json).encode(), 'application/json'
+            if service.draining:
+                # Clients reconnect to a worker that is not shutting down
+                self.close_connection = True
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+class WorkerHTTPServer(ThreadingHTTPServer):
+    """A worker's server on the listening socket it shares with its siblings.
+
+    Handler threads are not daemons: server_close() joins them, so a draining
+    worker finishes writing every in-flight response before it exits.
+    """
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, listening_socket, handler):
+        super().__init__(listening_socket.getsockname()[:2], handler, bind_and_activate=False)
+        self.socket = listening_socket
+        self.server_address = listening_socket.getsockname()
+
+    def get_request(self):
+        # The shared socket is non-blocking: every worker wakes up for a new connection
+        # and the ones that lose the race get BlockingIOError (ignored by socketserver)
+        # instead of hanging in accept(). Connections themselves block as usual.
+        connection, address = self.socket.accept()
+        connection.setblocking(True)
+        return connection, address
+
+class PreforkServer:
+    """Parent process that owns the listening socket and keeps `workers` forked
+    children serving it.
+
+    Everything the service holds when the workers fork (model, catalog arrays,
+    neighbor indexes) is shared copy-on-write. gc.freeze() moves those objects
+    out of the collector's reach first, so collections in the children do not
+    write to (and thereby copy) the parent's pages.
+    """
+
+    def __init__(self, service, host='127.0.0.1', port=8000, workers=2, backlog=128):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.backlog = backlog
+        self.socket = None
+        self.children = set()
+        self.stopping = False
+
+    @property
+    def url(self):
+        host, port = self.socket.getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.socket = socket.create_server((self.host, self.port), backlog=self.backlog)
+        self.socket.setblocking(False)
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.workers):
+            self.spawn()
+        return self
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            # Never return into the parent's code path from a child
+            code = 1
+            try:
+                self.run_worker()
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        self.children.add(pid)
+        return pid
+
+    def run_worker(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.service.after_fork()
+        httpd = WorkerHTTPServer(self.socket, make_handler(self.service))
+
+        def drain(signum, frame):
+            # Fail readiness, then stop accepting; in-flight requests finish below
+            self.service.draining = True
+            threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, drain)
+        httpd.serve_forever()
+        # Waits for the handler threads (responses written, idle connections timed out)
+        httpd.server_close()
+        self.service.executor.shutdown(wait=True)
+
+    def serve_forever(self):
+        """Supervise the workers until SIGTERM/SIGINT, replacing any that exit"""
+        def stop(signum, frame):
+            self.stopping = True
+            for pid in list(self.children):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            self.children.discard(pid)
+            if not self.stopping:
+                # Back off a little so a worker that crashes on start cannot spin
+                time.sleep(0.5)
+                self.spawn()
+        self.socket.close()
+
+def main():
+    import argparse
+
+    from beer_recommender import BeerRecommender
+
+    parser = argparse.ArgumentParser(description="Multi-worker JSON HTTP service for beer recommendations")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent requests per worker")
+    parser.add_argument('--budget-ms', type=float, default=5000, help="Default per-request latency budget")
+    parser.add_argument('--bundle-dir', default='./artifacts')
+    parser.add_argument('--shared-dir', help="Share the model arrays with other servers through a segment "
+                                             "in this directory (e.g. /dev/shm); see shared_arrays.py")
+    parser.add_argument('--feature-mode', choices=['llm', 'hybrid', 'rules'], default='hybrid')
+    parser.add_argument('--warm-query', action='append', default=[],
+                        help="Precompute this query's results before forking (repeatable)")
+    args = parser.parse_args()
+
+    recommender = BeerRecommender()
+    recommender.feature_mode = args.feature_mode
+    recommender.background_refit = False
+    recommender.shared_segment_dir = args.shared_dir
+    recommender.load_or_build(args.bundle_dir)
+    if args.warm_query:
+        # Warmed in the parent, so every worker starts with them
+        recommender.warm_up(args.warm_query)
+
+    service = RecommenderService(recommender, budget_seconds=args.budget_ms / 1000, threads=args.threads)
+    server = PreforkServer(service, args.host, args.port, workers=args.workers).start()
+    print(f"Serving on {server.url} with {args.workers} workers", flush=True)
+    server.serve_forever()
+    recommender.release_shared_segment()
+
+if __name__ == "__main__":
+    main()
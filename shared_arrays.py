@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Read-only numpy arrays shared between processes through one mmap-backed segment file
+
+    python shared_arrays.py --dir /dev/shm            list segments
+    python shared_arrays.py --dir /dev/shm --clean    remove them
+
+A segment lives in a RAM-backed directory (/dev/shm by default), so every
+process that attaches maps the same physical pages instead of holding its own
+copy. multiprocessing.shared_memory is not used: before Python 3.13 its
+resource tracker unlinks a segment as soon as any attached process exits.
+
+Layout: a fixed header (magic, format version, table-of-contents position),
+the arrays (64-byte aligned), then the JSON table of contents. The builder
+writes everything to a temporary file, fills in the header last and renames
+the file into place, so attaching never sees a half-built segment; a
+missing, foreign or truncated file attaches as None and is rebuilt.
+
+Lifecycle: segments are named by the fingerprint of what they hold. Builders
+remove segments with other names (and temporary files of dead builders);
+processes still attached keep their mapping until they exit, since an
+unlinked file lives on while mapped. Owners may unlink() on shutdown.
+"""
+
+import copy
+import glob
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b'BEERSEG\x00'
+SEGMENT_VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')  # magic, version, reserved, toc offset, toc length
+ALIGNMENT = 64
+
+def default_segment_dir():
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class SharedSegment:
+    """Named read-only arrays in one segment file; arrays[name] are zero-copy views"""
+
+    def __init__(self, path, arrays, fingerprint, meta, created=False):
+        self.path = path
+        self.arrays = arrays
+        self.fingerprint = fingerprint
+        self.meta = meta
+        # True in the process that built it
+        self.created = created
+
+    @classmethod
+    def create(cls, directory, name, arrays, fingerprint, meta=None):
+        """Write arrays as segment `name` (replacing any old one) and attach to it"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        toc = {}
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(bytes(HEADER.size))
+                for key, array in arrays.items():
+                    array = np.ascontiguousarray(array)
+                    if array.dtype.hasobject:
+                        raise ValueError(f"Cannot share object array {key!r}")
+                    offset = aligned(f.tell())
+                    f.write(bytes(offset - f.tell()))
+                    array.tofile(f)
+                    toc[key] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+                toc_offset = f.tell()
+                toc_bytes = json.dumps({'fingerprint': fingerprint, 'arrays': toc, 'meta': meta or {}}).encode()
+                f.write(toc_bytes)
+                f.flush()
+                # The header goes in last: until then the file has no valid magic
+                f.seek(0)
+                f.write(HEADER.pack(MAGIC, SEGMENT_VERSION, 0, toc_offset, len(toc_bytes)))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        segment = cls.attach(directory, name, fingerprint)
+        segment.created = True
+        return segment
+
+    @classmethod
+    def attach(cls, directory, name, fingerprint=None):
+        """The segment mapped read-only, or None if missing, incomplete or for another fingerprint"""
+        path = os.path.join(directory, name)
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < HEADER.size:
+                    return None
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+        arrays = {}
+        try:
+            magic, version, _, toc_offset, toc_length = HEADER.unpack_from(buffer)
+            if magic != MAGIC or version != SEGMENT_VERSION or toc_offset + toc_length > size:
+                raise ValueError("bad header")
+            toc = json.loads(buffer[toc_offset:toc_offset + toc_length])
+            if fingerprint is not None and toc['fingerprint'] != fingerprint:
+                raise ValueError("other fingerprint")
+            for key, entry in toc['arrays'].items():
+                dtype = np.dtype(entry['dtype'])
+                count = int(np.prod(entry['shape'], dtype=np.int64))
+                if entry['offset'] < HEADER.size or entry['offset'] + count * dtype.itemsize > toc_offset:
+                    raise ValueError(f"array {key!r} outside the segment")
+                arrays[key] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                            offset=entry['offset']).reshape(entry['shape'])
+            return cls(path, arrays, toc['fingerprint'], toc['meta'])
+        except (ValueError, TypeError, KeyError, AttributeError, struct.error):
+            # Torn, corrupt or foreign (JSONDecodeError and UnicodeDecodeError are
+            # ValueErrors): drop the views so the mapping can close, and rebuild
+            arrays.clear()
+            buffer.close()
+            return None
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def unlink(self):
+        """Remove the segment; processes attached to it keep their mapping"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def remove_stale(directory, prefix, keep=None):
+        """Delete segments named prefix* other than keep, and temp files of dead builders"""
+        removed = []
+        for path in glob.glob(os.path.join(directory, f"{prefix}*")):
+            name = os.path.basename(path)
+            if name == keep:
+                continue
+            stem, _, pid = name.rpartition('.tmp-')
+            if stem and pid.isdigit() and pid_alive(int(pid)):
+                continue
+            try:
+                os.unlink(path)
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+        return removed
+
+# Serving snapshot <-> segment. The arrays of a snapshot are stored under
+# 'catalog/<column>', 'X_recommend_scaled' and 'partition/<key>/<array>'.
+
+def partition_name(key):
+    mainstream_only, strength, alt_threshold = key
+    return f"partition/{int(mainstream_only)}-{strength}-{alt_threshold}"
+
+def snapshot_arrays(snapshot):
+    """Every immutable serving array of a snapshot, by segment name"""
+    arrays = {f"catalog/{name}": array for name, array in snapshot.catalog.arrays().items()}
+    arrays['catalog/live'] = snapshot.catalog.live
+    arrays['X_recommend_scaled'] = snapshot.X_recommend_scaled
+    for key, partition in snapshot.recommend_index.items():
+        if partition is None:
+            continue
+        prefix = partition_name(key)
+        arrays[f"{prefix}/rows"] = partition['rows']
+        for name in partition['knn'].array_attributes:
+            arrays[f"{prefix}/knn.{name}"] = getattr(partition['knn'], name)
+    return arrays
+
+def attach_snapshot(snapshot, segment):
+    """A copy of snapshot whose arrays are views into segment.
+
+    Raises ValueError if the segment does not hold an array of the same shape
+    and dtype for each one.
+    """
+    from catalog import StringStore
+
+    def shared(name, array):
+        view = segment.arrays.get(name)
+        if view is None or view.shape != np.shape(array) or view.dtype != np.asarray(array).dtype:
+            raise ValueError(f"Segment {segment.path} does not match the snapshot at {name!r}")
+        return view
+
+    catalog = copy.copy(snapshot.catalog)
+    for name in catalog.array_columns + ['live']:
+        setattr(catalog, name, shared(f"catalog/{name}", getattr(catalog, name)))
+    for name in catalog.string_columns:
+        store = getattr(catalog, name)
+        setattr(catalog, name, StringStore(shared(f"catalog/{name}.data", store.data),
+                                           shared(f"catalog/{name}.offsets", store.offsets),
+                                           shared(f"catalog/{name}.ids", store.ids)))
+
+    recommend_index = {}
+    for key, partition in snapshot.recommend_index.items():
+        if partition is None:
+            recommend_index[key] = None
+            continue
+        prefix = partition_name(key)
+        knn = copy.copy(partition['knn'])
+        for name in knn.array_attributes:
+            setattr(knn, name, shared(f"{prefix}/knn.{name}", getattr(knn, name)))
+        recommend_index[key] = {**partition, 'knn': knn, 'rows': shared(f"{prefix}/rows", partition['rows'])}
+
+    return snapshot.replace(catalog=catalog, recommend_index=recommend_index,
+                            X_recommend_scaled=shared('X_recommend_scaled', snapshot.X_recommend_scaled))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List or remove shared array segments")
+    parser.add_argument('--dir', default=default_segment_dir())
+    parser.add_argument('--prefix', default='beer-recommender-')
+    parser.add_argument('--clean', action='store_true', help="Remove every segment with the prefix")
+    args = parser.parse_args()
+
+    if args.clean:
+        for path in SharedSegment.remove_stale(args.dir, args.prefix):
+            print(f"removed {path}")
+    else:
+        for path in sorted(glob.glob(os.path.join(args.dir, f"{args.prefix}*"))):
+            segment = SharedSegment.attach(args.dir, os.path.basename(path))
+            if segment is None:
+                print(f"{path}  (incomplete or unreadable)")
+            else:
+                print(f"{path}  {segment.nbytes / 2 ** 20:.1f}MB  {len(segment.arrays)} arrays  "
+                      f"fingerprint {segment.fingerprint[:16]}")
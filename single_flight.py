@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+class Flight:
+    """One in-flight computation and the callers waiting for it"""
+
+    def __init__(self):
+        self.future = Future()
+        self.followers = 0
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+
+    The first caller for a key (the leader) runs the work; callers arriving
+    while it runs (followers) wait for the same future and get the same result
+    or exception. Once the leader finishes the key is free again: later calls
+    compute anew, so nothing is cached here.
+
+    Threads and asyncio tasks share one table of concurrent.futures.Future
+    objects, so a coroutine can follow a thread's flight and vice versa.
+    saved_seconds adds up the leader's time once per follower: the work the
+    followers did not repeat.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.counters = {'leaders': 0, 'coalesced': 0, 'saved_seconds': 0.0}
+
+    def join(self, key):
+        """(flight, leader): the running flight for key, or a new one led by the caller"""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.counters['coalesced'] += 1
+                return flight, False
+            flight = self.flights[key] = Flight()
+            self.counters['leaders'] += 1
+            return flight, True
+
+    def land(self, key, flight, start, result=None, error=None):
+        # Unlisted first, so nobody joins a flight whose followers are already counted
+        with self.lock:
+            del self.flights[key]
+            self.counters['saved_seconds'] += flight.followers * (self.clock() - start)
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def do(self, key, fn):
+        """(fn(), shared); shared is True for followers, who get the leader's result"""
+        flight, leader = self.join(key)
+        if not leader:
+            return flight.future.result(), True
+        start = self.clock()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.land(key, flight, start, error=e)
+            raise
+        self.land(key, flight, start, result)
+        return result, False
+
+    async def do_async(self, key, coroutine_fn):
+        """do() for coroutines: followers await the flight without blocking the loop"""
+        flight, leader = self.join(key)
+        if not leader:
+            return await asyncio.wrap_future(flight.future), True
+        start = self.clock()
+        try:
+            result = await coroutine_fn()
+        except BaseException as e:
+            self.land(key, flight, start, error=e)
+            raise
+        self.land(key, flight, start, result)
+        return result, False
+
+    def after_fork(self):
+        # The parent's in-flight work does not continue in the child
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self.flights)
+        return stats
@@ -0,0 +1,42 @@
+import itertools
+
+class ModelNotReady(RuntimeError):
+    """Raised by requests that arrive before the first model has been published"""
+
+class ModelSnapshot:
+    """Everything a request reads: regression model, scalers, encoders, query
+    layouts, catalog, scaled features and neighbor indexes.
+
+    A snapshot never changes once built. A request takes the published one once
+    and uses it throughout; training, retrains and catalog updates build a new
+    snapshot (replace()) and publish it with a single assignment, so requests
+    see the old state or the new one, never a mix.
+    """
+
+    fields = ('gb_model', 'scalar', 'global_scaler_recommend', 'encoder', 'encoder2',
+              'regression_columns', 'recommend_columns', 'recommend_index',
+              'regression_layout', 'recommend_layout', 'regression_fit', 'X_recommend_scaled', 'catalog')
+    __slots__ = fields + ('version',)
+    versions = itertools.count()
+
+    def __init__(self, **values):
+        unknown = set(values) - set(self.fields)
+        if unknown:
+            raise TypeError(f"Unknown snapshot fields: {sorted(unknown)}")
+        for name in self.fields:
+            object.__setattr__(self, name, values.get(name))
+        object.__setattr__(self, 'version', next(ModelSnapshot.versions))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"ModelSnapshot is immutable; use replace({name}=...)")
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.fields}
+        values.update(changes)
+        return ModelSnapshot(**values)
+
+    @property
+    def ready(self):
+        return all(getattr(self, name) is not None for name in
+                   ('gb_model', 'regression_layout', 'recommend_layout', 'recommend_index',
+                    'X_recommend_scaled', 'catalog'))
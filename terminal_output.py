@@ -0,0 +1,73 @@
+FLAVORS = ['Hoppy', 'Malty', 'Bitter', 'Sweet', 'Sour', 'Fruits', 'Spices', 'Body', 'Alcohol', 'Astringency', 'Salty']
+
+def format_flavor_profile(features):
+    """One-glance summary of the extracted features, strongest flavors first"""
+    output = f"🎯 Flavor profile: {features['style']} · {features['ABV']:.1f}% ABV"
+    output += " · mainstream\n" if features.get('mainstream') else " · craft/specialty\n"
+    flavors = sorted(FLAVORS, key=lambda name: features[name], reverse=True)
+    output += "   " + " · ".join(f"{name} {features[name]:g}" for name in flavors[:6] if features[name] > 0)
+    return output
+
+def format_terminal_output(prompt, predicted_rating, recommendations, alt_recommendations=None, pending=False):
+    """Format output exactly like beer_expected.ipynb.
+
+    With pending=True the results are still arriving: recommendations (None)
+    and, for a low rating, alt_recommendations (None) show a placeholder line.
+    """
+    
+    output = f"User Prompt = {prompt}\n"
+    
+    if alt_recommendations is not None or (pending and predicted_rating < 3.0):
+        # Low rating warning
+        output += "━" * 60 + "\n"
+        output += f"⚠️  Warning: This flavor combination typically rates {predicted_rating:.2f}/5\n"
+        output += "━" * 60 + "\n\n"
+        
+        output += "📍 Here's what matches your exact request:\n"
+        if recommendations is None:
+            output += "   Finding matching beers...\n"
+        elif recommendations:
+            for i, beer in enumerate(recommendations[:2], 1):
+                output += f"{i}. {beer['name']} ({beer['rating']:.2f}★ - {int(beer['num_reviews'])} reviews)\n"
+                output += f"   Distance: {beer['distance']:.3f}\n"
+        else:
+            output += "   No exact matches found in our database.\n"
+        
+        output += "\n💡 Suggested Alternatives (similar but better rated):\n"
+        if alt_recommendations is None:
+            output += "   Looking for better-rated alternatives...\n"
+        elif alt_recommendations:
+            for i, beer in enumerate(alt_recommendations[:2], 1):
+                output += f"{i}. {beer['name']} ({beer['rating']:.2f}★ - {int(beer['num_reviews'])} reviews)\n"
+                output += f"   Distance: {beer['distance']:.3f}\n"
+        else:
+            output += "   No high-rated alternatives found with your criteria.\n"
+        
+        output += "\n💭 Tip: The flavor combination you requested is uncommon. The alternatives above\n"
+        output += "   maintain similar characteristics but with proven appeal to beer enthusiasts.\n"
+        
+    else:
+        # Good rating
+        output += "━" * 60 + "\n"
+        output += f"✅ Great choice! Predicted rating: {predicted_rating:.2f}/5\n"
+        output += "━" * 60 + "\n\n"
+        
+        output += "🍺 Top Recommendations:\n"
+        if recommendations is None:
+            output += "\n   Finding matching beers...\n"
+        for i, beer in enumerate((recommendations or [])[:2], 1):
+            output += f"\n{i}. {beer['name']}\n"
+            output += f"   Rating: {beer['rating']:.2f}/5 ({int(beer['num_reviews'])} reviews)\n"
+            output += f"   Distance: {beer['distance']:.3f}\n"
+            
+            desc = beer.get('description', '')
+            if desc:
+                desc = desc[:120] + "..." if len(desc) > 120 else desc
+                output += f"   Notes: Notes:{desc}\n"
+            else:
+                output += "   Notes: Notes:...\n"
+    
+    output += "\n" + "─" * 60 + "\n"
+    output += "=" * 133
+    
+    return output
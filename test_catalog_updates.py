@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental catalog updates (upsert, delete, review updates) and refit
+Run this from the beer-buddy directory: python -m pytest test_catalog_updates.py
+"""
+
+import sys
+sys.path.append('.')
+
+import pytest
+
+from beer_recommender import BeerRecommender
+
+NEW_KEY = 'Test Brewing Co. Test Amber'
+
+@pytest.fixture(scope='module')
+def recommender():
+    recommender = BeerRecommender()
+    recommender.load_or_build()
+    # Refits only when a test asks for one
+    recommender.refit_policy.max_changed_fraction = None
+    recommender.background_refit = False
+    return recommender
+
+def beer_like(recommender, row, **changes):
+    """A CSV-style beer dict copied from a catalog row"""
+    beer = recommender.catalog.to_frame().iloc[row].to_dict()
+    beer['Beer Name (Full)'] = recommender.catalog.keys[row]
+    beer.update(changes)
+    return beer
+
+def query_for(recommender, beer):
+    features = {feat: beer[feat] for feat in recommender.scaling_features}
+    return {**features, 'mainstream': 0, 'style': recommender.style_group(beer['Style'])}
+
+def names(recommender, beer):
+    results = recommender.get_beer_recommendations(query_for(recommender, beer), k=50, candidate_pool=50)
+    return [result['name'] for result in results]
+
+def test_upsert_adds_a_searchable_beer(recommender):
+    rows_before = len(recommender.catalog)
+    version_before = recommender.snapshot.version
+    beer = beer_like(recommender, 0, Name='Test Amber', **{'Beer Name (Full)': NEW_KEY})
+
+    rows = recommender.upsert_beers([beer])
+
+    assert list(rows) == [rows_before]
+    assert len(recommender.catalog) == rows_before + 1
+    assert recommender.snapshot.version > version_before
+    assert 'Test Amber' in names(recommender, beer)
+
+def test_upsert_of_a_known_key_replaces_it(recommender):
+    beer = beer_like(recommender, recommender.catalog.row_of(NEW_KEY), review_overall=4.9)
+    rows_before = len(recommender.catalog)
+
+    rows = recommender.upsert_beers([beer])
+
+    assert len(recommender.catalog) == rows_before
+    assert recommender.catalog.review_overall[rows[0]] == pytest.approx(4.9)
+
+def test_update_reviews_sets_mainstream_from_the_count(recommender):
+    row = recommender.catalog.row_of(NEW_KEY)
+    recommender.update_reviews({NEW_KEY: {'number_of_reviews': 5}})
+    assert recommender.catalog.number_of_reviews[row] == 5
+    assert recommender.catalog.mainstream[row] == recommender.mainstream_flag(NEW_KEY, 5)
+
+def test_delete_removes_the_beer_from_results(recommender):
+    beer = beer_like(recommender, recommender.catalog.row_of(NEW_KEY))
+    recommender.delete_beers([NEW_KEY])
+    assert 'Test Amber' not in names(recommender, beer)
+
+    with pytest.raises(KeyError):
+        recommender.delete_beers(['No Such Brewery No Such Beer'])
+
+def test_refit_compacts_and_keeps_updates(recommender):
+    beer = beer_like(recommender, 1, Name='Test Refit Beer', **{'Beer Name (Full)': NEW_KEY + ' 2'})
+    recommender.upsert_beers([beer])
+    deleted_key = recommender.catalog.keys[2]
+    recommender.delete_beers([deleted_key])
+    live_rows = int(recommender.catalog.live.sum())
+    assert recommender.refit_policy.stats()['pending_changes'] > 0
+
+    recommender.refit()
+
+    catalog = recommender.catalog
+    assert len(catalog) == live_rows and catalog.live.all()
+    assert catalog.row_of(deleted_key) is None
+    assert 'Test Refit Beer' in names(recommender, beer)
+    assert recommender.refit_policy.stats()['pending_changes'] == 0
+    assert 0 <= recommender.predict_rating(query_for(recommender, beer)) <= 5
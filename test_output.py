@@ -65,8 +65,7 @@ def test_beer_recommendations():
     
     print("Loading beer recommender system...")
     recommender = BeerRecommender()
-    recommender.load_and_preprocess_data()
-    recommender.train_regression_model()
+    recommender.load_or_build()
     print("System loaded successfully!\n")
     
     # Test cases
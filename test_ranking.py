@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for top-k ranking, pagination cursors and their expiry
+Run this from the beer-buddy directory: python -m pytest test_ranking.py
+"""
+
+import sys
+sys.path.append('.')
+
+import numpy as np
+import pytest
+
+from beer_recommender import BeerRecommender
+from ranking import CursorExpired, CursorStore, top_k_order
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture(scope='module')
+def recommender():
+    recommender = BeerRecommender()
+    recommender.load_or_build()
+    return recommender
+
+@pytest.fixture
+def features(recommender):
+    return recommender.rule_extractor.extract("I want a sessionable pilsner")[0]
+
+def test_top_k_order_matches_a_stable_sort():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        # Few distinct values, so ties at the k-th score are common
+        scores = rng.integers(0, 5, size=rng.integers(1, 40)).astype(float)
+        k = int(rng.integers(0, 45))
+        expected = np.argsort(-scores, kind='stable')[:k]
+        assert list(top_k_order(scores, k)) == list(expected)
+
+def test_cursor_store_expires_and_evicts():
+    clock = FakeClock()
+    store = CursorStore(max_entries=2, max_age_seconds=10, clock=clock)
+    first, second = store.add('a'), store.add('b')
+    assert store.get(f"{first}:3") == (first, 'a', 3)
+
+    clock.now = 11
+    with pytest.raises(CursorExpired):
+        store.get(f"{first}:0")
+
+    # Least recently used goes first once max_entries is exceeded
+    clock.now = 0
+    third = store.add('c')
+    store.get(f"{third}:0")
+    store.add('d')
+    with pytest.raises(CursorExpired):
+        store.get(f"{second}:0")
+    assert store.get(f"{third}:1")[1] == 'c'
+
+    for cursor in ['nonsense', f"{third}:-1", f"{third}:x"]:
+        with pytest.raises(CursorExpired):
+            store.get(cursor)
+
+def test_forked_stores_issue_distinct_ids():
+    store = CursorStore()
+    parent_id = store.add('a')
+    store.after_fork()
+    child_id = store.add('b')
+    assert child_id != parent_id
+    assert store.get(f"{parent_id}:0")[1] == 'a'
+
+def test_pages_cover_the_ranking_once(recommender, features):
+    ranking = recommender.get_beer_recommendations(features, k=7)
+    page = recommender.recommend_page(features, k=7, limit=3)
+    seen = page['recommendations']
+    while page['next_cursor'] is not None:
+        page = recommender.next_page(page['next_cursor'], limit=3)
+        seen += page['recommendations']
+    assert [beer['name'] for beer in seen] == [beer['name'] for beer in ranking]
+    assert page['total'] == 7
+
+def test_limit_none_returns_the_rest(recommender, features):
+    page = recommender.recommend_page(features, k=5, limit=2)
+    rest = recommender.next_page(page['next_cursor'], limit=None)
+    assert len(rest['recommendations']) == 3
+    assert rest['next_cursor'] is None
+
+def test_pages_do_not_shift_after_a_catalog_update(recommender, features):
+    page = recommender.recommend_page(features, k=6, limit=3)
+    expected = recommender.get_beer_recommendations(features, k=6)[3:]
+    recommender.refit_policy.max_changed_fraction = None
+    recommender.update_reviews({recommender.catalog.keys[0]: {'review_overall': 1.0}})
+    later = recommender.next_page(page['next_cursor'], limit=3)
+    assert [beer['name'] for beer in later['recommendations']] == [beer['name'] for beer in expected]
+
+def test_invalid_pages_raise(recommender, features):
+    for options in [{'offset': -1}, {'limit': -1}, {'k': 0}, {'candidate_pool': 0}]:
+        with pytest.raises(ValueError):
+            recommender.get_beer_recommendations(features, **options)
+    page = recommender.recommend_page(features, k=5, limit=2)
+    with pytest.raises(ValueError):
+        recommender.next_page(page['next_cursor'], limit=0)
+    with pytest.raises(CursorExpired):
+        recommender.next_page('unknown:0')
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the rule-based feature extractor's modifiers
+Run this from the beer-buddy directory: python -m pytest test_rule_extractor.py
+"""
+
+import sys
+sys.path.append('.')
+
+from rule_extractor import RuleBasedFeatureExtractor, FLAVOR_KEYWORDS
+
+# Confidence at which the hybrid mode skips the LLM (BeerRecommender.rule_confidence_threshold)
+THRESHOLD = 0.8
+
+extractor = RuleBasedFeatureExtractor()
+
+def test_less_lowers_the_flavor():
+    for prompt, feature in [("less bitter IPA", 'Bitter'),
+                            ("a less sweet stout", 'Sweet'),
+                            ("hoppy but less bitter", 'Bitter')]:
+        features, _ = extractor.extract(prompt)
+        flavor = feature.lower()
+        assert features[feature] < FLAVOR_KEYWORDS[flavor][feature], prompt
+
+def test_mild_modifiers_scale_the_flavor():
+    for prompt in ["a bit sweet", "a little sweet"]:
+        features, confidence = extractor.extract(prompt)
+        assert features['Sweet'] < FLAVOR_KEYWORDS['sweet']['Sweet'], prompt
+        assert confidence == 1.0
+
+def test_negated_style_is_not_understood():
+    features, confidence = extractor.extract("no sour beer")
+    assert features['style'] != 'Wild Ale'
+    assert features['mainstream'] == 1
+    assert confidence < THRESHOLD
+
+def test_unapplied_modifier_lowers_confidence():
+    for prompt in ["too bitter", "less IPA", "hoppy, more"]:
+        _, confidence = extractor.extract(prompt)
+        assert confidence < THRESHOLD, prompt
+
+def test_known_prompts_stay_confident():
+    for prompt in ["I want a light citrusy beer", "I want a sessionable pilsner",
+                   "no hops lager", "not too malty stout", "slightly sweet wheat beer"]:
+        _, confidence = extractor.extract(prompt)
+        assert confidence == 1.0, prompt
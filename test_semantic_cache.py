@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the semantic prompt cache's modifier guard
+Run this from the beer-buddy directory: python -m pytest test_semantic_cache.py
+"""
+
+import sys
+sys.path.append('.')
+
+from semantic_cache import SemanticPromptCache
+
+def test_polarity_words_miss_the_cache():
+    cache = SemanticPromptCache()
+    cache.add("sweet stout", {'Sweet': 145})
+    for prompt in ["less sweet stout", "more sweet stout", "a bit sweet stout",
+                   "a little sweet stout", "too sweet stout"]:
+        assert cache.lookup(prompt) is None, prompt
+
+def test_filler_words_still_match():
+    cache = SemanticPromptCache()
+    cache.add("sweet stout", {'Sweet': 145})
+    assert cache.lookup("I want a sweet stout please") == {'Sweet': 145}
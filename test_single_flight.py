@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for single-flight coalescing of concurrent identical requests
+Run this from the beer-buddy directory: python -m pytest test_single_flight.py
+"""
+
+import sys
+sys.path.append('.')
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from beer_recommender import BeerRecommender
+from single_flight import SingleFlight
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def run_threads(n, target):
+    results = [None] * n
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def gated(flight, followers, value=None, error=None):
+    """A function that returns (or raises) once `followers` callers wait on its flight"""
+    calls = []
+
+    def work():
+        calls.append(1)
+        wait_for(lambda: flight.stats()['coalesced'] >= followers)
+        if error is not None:
+            raise error
+        return value
+
+    return work, calls
+
+def test_threads_share_one_computation():
+    flight = SingleFlight()
+    work, calls = gated(flight, 4, value={'answer': 42})
+    results = run_threads(5, lambda: flight.do('key', work))
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == {'answer': 42} for result, _ in results)
+    stats = flight.stats()
+    assert (stats['leaders'], stats['coalesced'], stats['in_flight']) == (1, 4, 0)
+    assert stats['saved_seconds'] > 0
+
+def test_errors_reach_every_caller_and_free_the_key():
+    flight = SingleFlight()
+    work, calls = gated(flight, 2, error=ValueError('boom'))
+    results = run_threads(3, lambda: flight.do('key', work))
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+    # Nothing is cached: the next call computes again
+    assert flight.do('key', lambda: 'fresh') == ('fresh', False)
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == (1, False)
+    assert flight.do('b', lambda: 2) == (2, False)
+    assert flight.stats()['coalesced'] == 0
+
+def test_asyncio_tasks_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        while flight.stats()['coalesced'] < 3:
+            await asyncio.sleep(0.001)
+        return 'done'
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async('key', work) for _ in range(4)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(results) == [('done', False)] + [('done', True)] * 3
+
+def test_a_task_follows_a_threads_flight():
+    flight = SingleFlight()
+    work, calls = gated(flight, 1, value='from thread')
+    leader = threading.Thread(target=flight.do, args=('key', work))
+    leader.start()
+    wait_for(lambda: flight.stats()['in_flight'] == 1)
+
+    result = asyncio.run(flight.do_async('key', None))
+    leader.join()
+    assert result == ('from thread', True)
+    assert len(calls) == 1
+
+@pytest.fixture(scope='module')
+def recommender():
+    recommender = BeerRecommender()
+    recommender.feature_mode = 'rules'
+    recommender.load_or_build()
+    return recommender
+
+def test_identical_recommendation_requests_coalesce(recommender, monkeypatch):
+    extract = recommender.get_beer_features_from_text
+    calls = []
+    before = recommender.in_flight.stats()['coalesced']
+
+    def slow_features(user_input, on_token=None):
+        wait_for(lambda: recommender.in_flight.stats()['coalesced'] >= before + 3)
+        calls.append(1)
+        return extract(user_input, on_token=on_token)
+
+    monkeypatch.setattr(recommender, 'get_beer_features_from_text', slow_features)
+    results = run_threads(4, lambda: recommender.get_recommendations("  A Sessionable PILSNER "))
+
+    assert len(calls) == 1
+    assert sorted(result['feature_source'] for result in results) == ['coalesced'] * 3 + ['rules']
+    assert all(result['recommendations'] == results[0]['recommendations'] for result in results)
+
+def test_identical_async_requests_coalesce(recommender, monkeypatch):
+    extract = recommender.get_beer_features_from_text_async
+    calls = []
+    before = recommender.in_flight.stats()['coalesced']
+
+    async def slow_features(user_input):
+        calls.append(1)
+        while recommender.in_flight.stats()['coalesced'] < before + 2:
+            await asyncio.sleep(0.001)
+        return await extract(user_input)
+
+    monkeypatch.setattr(recommender, 'get_beer_features_from_text_async', slow_features)
+
+    async def main():
+        return await asyncio.gather(*[recommender.get_recommendations_async("a hoppy IPA", k=3)
+                                      for _ in range(3)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(result['feature_source'] for result in results) == ['coalesced'] * 2 + ['rules']
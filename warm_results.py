@@ -0,0 +1,65 @@
+import threading
+
+from llm_cache import normalize_prompt
+
+class WarmResults:
+    """Full get_recommendations results for a few canned queries (the app's
+    example buttons), computed ahead of time and served without the LLM, the
+    rating model or the neighbor search.
+
+    Each result is stored with a tag: the model snapshot version and the LLM
+    settings (model, system prompt, feature mode) it was computed under. A
+    lookup with a different tag misses and drops the entry, so a new bundle, a
+    retrain, a catalog update or a new system prompt invalidates everything
+    warmed before it. Only prompts in `queries` are kept.
+    """
+
+    def __init__(self, queries=()):
+        self.queries = list(queries)
+        self.results = {}
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stale': 0, 'warmed': 0}
+
+    @property
+    def queries(self):
+        return self._queries
+
+    @queries.setter
+    def queries(self, queries):
+        self._queries = list(queries)
+        self.normalized = {normalize_prompt(query) for query in self._queries}
+
+    def get(self, prompt, tag):
+        key = normalize_prompt(prompt)
+        if key not in self.normalized:
+            return None
+        with self.lock:
+            entry = self.results.get(key)
+            if entry is not None and entry[0] != tag:
+                del self.results[key]
+                self.counters['stale'] += 1
+                entry = None
+            self.counters['hits' if entry is not None else 'misses'] += 1
+        return entry[1] if entry is not None else None
+
+    def set(self, prompt, tag, results):
+        key = normalize_prompt(prompt)
+        if key not in self.normalized:
+            return
+        with self.lock:
+            # A shallow copy: callers may add keys (e.g. elapsed_ms) to what they got
+            self.results[key] = (tag, dict(results))
+            self.counters['warmed'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def after_fork(self):
+        self.lock = threading.Lock()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.results)
+        return stats